@@ -1,109 +1,1857 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file, g, has_request_context
+from flask import abort, send_from_directory, stream_with_context
+from flask import before_render_template, template_rendered
+from werkzeug.http import is_resource_modified
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from flask_sqlalchemy.session import Session as FlaskSession
+from datetime import datetime, timedelta
 from config import Config
-from sqlalchemy import func
+from sqlalchemy import Select, event, exists, func, and_, or_, case, cast, delete, insert, inspect, select, update, text as sql_text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.util import await_only
+from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
+from functools import wraps
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+import asyncio
+import click
+import csv
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import mimetypes
 import os
+import random
+import re
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+import brotli
+import numpy as np
+
+try:
+    import fcntl  # غير متوفر على ويندوز: نكتفي بالقفل داخل العملية
+except ImportError:
+    fcntl = None
+
 app = Flask(__name__)
 app.config.from_object(Config)
-db = SQLAlchemy(app)
+
+
+# ====================
+# توجيه القراءة إلى النسخة المقروءة (replica)
+# ====================
+
+class RoutingSession(FlaskSession):
+    """
+    Session ترسل استعلامات SELECT إلى الـ bind المسمّى "replica" داخل المسارات
+    المعلّمة بـ use_read_replica. أي flush أو UPDATE/DELETE، أو أي قراءة بعد
+    كتابة في نفس الطلب، تذهب إلى القاعدة الرئيسية.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and isinstance(clause, Select)
+            and not self._flushing
+            and not (self.new or self.dirty or self.deleted)
+            and has_request_context()
+            and g.get("use_replica")
+            and not g.get("db_wrote")
+            and "replica" in self._db.engines
+        ):
+            return self._db.engines["replica"]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(app, session_options={"class_": RoutingSession})
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_orm_write(db_session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_bulk_write(orm_execute_state):
+    if has_request_context() and not orm_execute_state.is_select:
+        g.db_wrote = True
+
+
+@app.after_request
+def _stick_to_primary(response):
+    """بعد أي كتابة نُبقي المستخدم على القاعدة الرئيسية لفترة قصيرة (read-your-writes)."""
+    if g.get("db_wrote") and app.config.get("SQLALCHEMY_BINDS", {}).get("replica"):
+        session["primary_until"] = time.time() + app.config.get("REPLICA_STICKY_SECONDS", 10)
+    return response
+
+
+def use_read_replica(view):
+    """تعليم مسار قراءة ثقيل ليقرأ من الـ replica (إن وُجدت)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if session.get("primary_until", 0) < time.time():
+            g.use_replica = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+# ====================
+# وضع SQLite للإنتاج (WAL + pragmas + تسلسل الكتابة)
+# ====================
+
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """ضبط كل اتصال SQLite جديد حسب إعدادات SQLITE_* في Config."""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        configure_sqlite_connection(dbapi_connection)
+
+
+def configure_sqlite_connection(dbapi_connection):
+    """الـ pragmas نفسها لاتصال sqlite3 أو aiosqlite (وضع ASGI في asgi.py)."""
+    if not app.config.get("SQLITE_PRODUCTION"):
+        return
+    cursor = dbapi_connection.cursor()
+    # WAL: القرّاء لا يحجبون الكاتب والعكس
+    cursor.execute("PRAGMA journal_mode=WAL")
+    synchronous = str(app.config["SQLITE_SYNCHRONOUS"]).upper()
+    if synchronous not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+        synchronous = "NORMAL"
+    cursor.execute(f"PRAGMA synchronous={synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT'])}")
+    cursor.execute(f"PRAGMA cache_size={int(app.config['SQLITE_CACHE_SIZE'])}")
+    cursor.execute(f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}")
+    cursor.close()
+
+
+def sqlite_write_mode():
+    return bool(app.config.get("SQLITE_PRODUCTION")) and db.engine.dialect.name == "sqlite"
+
+
+def async_request():
+    """هل الطلب الحالي يعمل في وضع ASGI (asgi.py)؟ الـ event loop فيه لا يجوز حجزه."""
+    return has_request_context() and g.get("async_db", False)
+
+
+def pause(seconds):
+    """انتظار بين المحاولات؛ في وضع ASGI يترك الـ event loop لباقي الطلبات."""
+    if async_request():
+        await_only(asyncio.sleep(seconds))
+    else:
+        time.sleep(seconds)
+
+
+_write_thread_lock = threading.Lock()
+# (pid, ملف القفل): يُفتح لكل عملية على حدة حتى لا يشترك workers الـ fork بنفس القفل
+_write_lock_file = None
+
+
+class sqlite_write_lock:
+    """
+    قفل كتابة واحد لكل قاعدة SQLite: Lock بين الـ threads داخل العملية،
+    و flock على ملف بجانب القاعدة بين workers الـ gunicorn.
+    """
+
+    def __enter__(self):
+        global _write_lock_file
+        # في وضع ASGI كل الطلبات على thread واحد: ننتظر القفل بدون حجز الـ event loop
+        polling = async_request()
+        if polling:
+            while not _write_thread_lock.acquire(blocking=False):
+                pause(0.002)
+        else:
+            _write_thread_lock.acquire()
+        if fcntl is None or not db.engine.url.database or db.engine.url.database == ":memory:":
+            return self
+        try:
+            if _write_lock_file is None or _write_lock_file[0] != os.getpid():
+                path = os.path.abspath(db.engine.url.database) + "-write.lock"
+                _write_lock_file = (os.getpid(), open(path, "a"))
+            if polling:
+                while True:
+                    try:
+                        fcntl.flock(_write_lock_file[1].fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        pause(0.002)
+            else:
+                fcntl.flock(_write_lock_file[1].fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            _write_thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None and _write_lock_file is not None and _write_lock_file[0] == os.getpid():
+                fcntl.flock(_write_lock_file[1].fileno(), fcntl.LOCK_UN)
+        finally:
+            _write_thread_lock.release()
+        return False
+
+
+def _is_locked_error(error):
+    message = str(getattr(error, "orig", error)).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+class DatabaseBusy(Exception):
+    """القاعدة بقيت مقفلة بعد كل محاولات run_write."""
+
+
+def run_write(fn, *args, **kwargs):
+    """
+    تنفيذ قسم الكتابة fn ثم commit. في وضع SQLite للإنتاج يُنفَّذ القسم وحده
+    داخل sqlite_write_lock (القراءة والعرض تبقى خارج القفل)، ويُعاد كاملاً
+    بعد rollback عند "database is locked". لذلك كل تعديل يجب أن يتم داخل fn.
+    لو استمر القفل بعد DB_WRITE_RETRIES محاولة نرفع DatabaseBusy (رد 503).
+    """
+    if not sqlite_write_mode():
+        value = fn(*args, **kwargs)
+        db.session.commit()
+        return value
+
+    retries = app.config.get("DB_WRITE_RETRIES", 5)
+    delay = app.config.get("DB_WRITE_RETRY_DELAY", 0.05)
+    for attempt in range(retries + 1):
+        # إنهاء أي transaction قراءة قبل القفل، فتُقرأ الكائنات من جديد داخله
+        db.session.rollback()
+        try:
+            with sqlite_write_lock():
+                value = fn(*args, **kwargs)
+                db.session.commit()
+            return value
+        except OperationalError as e:
+            db.session.rollback()
+            if not _is_locked_error(e):
+                raise
+            endpoint = request.endpoint if has_request_context() else fn.__name__
+            app.logger.warning("database locked in %s (attempt %d)", endpoint, attempt + 1)
+        # تأخير أُسّي مع عشوائية حتى لا تعود كل الطلبات في نفس اللحظة
+        pause(delay * (2 ** attempt) * random.uniform(0.5, 1.5))
+    raise DatabaseBusy()
+
+
+@app.errorhandler(DatabaseBusy)
+def database_busy(error):
+    if request.is_json:
+        return jsonify({"ok": False, "error": "busy"}), 503, {"Retry-After": "2"}
+    return "الخادم مشغول حالياً، يرجى إعادة المحاولة بعد لحظات.", 503, {"Retry-After": "2"}
+
+
+# ====================
+# قياس أداء الطلبات (METRICS_ENABLED)
+# ====================
+
+# حدود الـ histograms: الزمن بالثواني، وعدد استعلامات SQL
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """histogram بسيط بصيغة Prometheus (بدون مكتبة prometheus_client) لكل قيمة من الـ labels."""
+
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        # labels -> [عدّادات الحدود..., المجموع, العدد]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            entry = self.values.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for labels, entry in items:
+            base = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, labels))
+            sep = "," if base else ""
+            for bound, count in zip(self.buckets, entry):
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {entry[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {entry[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {entry[-1]}")
+        return lines
+
+
+REQUEST_METRICS = {
+    "wall": Histogram("exam_request_duration_seconds",
+                      "Wall time per request.", TIME_BUCKETS, ("endpoint",)),
+    "queries": Histogram("exam_request_sql_queries",
+                         "SQL statements executed per request.", QUERY_BUCKETS, ("endpoint",)),
+    "sql": Histogram("exam_request_sql_duration_seconds",
+                     "Time spent in SQL per request.", TIME_BUCKETS, ("endpoint",)),
+    "template": Histogram("exam_request_template_duration_seconds",
+                          "Template render time per request.", TIME_BUCKETS, ("endpoint",)),
+}
+# (endpoint, method, status) -> عدد الطلبات
+_request_counts = {}
+_request_counts_lock = threading.Lock()
+
+
+def metrics_enabled():
+    return bool(app.config.get("METRICS_ENABLED"))
+
+
+@app.before_request
+def _metrics_start():
+    if metrics_enabled():
+        g.metrics = {"start": time.perf_counter(), "queries": 0, "sql": 0.0, "template": 0.0}
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _metrics_before_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "metrics" in g:
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _metrics_after_query(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_query_start")
+    if starts and has_request_context() and "metrics" in g:
+        g.metrics["queries"] += 1
+        g.metrics["sql"] += time.perf_counter() - starts.pop()
+
+
+@before_render_template.connect_via(app)
+def _metrics_before_template(sender, template, context, **extra):
+    if has_request_context() and "metrics" in g:
+        g.metrics.setdefault("template_start", []).append(time.perf_counter())
+
+
+@template_rendered.connect_via(app)
+def _metrics_after_template(sender, template, context, **extra):
+    starts = g.metrics.get("template_start") if has_request_context() and "metrics" in g else None
+    if starts:
+        g.metrics["template"] += time.perf_counter() - starts.pop()
+
+
+@app.after_request
+def _metrics_record(response):
+    m = g.pop("metrics", None)
+    if m is None:
+        return response
+
+    endpoint = request.endpoint or "unknown"
+    labels = (endpoint,)
+    wall = time.perf_counter() - m["start"]
+    REQUEST_METRICS["wall"].observe(labels, wall)
+    REQUEST_METRICS["queries"].observe(labels, m["queries"])
+    REQUEST_METRICS["sql"].observe(labels, m["sql"])
+    REQUEST_METRICS["template"].observe(labels, m["template"])
+    with _request_counts_lock:
+        key = (endpoint, request.method, str(response.status_code))
+        _request_counts[key] = _request_counts.get(key, 0) + 1
+
+    # طلب بعدد استعلامات كبير غالباً فيه حلقة N+1
+    threshold = app.config.get("METRICS_QUERY_LOG_THRESHOLD", 20)
+    if threshold and m["queries"] > threshold:
+        app.logger.warning(
+            "%s %s ran %d SQL queries (%.1f ms SQL, %.1f ms total)",
+            request.method, request.full_path.rstrip("?"), m["queries"],
+            m["sql"] * 1000, wall * 1000,
+        )
+    return response
+
+
+def metrics_token_valid():
+    token = app.config.get("METRICS_TOKEN")
+    if not token:
+        return False
+    scheme, _, given = request.headers.get("Authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(given.strip().encode(), token.encode())
+
+
+@app.route("/metrics")
+def metrics():
+    """
+    المقاييس بصيغة Prometheus النصية، والقيم خاصة بالـ worker الذي أجاب على الطلب.
+    متاحة بتوكن METRICS_TOKEN أو لجلسة الأدمن فقط (ليس حسب عنوان العميل:
+    خلف reverse proxy محلي يأتي كل الزوار من 127.0.0.1).
+    """
+    if not metrics_enabled() or not (metrics_token_valid() or admin_required()):
+        return "Not Found", 404
+
+    lines = ["# HELP exam_requests_total Requests handled by this worker.",
+             "# TYPE exam_requests_total counter"]
+    with _request_counts_lock:
+        counts = sorted(_request_counts.items())
+    for (endpoint, method, status), count in counts:
+        lines.append(
+            f'exam_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}'
+        )
+    for histogram in REQUEST_METRICS.values():
+        lines.extend(histogram.render())
+
+    return "\n".join(lines) + "\n", 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+# ====================
+# إعداد حساب الأدمن (من ملف config ليكون جاهز للاستضافة)
+# ====================
+ADMIN_EMAIL = Config.ADMIN_EMAIL
+ADMIN_PASSWORD = Config.ADMIN_PASSWORD
+
+# ====================
+# ثوابت الصفوف / المسارات / الفصول
+# ====================
+
+# الصف الذي يُخزَّن مع الطالب (معلومات تعريفية فقط)
+STUDENT_GRADES = [
+    "العاشر",
+    "الأول الثانوي",
+    "الثاني الثانوي",
+]
+
+# لاختيار المواد داخل المنصة
+LEVEL_CHOICES = STUDENT_GRADES  # نفس الأسماء
+TRACK_CHOICES = ["أكاديمي", "مهني"]
+SEMESTER_CHOICES = ["الفصل الأول", "الفصل الثاني"]
+
+
+def build_grade_key(level: str, track: str, semester: str) -> str:
+    """
+    يبني مفتاح الصف للمادة، مثال:
+    "الثاني الثانوي – أكاديمي – الفصل الأول"
+    هذا النص هو الذي يجب أن تضعه في حقل grade عند إضافة المادة من الأدمن.
+    """
+    return f"{level} – {track} – {semester}"
+
+
+# ====================
+# نماذج قاعدة البيانات
+# ====================
+
+class Student(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    full_name = db.Column(db.String(120), nullable=False, index=True)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    # hash من werkzeug (الصفوف القديمة بالنص تُرقّى عند أول دخول)
+    password = db.Column(db.String(255), nullable=False)
+    # هنا نخزن الصف العام فقط: (العاشر / الأول الثانوي / الثاني الثانوي)
+    grade = db.Column(db.String(50), nullable=False)
+    # هل بُنيت مجاميع الطالب (StudentSubjectStat) من نتائجه السابقة؟
+    stats_built = db.Column(db.Boolean, nullable=False, default=False)
+    results = db.relationship("ExamResult", backref="student", lazy=True)
+
+
+class Subject(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    # هنا نخزن التركيبة الكاملة:
+    # مثال: "الثاني الثانوي – أكاديمي – الفصل الأول"
+    grade = db.Column(db.String(80), nullable=False)
+    default_duration = db.Column(db.Integer, default=40)
+    default_questions = db.Column(db.Integer, default=40)
+    # يزيد مع كل تغيير في بنك الأسئلة أو عدد الأسئلة (الأوراق الجاهزة القديمة تُهمل)
+    paper_version = db.Column(db.Integer, nullable=False, default=0)
+    questions = db.relationship("Question", backref="subject", lazy=True)
+
+    # قائمة مواد الصف مرتبة بالاسم (student_subjects)
+    __table_args__ = (
+        db.Index("ix_subject_grade_name", "grade", "name"),
+    )
+
+
+class Question(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey("subject.id"), nullable=False, index=True)
+    text = db.Column(db.Text, nullable=False)
+    option1 = db.Column(db.String(255), nullable=False)
+    option2 = db.Column(db.String(255), nullable=False)
+    option3 = db.Column(db.String(255), nullable=False)
+    option4 = db.Column(db.String(255), nullable=False)
+    # 1 أو 2 أو 3 أو 4
+    correct_option = db.Column(db.String(10), nullable=False)
+
+
+class ExamResult(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey("student.id"), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey("subject.id"), nullable=False)
+
+    # علاقة بالمادة لسهولة الوصول للاسم
+    subject = db.relationship("Subject", backref="results")
+
+    score = db.Column(db.Float, nullable=False)
+    correct_count = db.Column(db.Integer, nullable=False)
+    wrong_count = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.DateTime, default=datetime.utcnow)
+    # ترتيب الأسئلة كما سُحبت عند بدء الامتحان: "12,5,33,..."
+    question_order = db.Column(db.Text, nullable=True)
+    # هل دخلت هذه النتيجة في إحصائيات الأسئلة (update_item_analytics)؟
+    analyzed = db.Column(db.Boolean, nullable=False, default=False, index=True)
+    answers = db.relationship("ExamAnswer", backref="result", lazy=True)
+
+    # فهارس لتقسيم صفحات سجل النتائج (keyset على date, id) مع فلتر المادة،
+    # ولسجل الطالب في لوحته (student_id مرتب بالتاريخ)
+    __table_args__ = (
+        db.Index("ix_exam_result_date_id", "date", "id"),
+        db.Index("ix_exam_result_subject_date_id", "subject_id", "date", "id"),
+        db.Index("ix_exam_result_student_date", "student_id", "date"),
+    )
+
+
+class ExamAnswer(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    result_id = db.Column(db.Integer, db.ForeignKey("exam_result.id"), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey("question.id"), nullable=False)
+    student_answer = db.Column(db.String(10), nullable=False)
+    is_correct = db.Column(db.Boolean, nullable=False)
+
+    # إجابة واحدة لكل سؤال في الامتحان (يغطي أيضاً البحث بـ result_id)
+    __table_args__ = (
+        db.Index("uq_exam_answer_result_question", "result_id", "question_id", unique=True),
+        db.Index("ix_exam_answer_question_id", "question_id"),
+    )
+
+
+class AnswerEvent(db.Model):
+    """
+    سجل إجابات للإضافة فقط (وضع ANSWER_WRITE_MODE = "log"):
+    كل إجابة تُكتب كسطر جديد بدون قراءة أو تعديل، وتُحوَّل إلى
+    ExamAnswer وعدّادات ExamResult دفعة واحدة عند إنهاء الامتحان.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    result_id = db.Column(db.Integer, db.ForeignKey("exam_result.id"), nullable=False, index=True)
+    question_id = db.Column(db.Integer, nullable=False)
+    answer = db.Column(db.String(10), nullable=False)
+
+
+class ExamSession(db.Model):
+    """
+    حالة الامتحان الجاري على السيرفر (بدل تخزينها في كوكي الـ session):
+    ترتيب الأسئلة، السؤال الحالي، الموعد النهائي، والإجابات المختارة.
+    الكوكي يحمل فقط المعرّف العشوائي id.
+    """
+    id = db.Column(db.String(32), primary_key=True)
+    result_id = db.Column(db.Integer, db.ForeignKey("exam_result.id"), nullable=False, unique=True)
+    student_id = db.Column(db.Integer, db.ForeignKey("student.id"), nullable=False)
+    # "12,5,33,..." بنفس ترتيب الامتحان
+    question_ids = db.Column(db.Text, nullable=False)
+    total_questions = db.Column(db.Integer, nullable=True)
+    current_index = db.Column(db.Integer, nullable=False, default=0)
+    duration = db.Column(db.Integer, nullable=False)  # بالدقائق
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # الموعد النهائي على السيرفر (المرجع الوحيد، وليس عدّاد المتصفح)
+    deadline = db.Column(db.DateTime, nullable=False, index=True)
+    # {"question_id": "الخيار"} لعرض الإجابات بدون الرجوع لجدول ExamAnswer
+    answers = db.Column(db.Text, nullable=False, default="{}")
+    # ترتيب عرض الخيارات لكل سؤال "3142,1243,..." بنفس ترتيب question_ids (None = بدون خلط)
+    option_orders = db.Column(db.Text, nullable=True)
+
+    @property
+    def q_ids(self):
+        return [int(x) for x in self.question_ids.split(",") if x]
+
+    @property
+    def option_order_map(self):
+        """{question_id: [3, 1, 4, 2]} أو قاموس فارغ لو لم تُخلط الخيارات."""
+        if not self.option_orders:
+            return {}
+        return {
+            qid: [int(c) for c in order]
+            for qid, order in zip(self.q_ids, self.option_orders.split(","))
+        }
+
+    @property
+    def answer_map(self):
+        return json.loads(self.answers or "{}")
+
+
+class ExamPaper(db.Model):
+    """
+    ورقة امتحان جاهزة مسبقاً (وضع EXAM_PAPER_POOL): أسئلة بترتيب عشوائي
+    مع ترتيب عشوائي لخيارات كل سؤال. تُحذف لحظة استخدامها في exam_start.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.Integer, nullable=False)
+    # نسخة بنك الأسئلة (Subject.paper_version) وقت توليد الورقة
+    version = db.Column(db.Integer, nullable=False)
+    question_ids = db.Column(db.Text, nullable=False)
+    option_orders = db.Column(db.Text, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_exam_paper_subject_version_id", "subject_id", "version", "id"),
+    )
+
+
+class Job(db.Model):
+    """عملية أدمن طويلة تعمل في الخلفية (استيراد / حذف متسلسل)."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)
+    # queued / running / done / failed
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    params = db.Column(db.Text, nullable=False, default="{}")
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=True)
+    message = db.Column(db.Text, nullable=True)
+    # تفاصيل النتيجة بصيغة JSON (مثل الصفوف المرفوضة في الاستيراد)
+    result = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # العملية التي تنفّذ الـ job (host:pid)، لمعرفة الـ jobs اليتيمة بعد إعادة التشغيل
+    owner = db.Column(db.String(120), nullable=True)
+
+
+class DashboardStat(db.Model):
+    """
+    عدّادات لوحة الأدمن (students / subjects / questions / results):
+    تُعدَّل مع كل إضافة أو حذف من الأدمن، وتُعاد حسابها كاملة كل DASHBOARD_STATS_REFRESH ثانية.
+    """
+    key = db.Column(db.String(40), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    # وقت آخر إعادة حساب كاملة
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # أكبر id وقت آخر إعادة حساب (للعدّادات التي يضيف إليها مسار الطالب)
+    max_id = db.Column(db.Integer, nullable=True)
+
+
+class ItemStat(db.Model):
+    """
+    مجاميع تراكمية لكل سؤال من الامتحانات المنتهية، يُشتق منها:
+    الصعوبة (نسبة الإجابة الصحيحة)، التمييز (ارتباط الإجابة الصحيحة بعلامة
+    الامتحان)، ونسبة اختيار كل خيار.
+    """
+    question_id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.Integer, nullable=False, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+    option1_count = db.Column(db.Integer, nullable=False, default=0)
+    option2_count = db.Column(db.Integer, nullable=False, default=0)
+    option3_count = db.Column(db.Integer, nullable=False, default=0)
+    option4_count = db.Column(db.Integer, nullable=False, default=0)
+    # مجموع علامات الامتحانات التي ظهر فيها السؤال، ومربعاتها، ومجموعها عند الإجابة الصحيحة
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    score_sq_sum = db.Column(db.Float, nullable=False, default=0)
+    correct_score_sum = db.Column(db.Float, nullable=False, default=0)
+
+
+class StudentSubjectStat(db.Model):
+    """مجاميع نتائج الطالب في كل مادة، تُحدَّث عند إغلاق كل امتحان (لوحة الطالب)."""
+    student_id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.Integer, primary_key=True)
+    exams = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+    wrong = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    best_score = db.Column(db.Float, nullable=False, default=0)
+
+
+class SubjectScoreStat(db.Model):
+    """عدد الامتحانات المنتهية لكل مادة ومجموع علاماتها ومربعاتها (المتوسط والانحراف)."""
+    subject_id = db.Column(db.Integer, primary_key=True)
+    exams = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    score_sq_sum = db.Column(db.Float, nullable=False, default=0)
+
+
+class SubjectScoreBucket(db.Model):
+    """
+    توزيع علامات المادة: عدد الامتحانات في كل فئة (10 فئات: 0-9، 10-19، ... 90-100).
+    صف لكل فئة حتى يُزاد العدد داخل قاعدة البيانات مثل باقي المجاميع.
+    """
+    subject_id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+# أعمدة أُضيفت بعد الإصدار الأول: (الجدول, العمود, النوع)
+# create_all لا يعدّل الجداول الموجودة، لذلك نضيفها يدوياً إن لم توجد
+ADDED_COLUMNS = [
+    ("exam_result", "question_order", "TEXT"),
+    ("exam_session", "total_questions", "INTEGER"),
+    ("exam_result", "analyzed", "BOOLEAN NOT NULL DEFAULT FALSE"),
+    ("student", "stats_built", "BOOLEAN NOT NULL DEFAULT FALSE"),
+    ("subject", "paper_version", "INTEGER NOT NULL DEFAULT 0"),
+    ("exam_session", "option_orders", "TEXT"),
+    ("job", "owner", "VARCHAR(120)"),
+    ("dashboard_stat", "max_id", "INTEGER"),
+]
+
+
+def _dedupe_exam_answers(conn):
+    """حذف الإجابات المكرّرة لنفس السؤال في نفس الامتحان (نُبقي الأحدث) قبل الفهرس الفريد."""
+    conn.execute(sql_text(
+        "DELETE FROM exam_answer WHERE id NOT IN ("
+        "SELECT MAX(id) FROM exam_answer GROUP BY result_id, question_id)"
+    ))
+
+
+# تجهيزات تسبق إنشاء فهارس معيّنة على قاعدة قديمة
+INDEX_PREPARE = {
+    "uq_exam_answer_result_question": _dedupe_exam_answers,
+}
+
+
+# أعمدة نصية كبُر طولها بعد الإصدار الأول: (الجدول, العمود, الطول الجديد).
+# SQLite لا يفرض طول VARCHAR، فالتوسيع لـ Postgres فقط
+WIDENED_COLUMNS = [
+    # hash كلمة المرور (scrypt حوالي 162 حرفاً) بدل VARCHAR(120) القديم
+    ("student", "password", 255),
+]
+
+
+def migrate_schema():
+    """
+    ترقية قواعد البيانات القديمة (SQLite أو Postgres) عند بدء التشغيل:
+    إضافة الأعمدة الناقصة وتوسيع الأعمدة القصيرة، ثم الفهارس المعرّفة في النماذج.
+    آمنة للتكرار، ولا تفشل لو شغّلها أكثر من worker في نفس اللحظة.
+    """
+    inspector = inspect(db.engine)
+    for table, column, col_type in ADDED_COLUMNS:
+        existing = {c["name"] for c in inspector.get_columns(table)}
+        if column not in existing:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(sql_text(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}"))
+            except (OperationalError, ProgrammingError):
+                # worker آخر أضاف العمود قبلنا
+                inspector = inspect(db.engine)
+                if column not in {c["name"] for c in inspector.get_columns(table)}:
+                    raise
+
+    if db.engine.dialect.name == "postgresql":
+        for table, column, length in WIDENED_COLUMNS:
+            current = {c["name"]: c["type"] for c in inspector.get_columns(table)}.get(column)
+            if current is not None and (getattr(current, "length", None) or length) < length:
+                with db.engine.begin() as conn:
+                    conn.execute(sql_text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE VARCHAR({length})"))
+
+    for table in db.metadata.sorted_tables:
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if index.name in existing:
+                continue
+            with db.engine.begin() as conn:
+                prepare = INDEX_PREPARE.get(index.name)
+                if prepare:
+                    prepare(conn)
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+# إنشاء الجداول مرة واحدة عند بدء التطبيق (لـ Render أو التشغيل العادي)
+with app.app_context():
+    db.create_all()
+    migrate_schema()
+
+
+# ====================
+# سحب الأسئلة العشوائي (كاش معرّفات الأسئلة لكل مادة)
+# ====================
+
+# subject_id -> (وقت التحميل, tuple بمعرّفات الأسئلة)
+_question_ids_cache = {}
+_question_ids_lock = threading.Lock()
+
+
+def get_subject_question_ids(subject_id):
+    """
+    إرجاع معرّفات أسئلة المادة من الكاش، أو تحميلها من القاعدة مرة واحدة.
+    الكاش خاص بكل worker، لذلك له عمر محدود (QUESTION_IDS_CACHE_TTL)
+    حتى تصل تعديلات الأدمن من worker آخر بعد مدة قصيرة.
+    """
+    ttl = app.config.get("QUESTION_IDS_CACHE_TTL", 60)
+    entry = _question_ids_cache.get(subject_id)
+    if entry and time.monotonic() - entry[0] < ttl:
+        return entry[1]
+
+    rows = db.session.query(Question.id).filter_by(subject_id=subject_id).all()
+    ids = tuple(r[0] for r in rows)
+    with _question_ids_lock:
+        _question_ids_cache[subject_id] = (time.monotonic(), ids)
+    return ids
+
+
+def invalidate_subject_questions(subject_id):
+    """حذف كاش أسئلة المادة بعد أي تعديل على بنك الأسئلة."""
+    with _question_ids_lock:
+        _question_ids_cache.pop(subject_id, None)
+
+
+def sample_questions(subject_id, count):
+    """
+    اختيار count سؤالاً عشوائياً للمادة بدون ORDER BY random():
+    نختار المعرّفات في بايثون ثم نجلب الأسئلة باستعلام IN واحد
+    مع الحفاظ على الترتيب العشوائي.
+    """
+    ids = get_subject_question_ids(subject_id)
+    if not ids:
+        return []
+
+    picked = random.sample(ids, min(count, len(ids)))
+    rows = Question.query.filter(Question.id.in_(picked)).all()
+    by_id = {q.id: q for q in rows}
+
+    # لو حُذف سؤال من worker آخر نُسقط الكاش ليُعاد تحميله في الطلب القادم
+    if len(by_id) != len(picked):
+        invalidate_subject_questions(subject_id)
+
+    return [by_id[qid] for qid in picked if qid in by_id]
+
+
+# ====================
+# أوراق امتحان جاهزة مسبقاً (EXAM_PAPER_POOL)
+# ====================
+
+# توليد الأوراق في thread منفصل حتى لا يتأخر خلف عمليات الأدمن الطويلة
+_paper_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="paper-pool")
+_paper_refills = set()
+_paper_refill_lock = threading.Lock()
+
+# عدد الأوراق الأولى التي يُختار منها عشوائياً، حتى لا يتسابق كل الطلاب على نفس الورقة
+PAPER_CLAIM_SPREAD = 16
+
+
+def random_option_orders(count):
+    """ترتيب عشوائي لخيارات count سؤالاً: ["3142", "2413", ...]."""
+    orders = []
+    for _ in range(count):
+        order = ["1", "2", "3", "4"]
+        random.shuffle(order)
+        orders.append("".join(order))
+    return orders
+
+
+def refill_paper_pool(subject_id):
+    """
+    إكمال أوراق المادة حتى EXAM_PAPER_POOL_SIZE بنسخة البنك الحالية،
+    وحذف الأوراق المولّدة من نسخة أقدم.
+    """
+    subject = db.session.get(Subject, subject_id)
+    if subject is None:
+        return 0
+    version = subject.paper_version
+    count = subject.default_questions or 0
+
+    db.session.execute(
+        delete(ExamPaper)
+        .where(ExamPaper.subject_id == subject_id, ExamPaper.version != version)
+    )
+    have = db.session.scalar(
+        select(func.count())
+        .select_from(ExamPaper)
+        .where(ExamPaper.subject_id == subject_id, ExamPaper.version == version)
+    )
+    need = app.config.get("EXAM_PAPER_POOL_SIZE", 200) - have
+
+    # قراءة مباشرة من القاعدة (وليس كاش worker قد يكون أقدم من البنك الحالي)
+    ids = [r[0] for r in db.session.query(Question.id).filter_by(subject_id=subject_id).all()]
+    if need <= 0 or not ids or count <= 0:
+        db.session.commit()
+        return 0
+
+    size = min(count, len(ids))
+    shuffle = app.config.get("EXAM_SHUFFLE_OPTIONS", True)
+    db.session.execute(insert(ExamPaper), [
+        {
+            "subject_id": subject_id,
+            "version": version,
+            "question_ids": ",".join(str(qid) for qid in random.sample(ids, size)),
+            "option_orders": ",".join(random_option_orders(size) if shuffle else ["1234"] * size),
+        }
+        for _ in range(need)
+    ])
+    db.session.commit()
+    return need
+
+
+def _run_paper_refill(subject_id):
+    with app.app_context():
+        try:
+            refill_paper_pool(subject_id)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("paper pool refill failed for subject %s", subject_id)
+        finally:
+            with _paper_refill_lock:
+                _paper_refills.discard(subject_id)
+
+
+def schedule_paper_refill(subject_id):
+    """طلب إكمال أوراق المادة في الخلفية (مرة واحدة لكل مادة في نفس الوقت)."""
+    with _paper_refill_lock:
+        if subject_id in _paper_refills:
+            return
+        _paper_refills.add(subject_id)
+    _paper_executor.submit(_run_paper_refill, subject_id)
+
+
+def claim_exam_paper(subject):
+    """
+    أخذ ورقة جاهزة للمادة: SELECT على الفهرس ثم DELETE للورقة نفسها
+    (لو سبقنا طالب آخر إليها نجرّب غيرها). يُرجع (q_ids, option_orders)
+    أو None لو كان المخزون فارغاً، وعندها يعود exam_start للسحب العادي.
+    """
+    base = (
+        select(ExamPaper.id, ExamPaper.question_ids, ExamPaper.option_orders)
+        .where(ExamPaper.subject_id == subject.id, ExamPaper.version == subject.paper_version)
+        .order_by(ExamPaper.id)
+    )
+    for attempt in range(3):
+        paper = db.session.execute(base.offset(random.randrange(PAPER_CLAIM_SPREAD)).limit(1)).first()
+        if paper is None:
+            paper = db.session.execute(base.limit(1)).first()
+        if paper is None:
+            schedule_paper_refill(subject.id)
+            return None
+
+        taken = db.session.execute(
+            delete(ExamPaper)
+            .where(ExamPaper.id == paper.id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if taken:
+            break
+    else:
+        return None
+
+    # هل بقي EXAM_PAPER_POOL_LOW ورقة أو أقل؟ صف واحد بعد أول LOW صفاً على الفهرس، بدون count(*)
+    low = app.config.get("EXAM_PAPER_POOL_LOW", 50)
+    above_low = db.session.scalar(base.with_only_columns(ExamPaper.id).offset(low).limit(1))
+    if above_low is None:
+        schedule_paper_refill(subject.id)
+
+    q_ids = [int(x) for x in paper.question_ids.split(",") if x]
+    return q_ids, paper.option_orders
+
+
+def invalidate_exam_papers(subject_id):
+    """
+    بعد أي تغيير في بنك أسئلة المادة أو عدد أسئلتها (في وضع EXAM_PAPER_POOL فقط):
+    رفع نسخة البنك وحذف الأوراق القديمة في نفس transaction التغيير (الـ commit
+    على المستدعي)، ثم إعادة التوليد في الخلفية بعد الـ commit.
+    """
+    if not app.config.get("EXAM_PAPER_POOL"):
+        return
+    db.session.execute(
+        update(Subject)
+        .where(Subject.id == subject_id)
+        .values(paper_version=Subject.paper_version + 1)
+    )
+    db.session.execute(delete(ExamPaper).where(ExamPaper.subject_id == subject_id))
+    db.session.info.setdefault("paper_refills", set()).add(subject_id)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _schedule_paper_refills(db_session):
+    for subject_id in db_session.info.pop("paper_refills", ()):
+        schedule_paper_refill(subject_id)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _drop_paper_refills(db_session):
+    db_session.info.pop("paper_refills", None)
+
+
+@app.cli.command("fill-paper-pools")
+@click.option("--reset", is_flag=True,
+              help="حذف كل الأوراق أولاً (بعد تفعيل EXAM_PAPER_POOL من جديد، لأن تعديلات "
+                   "البنك أثناء التعطيل لا تُسقط الأوراق القديمة).")
+def fill_paper_pools_command(reset):
+    """تجهيز أوراق كل المواد مسبقاً (مثلاً قبل موعد امتحان الصف)."""
+    if reset:
+        db.session.execute(update(Subject).values(paper_version=Subject.paper_version + 1))
+        db.session.execute(delete(ExamPaper))
+        db.session.commit()
+    for (subject_id,) in db.session.query(Subject.id).all():
+        print(f"subject {subject_id}: +{refill_paper_pool(subject_id)} papers")
+
+
+# ====================
+# كاش قائمة المواد لكل صف (grade key)
+# ====================
+
+# grade_key -> SubjectCatalog
+_subject_catalog_cache = {}
+_subject_catalog_lock = threading.Lock()
+
+
+class SubjectCatalog:
+    """مواد صف واحد (صفوف خفيفة وليست كائنات ORM) مع ETag ووقت آخر تغيير."""
+
+    def __init__(self, subjects, etag, last_modified):
+        self.subjects = subjects
+        self.etag = etag
+        self.last_modified = last_modified
+        self.loaded_at = time.monotonic()
+
+
+def get_subject_catalog(grade_key):
+    """
+    مواد الصف من الكاش، أو من القاعدة مرة واحدة. الكاش خاص بكل worker،
+    لذلك له عمر محدود (SUBJECT_CATALOG_TTL) حتى تصل تعديلات الأدمن من
+    worker آخر. وقت آخر تغيير لا يتقدّم إلا إذا تغيّرت المواد فعلاً.
+    """
+    ttl = app.config.get("SUBJECT_CATALOG_TTL", 300)
+    entry = _subject_catalog_cache.get(grade_key)
+    if entry and time.monotonic() - entry.loaded_at < ttl:
+        return entry
+
+    subjects = tuple(
+        db.session.query(
+            Subject.id,
+            Subject.name,
+            Subject.grade,
+            Subject.default_duration,
+            Subject.default_questions,
+        )
+        .filter(Subject.grade == grade_key)
+        .order_by(Subject.name)
+        .all()
+    )
+    etag = hashlib.sha1(repr([tuple(s) for s in subjects]).encode("utf-8")).hexdigest()[:16]
+
+    last_modified = datetime.utcnow().replace(microsecond=0)
+    if entry and entry.etag == etag:
+        last_modified = entry.last_modified
+
+    entry = SubjectCatalog(subjects, etag, last_modified)
+    with _subject_catalog_lock:
+        _subject_catalog_cache[grade_key] = entry
+    return entry
+
+
+_templates_mtime = None
+
+
+def _templates_version():
+    """
+    آخر تعديل على ملفات القوالب أو على manifest الملفات الثابتة (روابطها داخل
+    الصفحات)؛ نفس القيمة في كل الـ workers، وتتغيّر مع كل نشر.
+    """
+    global _templates_mtime
+    if _templates_mtime is None:
+        folder = os.path.join(app.root_path, app.template_folder)
+        paths = [os.path.join(folder, name) for name in os.listdir(folder)]
+        paths.append(asset_manifest_path())
+        _templates_mtime = max(
+            (os.path.getmtime(path) for path in paths if os.path.exists(path)),
+            default=0,
+        )
+    return int(_templates_mtime)
+
+
+def invalidate_subject_catalog():
+    """حذف كاش قوائم المواد بعد إضافة أو تعديل أو حذف أي مادة."""
+    with _subject_catalog_lock:
+        _subject_catalog_cache.clear()
+
+
+# ====================
+# إحصائيات لوحة الأدمن (جدول عدّادات + كاش TTL)
+# ====================
+
+DASHBOARD_STAT_MODELS = {
+    "students": Student,
+    "subjects": Subject,
+    "questions": Question,
+    "results": ExamResult,
+}
+
+# عدّادات يضيف إليها مسار الطالب (التسجيل وبدء الامتحان): لا تُعدَّل مع كل إضافة
+# حتى لا يصبح صفها نقطة تزاحم بين الطلاب، بل تُحسب كـ value + عدد الصفوف بعد
+# max_id (على الـ primary key) عند تحميل اللوحة
+LIVE_DASHBOARD_STATS = ("students", "results")
+
+# (وقت التحميل, الإحصائيات, آخر النتائج)
+_dashboard_cache = {"at": 0.0, "data": None}
+_dashboard_lock = threading.Lock()
+
+
+def invalidate_dashboard_cache():
+    with _dashboard_lock:
+        _dashboard_cache["data"] = None
+
+
+def bump_dashboard_stats(**deltas):
+    """
+    تعديل عدّادات اللوحة بنفس transaction الإضافة أو الحذف (الـ commit على المستدعي).
+    مثال: bump_dashboard_stats(subjects=1) أو bump_dashboard_stats(questions=-5).
+    الحذف من عدّادات LIVE_DASHBOARD_STATS (من الأدمن فقط) يطلب إعادة حساب كاملة
+    عند تحميل اللوحة التالي، لأن الصفوف المحذوفة قد تكون بعد max_id.
+    """
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        if key in LIVE_DASHBOARD_STATS:
+            values = {"updated_at": None}
+        else:
+            values = {"value": DashboardStat.value + delta}
+        db.session.execute(
+            update(DashboardStat)
+            .where(DashboardStat.key == key)
+            .values(**values)
+        )
+    invalidate_dashboard_cache()
+
+
+def refresh_dashboard_stats():
+    """
+    إعادة حساب العدّادات بـ COUNT(*) كاملة (أول تشغيل، أو دورياً لتصحيح أي انحراف).
+    تعمل على اتصال مستقل حتى لا تتأثر بـ transaction الطلب الحالي.
+    """
+    now = datetime.utcnow()
+    with db.engine.begin() as conn:
+        # العدد وأكبر id في نفس الجملة، فالصفوف بعد max_id هي بالضبط غير المعدودة
+        rows = {
+            key: conn.execute(select(func.count(), func.max(model.id))).one()
+            for key, model in DASHBOARD_STAT_MODELS.items()
+        }
+        counts = {key: value for key, (value, _) in rows.items()}
+        existing = set(conn.scalars(select(DashboardStat.key)))
+        for key, (value, max_id) in rows.items():
+            values = {"value": value, "updated_at": now, "max_id": max_id or 0}
+            if key in existing:
+                conn.execute(
+                    update(DashboardStat)
+                    .where(DashboardStat.key == key)
+                    .values(**values)
+                )
+            else:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(DashboardStat).values(key=key, **values))
+                except IntegrityError:
+                    # worker آخر أنشأ الصف في نفس اللحظة
+                    pass
+    invalidate_dashboard_cache()
+    return counts
+
+
+def get_dashboard_data():
+    """
+    إحصائيات اللوحة وآخر 5 نتائج: من الكاش (DASHBOARD_STATS_TTL)، وإلا
+    قراءة صغيرة من جدول العدّادات + عدّ الصفوف الجديدة بعد max_id على الـ
+    primary key (LIVE_DASHBOARD_STATS) + استعلام آخر النتائج على الفهرس.
+    """
+    ttl = app.config.get("DASHBOARD_STATS_TTL", 30)
+    with _dashboard_lock:
+        if _dashboard_cache["data"] is not None and time.monotonic() - _dashboard_cache["at"] < ttl:
+            return _dashboard_cache["data"]
+
+    def read_stats():
+        return db.session.execute(
+            select(DashboardStat.key, DashboardStat.value, DashboardStat.updated_at, DashboardStat.max_id)
+        ).all()
+
+    rows = read_stats()
+    max_age = timedelta(seconds=app.config.get("DASHBOARD_STATS_REFRESH", 3600))
+    stale = any(updated_at is None or max_id is None or datetime.utcnow() - updated_at > max_age
+                for _, _, updated_at, max_id in rows)
+    if stale or {row.key for row in rows} != set(DASHBOARD_STAT_MODELS):
+        refresh_dashboard_stats()
+        rows = read_stats()
+
+    stats = {key: value for key, value, _, _ in rows}
+    for key, _, _, max_id in rows:
+        if key in LIVE_DASHBOARD_STATS:
+            model = DASHBOARD_STAT_MODELS[key]
+            stats[key] += db.session.scalar(
+                select(func.count()).select_from(model).where(model.id > (max_id or 0))
+            )
+
+    recent = (
+        db.session.query(
+            ExamResult.id,
+            Student.full_name.label("student_name"),
+            Subject.name.label("subject_name"),
+            ExamResult.score,
+            ExamResult.date,
+        )
+        .join(Student, ExamResult.student_id == Student.id)
+        .join(Subject, ExamResult.subject_id == Subject.id)
+        .order_by(ExamResult.date.desc())
+        .limit(5)
+        .all()
+    )
+
+    data = (stats, recent)
+    with _dashboard_lock:
+        _dashboard_cache["at"] = time.monotonic()
+        _dashboard_cache["data"] = data
+    return data
+
+
+@app.cli.command("refresh-stats")
+def refresh_stats_command():
+    """إعادة حساب عدّادات لوحة الأدمن (للتشغيل الدوري من cron)."""
+    counts = refresh_dashboard_stats()
+    print(", ".join(f"{key}={value}" for key, value in counts.items()))
+
+
+# ====================
+# تحليل الأسئلة (الصعوبة / التمييز / المشتتات / توزيع العلامات)
+# ====================
+
+# subject_id -> (وقت الحساب, النتائج)
+_analytics_cache = {}
+_analytics_lock = threading.Lock()
+_last_analytics_update = 0.0
+# إكمال التحديث في الخلفية لو بقيت نتائج بعد الدفعة التي تُعالج داخل الطلب
+_analytics_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analytics")
+_analytics_update_running = False
+
+SCORE_BUCKETS = 10
+
+
+def _unanalyzed_results(limit):
+    """نتائج امتحانات منتهية (لا توجد لها حالة امتحان جارية) لم تدخل الإحصائيات بعد."""
+    return (
+        select(ExamResult.id)
+        .where(
+            ExamResult.analyzed == False,  # noqa: E712 (مقارنة تستخدم الفهرس بعكس IS FALSE)
+            ~exists().where(ExamSession.result_id == ExamResult.id),
+        )
+        .order_by(ExamResult.id)
+        .limit(limit)
+    )
+
+
+def update_item_analytics(batch_size=None, max_batches=None):
+    """
+    إضافة الامتحانات المنتهية منذ آخر تشغيل إلى ItemStat و SubjectScoreStat و SubjectScoreBucket
+    (بدون إعادة قراءة الإجابات القديمة). كل دفعة في transaction واحدة:
+    تعليم النتائج analyzed ثم إضافة مجاميعها، فلو تسابق workerان على نفس
+    الدفعة يتراجع أحدهما ويعيد المحاولة بدل العدّ مرتين.
+    max_batches: حدّ لعدد الدفعات (داخل طلب الأدمن)، وبدونه حتى تنتهي كل النتائج.
+    """
+    batch_size = batch_size or app.config.get("ANALYTICS_BATCH_SIZE", 500)
+    processed = 0
+    batches = 0
+    touched_subjects = set()
+
+    while max_batches is None or batches < max_batches:
+        ids = db.session.scalars(_unanalyzed_results(batch_size)).all()
+        if not ids:
+            break
+        batches += 1
+
+        claimed = db.session.execute(
+            update(ExamResult)
+            .where(ExamResult.id.in_(ids), ExamResult.analyzed == False)  # noqa: E712
+            .values(analyzed=True)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if claimed != len(ids):
+            db.session.rollback()
+            continue
+
+        try:
+            touched_subjects |= _add_results_to_analytics(ids)
+            db.session.commit()
+        except IntegrityError:
+            # worker آخر أنشأ صف إحصائيات لنفس السؤال في نفس اللحظة
+            db.session.rollback()
+            continue
+        processed += len(ids)
+
+    for subject_id in touched_subjects:
+        invalidate_subject_analytics(subject_id)
+    return processed
+
+
+def _run_analytics_update():
+    global _analytics_update_running
+    with app.app_context():
+        try:
+            update_item_analytics()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("item analytics update failed")
+        finally:
+            with _analytics_lock:
+                _analytics_update_running = False
+
+
+def schedule_analytics_update():
+    """إكمال update_item_analytics في الخلفية (مرة واحدة لكل worker في نفس الوقت)."""
+    global _analytics_update_running
+    with _analytics_lock:
+        if _analytics_update_running:
+            return
+        _analytics_update_running = True
+    _analytics_executor.submit(_run_analytics_update)
+
+
+def _increment_stat(model, keys, fixed, increments):
+    """
+    زيادة عدّادات صف إحصائيات داخل قاعدة البيانات (col = col + n)، وإنشاؤه
+    إن لم يوجد. دفعات تحليل في workers مختلفة قد تزيد نفس الصف في نفس
+    اللحظة، فلا تُقرأ القيم إلى بايثون وتُكتب كقيم مطلقة.
+    """
+    where = [getattr(model, name) == value for name, value in keys.items()]
+    bump = (
+        update(model)
+        .where(*where)
+        .values({name: getattr(model, name) + value for name, value in increments.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(bump).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(**keys, **fixed, **increments))
+    except IntegrityError:
+        # دفعة أخرى أنشأت نفس الصف في نفس اللحظة
+        db.session.execute(bump)
+
+
+def _add_results_to_analytics(result_ids):
+    """إضافة مجاميع دفعة نتائج إلى جداول الإحصائيات (الـ commit على المستدعي)."""
+    score = ExamResult.score
+    is_correct = case((ExamAnswer.is_correct, 1), else_=0)
+    rows = db.session.execute(
+        select(
+            ExamAnswer.question_id,
+            Question.subject_id,
+            func.count(),
+            func.sum(is_correct),
+            *[func.sum(case((ExamAnswer.student_answer == str(k), 1), else_=0)) for k in range(1, 5)],
+            func.sum(score),
+            func.sum(score * score),
+            func.sum(case((ExamAnswer.is_correct, score), else_=0)),
+        )
+        .join(ExamResult, ExamResult.id == ExamAnswer.result_id)
+        .join(Question, Question.id == ExamAnswer.question_id)
+        .where(ExamAnswer.result_id.in_(result_ids))
+        .group_by(ExamAnswer.question_id, Question.subject_id)
+    ).all()
+
+    for qid, subject_id, n, correct, o1, o2, o3, o4, s_sum, s_sq, c_sum in rows:
+        _increment_stat(ItemStat, {"question_id": qid}, {"subject_id": subject_id}, {
+            "attempts": n, "correct": correct or 0,
+            "option1_count": o1 or 0, "option2_count": o2 or 0,
+            "option3_count": o3 or 0, "option4_count": o4 or 0,
+            "score_sum": s_sum or 0, "score_sq_sum": s_sq or 0, "correct_score_sum": c_sum or 0,
+        })
+
+    # توزيع العلامات لكل مادة (العلامة 100 في آخر فئة)
+    exam_score = func.coalesce(ExamResult.score, 0)
+    bucket = case((exam_score >= 100, SCORE_BUCKETS - 1),
+                  else_=cast(exam_score / (100 / SCORE_BUCKETS), db.Integer))
+    by_subject = set()
+    for subject_id, exams, s_sum, s_sq in db.session.execute(
+        select(ExamResult.subject_id, func.count(), func.sum(exam_score),
+               func.sum(exam_score * exam_score))
+        .where(ExamResult.id.in_(result_ids))
+        .group_by(ExamResult.subject_id)
+    ):
+        by_subject.add(subject_id)
+        _increment_stat(SubjectScoreStat, {"subject_id": subject_id}, {},
+                        {"exams": exams, "score_sum": s_sum, "score_sq_sum": s_sq})
+    for subject_id, index, count in db.session.execute(
+        select(ExamResult.subject_id, bucket, func.count())
+        .where(ExamResult.id.in_(result_ids))
+        .group_by(ExamResult.subject_id, bucket)
+    ):
+        _increment_stat(SubjectScoreBucket, {"subject_id": subject_id, "bucket": int(index)}, {},
+                        {"count": count})
+
+    return by_subject
+
+
+def _item_metrics(stats):
+    """
+    حساب مؤشرات كل سؤال من مجاميعه:
+    - difficulty: نسبة الإجابات الصحيحة (p)
+    - discrimination: معامل الارتباط الثنائي النقطي بين صحة الإجابة وعلامة الامتحان
+    - option_rates: نسبة اختيار كل خيار من الخيارات الأربعة
+    بـ NumPy: عمليات على مصفوفات لكل أسئلة المادة بدل حلقة لكل سؤال.
+    """
+    if not stats:
+        return {}
+
+    arr = np.array([
+        (st.attempts, st.correct, st.score_sum, st.score_sq_sum, st.correct_score_sum,
+         st.option1_count, st.option2_count, st.option3_count, st.option4_count)
+        for st in stats
+    ], dtype=float)
+    n, x, sy, syy, sxy = arr[:, 0], arr[:, 1], arr[:, 2], arr[:, 3], arr[:, 4]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        difficulty = np.where(n > 0, x / n, np.nan)
+        den = np.sqrt((n * x - x * x) * (n * syy - sy * sy))
+        discrimination = np.where(den > 0, (n * sxy - x * sy) / den, np.nan)
+        rates = np.where(n[:, None] > 0, arr[:, 5:9] / n[:, None], np.nan)
+
+    def clean(v):
+        return None if np.isnan(v) else round(float(v), 3)
+
+    return {
+        st.question_id: {
+            "attempts": st.attempts,
+            "difficulty": clean(difficulty[i]),
+            "discrimination": clean(discrimination[i]),
+            "option_rates": [clean(v) for v in rates[i]],
+        }
+        for i, st in enumerate(stats)
+    }
+
+
+def get_subject_analytics(subject_id):
+    """
+    مؤشرات أسئلة المادة وتوزيع علامات امتحاناتها، من الكاش (ANALYTICS_CACHE_TTL).
+    قبل القراءة تُضاف دفعة واحدة من الامتحانات الجديدة، مرة كل ANALYTICS_UPDATE_INTERVAL
+    ثانية لكل worker، والباقي (أول زيارة بعد موجة امتحانات مثلاً) يُكمَل في الخلفية
+    وتُعرض آخر إحصائيات محسوبة حتى ينتهي.
+    """
+    global _last_analytics_update
+    interval = app.config.get("ANALYTICS_UPDATE_INTERVAL", 300)
+    if time.monotonic() - _last_analytics_update >= interval:
+        _last_analytics_update = time.monotonic()
+        update_item_analytics(max_batches=1)
+        if db.session.scalar(_unanalyzed_results(1)) is not None:
+            schedule_analytics_update()
+
+    ttl = app.config.get("ANALYTICS_CACHE_TTL", 300)
+    with _analytics_lock:
+        entry = _analytics_cache.get(subject_id)
+        if entry and time.monotonic() - entry[0] < ttl:
+            return entry[1]
+
+    items = _item_metrics(ItemStat.query.filter_by(subject_id=subject_id).all())
+
+    distribution = None
+    st = db.session.get(SubjectScoreStat, subject_id)
+    if st and st.exams:
+        mean = st.score_sum / st.exams
+        variance = max(st.score_sq_sum / st.exams - mean * mean, 0)
+        buckets = [0] * SCORE_BUCKETS
+        for index, count in db.session.execute(
+            select(SubjectScoreBucket.bucket, SubjectScoreBucket.count)
+            .where(SubjectScoreBucket.subject_id == subject_id)
+        ):
+            buckets[index] = count
+        width = 100 // SCORE_BUCKETS
+        distribution = {
+            "exams": st.exams,
+            "mean": round(mean, 1),
+            "std": round(variance ** 0.5, 1),
+            "buckets": [
+                {"label": f"{i * width}-{i * width + width - 1 if i < SCORE_BUCKETS - 1 else 100}",
+                 "count": count,
+                 "percent": round(count * 100 / st.exams, 1)}
+                for i, count in enumerate(buckets)
+            ],
+        }
+
+    data = {"items": items, "distribution": distribution}
+    with _analytics_lock:
+        _analytics_cache[subject_id] = (time.monotonic(), data)
+    return data
+
+
+def invalidate_subject_analytics(subject_id):
+    with _analytics_lock:
+        _analytics_cache.pop(subject_id, None)
+
+
+@app.cli.command("update-analytics")
+def update_analytics_command():
+    """إضافة الامتحانات المنتهية الجديدة إلى إحصائيات الأسئلة."""
+    print(f"analyzed {update_item_analytics()} exam results")
+
+
+@app.cli.command("rebuild-analytics")
+def rebuild_analytics_command():
+    """
+    إعادة بناء إحصائيات الأسئلة من الصفر (مثلاً بعد حذف نتائج أو تعديل
+    الإجابة الصحيحة لسؤال، لأن الإحصائيات التراكمية لا تطرح ما حُذف).
+    """
+    db.session.execute(delete(ItemStat))
+    db.session.execute(delete(SubjectScoreStat))
+    db.session.execute(delete(SubjectScoreBucket))
+    db.session.execute(update(ExamResult).values(analyzed=False))
+    db.session.commit()
+    with _analytics_lock:
+        _analytics_cache.clear()
+    print(f"analyzed {update_item_analytics()} exam results")
+
+
+# ====================
+# مجاميع الطالب (لوحة الطالب)
+# ====================
+
+def add_to_student_stats(result_ids):
+    """
+    إضافة نتائج امتحانات أُغلقت للتو إلى مجاميع طلابها (الـ commit على المستدعي).
+    الطالب الذي لم تُبنَ مجاميعه بعد يُتجاهل، لأن rebuild_student_stats ستشملها.
+    """
+    if not result_ids:
+        return
+    rows = db.session.execute(
+        select(
+            ExamResult.student_id,
+            ExamResult.subject_id,
+            func.count(),
+            func.sum(ExamResult.correct_count),
+            func.sum(ExamResult.wrong_count),
+            func.sum(ExamResult.score),
+            func.max(ExamResult.score),
+        )
+        .join(Student, Student.id == ExamResult.student_id)
+        .where(ExamResult.id.in_(result_ids), Student.stats_built == True)  # noqa: E712
+        .group_by(ExamResult.student_id, ExamResult.subject_id)
+    ).all()
+
+    for student_id, subject_id, exams, correct, wrong, score_sum, best in rows:
+        key = and_(StudentSubjectStat.student_id == student_id,
+                   StudentSubjectStat.subject_id == subject_id)
+        bump = (
+            update(StudentSubjectStat)
+            .where(key)
+            .values(
+                exams=StudentSubjectStat.exams + exams,
+                correct=StudentSubjectStat.correct + correct,
+                wrong=StudentSubjectStat.wrong + wrong,
+                score_sum=StudentSubjectStat.score_sum + score_sum,
+                best_score=case((StudentSubjectStat.best_score < best, best),
+                                else_=StudentSubjectStat.best_score),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if db.session.execute(bump).rowcount:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(StudentSubjectStat).values(
+                    student_id=student_id, subject_id=subject_id, exams=exams,
+                    correct=correct, wrong=wrong, score_sum=score_sum, best_score=best,
+                ))
+        except IntegrityError:
+            # امتحان آخر لنفس الطالب والمادة أنشأ الصف في نفس اللحظة
+            db.session.execute(bump)
+
+
+def rebuild_student_stats(student_id):
+    """بناء مجاميع الطالب من كل امتحاناته المنتهية (أول زيارة، أو بعد حذف نتيجة)."""
+    db.session.execute(delete(StudentSubjectStat).where(StudentSubjectStat.student_id == student_id))
+    rows = db.session.execute(
+        select(
+            ExamResult.subject_id,
+            func.count(),
+            func.sum(ExamResult.correct_count),
+            func.sum(ExamResult.wrong_count),
+            func.sum(ExamResult.score),
+            func.max(ExamResult.score),
+        )
+        .where(
+            ExamResult.student_id == student_id,
+            ~exists().where(ExamSession.result_id == ExamResult.id),
+        )
+        .group_by(ExamResult.subject_id)
+    ).all()
+    if rows:
+        db.session.execute(insert(StudentSubjectStat), [
+            {"student_id": student_id, "subject_id": subject_id, "exams": exams,
+             "correct": correct, "wrong": wrong, "score_sum": score_sum, "best_score": best}
+            for subject_id, exams, correct, wrong, score_sum, best in rows
+        ])
+    db.session.execute(update(Student).where(Student.id == student_id).values(stats_built=True))
+
+
+def get_student_stats(student):
+    """مجاميع الطالب لكل مادة (أفضل علامة ومتوسط) مع اسم المادة، مرتبة بالاسم."""
+    if not student.stats_built:
+        rebuild_student_stats(student.id)
+        db.session.commit()
+
+    rows = (
+        db.session.query(StudentSubjectStat, Subject.name)
+        .join(Subject, Subject.id == StudentSubjectStat.subject_id)
+        .filter(StudentSubjectStat.student_id == student.id)
+        .order_by(Subject.name)
+        .all()
+    )
+    return [{
+        "subject_name": name,
+        "exams": st.exams,
+        "correct": st.correct,
+        "wrong": st.wrong,
+        "best": st.best_score,
+        "average": st.score_sum / st.exams if st.exams else 0,
+    } for st, name in rows]
+
 
 # ====================
-# إعداد حساب الأدمن (من ملف config ليكون جاهز للاستضافة)
+# الملفات الثابتة (بصمة في الاسم + ضغط مسبق) وتجهيز القوالب
 # ====================
-ADMIN_EMAIL = Config.ADMIN_EMAIL
-ADMIN_PASSWORD = Config.ADMIN_PASSWORD
 
-# ====================
-# ثوابت الصفوف / المسارات / الفصول
-# ====================
+# مجلد النسخ المبنية داخل static/ (لا تُحفظ في git، تُبنى بـ flask build-assets عند النشر)
+ASSET_DIR = "dist"
+# الملفات المبنية لا تتغيّر أبداً (أي تعديل = اسم جديد)، فتُحفظ في المتصفح لمدة سنة
+ASSET_MAX_AGE = 365 * 24 * 3600
+# أنواع الملفات التي يفيدها الضغط (الصور مضغوطة أصلاً)
+COMPRESSIBLE_ASSETS = {".css", ".js", ".svg", ".ttf", ".otf", ".json", ".txt"}
 
-# الصف الذي يُخزَّن مع الطالب (معلومات تعريفية فقط)
-STUDENT_GRADES = [
-    "العاشر",
-    "الأول الثانوي",
-    "الثاني الثانوي",
-]
+# تعليقات ونصوص بين علامات تنصيص: التعليقات تُحذف والنصوص تبقى كما هي
+_CSS_TOKEN_RE = re.compile(r"""/\*.*?\*/|"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'""", re.S)
 
-# لاختيار المواد داخل المنصة
-LEVEL_CHOICES = STUDENT_GRADES  # نفس الأسماء
-TRACK_CHOICES = ["أكاديمي", "مهني"]
-SEMESTER_CHOICES = ["الفصل الأول", "الفصل الثاني"]
 
+def asset_manifest_path():
+    return os.path.join(app.static_folder, ASSET_DIR, "manifest.json")
 
-def build_grade_key(level: str, track: str, semester: str) -> str:
+
+def _minify_css_code(code):
+    code = re.sub(r"\s+", " ", code)
+    code = re.sub(r"\s*([{};,])\s*", r"\1", code)
+    code = re.sub(r":\s+", ":", code)
+    return code.replace(";}", "}")
+
+
+def minify_css(css):
+    """تصغير CSS بسيط وآمن: حذف التعليقات والمسافات الزائدة بدون لمس النصوص بين علامات التنصيص."""
+    out = []
+    pos = 0
+    for match in _CSS_TOKEN_RE.finditer(css):
+        out.append(_minify_css_code(css[pos:match.start()]))
+        if not match.group().startswith("/*"):
+            out.append(match.group())
+        pos = match.end()
+    out.append(_minify_css_code(css[pos:]))
+    return "".join(out).strip()
+
+
+def build_static_assets():
     """
-    يبني مفتاح الصف للمادة، مثال:
-    "الثاني الثانوي – أكاديمي – الفصل الأول"
-    هذا النص هو الذي يجب أن تضعه في حقل grade عند إضافة المادة من الأدمن.
+    نسخة من كل ملف في static/ باسم فيه hash لمحتواه (CSS بعد التصغير)، مع
+    نسخ .gz و .br للملفات النصية، ثم manifest.json: الاسم الأصلي -> المبني.
+    النسخ القديمة تبقى حتى تعمل الصفحات المفتوحة أثناء النشر.
     """
-    return f"{level} – {track} – {semester}"
+    out_dir = os.path.join(app.static_folder, ASSET_DIR)
+    manifest = {}
+    for root, dirs, files in os.walk(app.static_folder):
+        if os.path.abspath(root) == os.path.abspath(app.static_folder):
+            dirs[:] = [d for d in dirs if d != ASSET_DIR]
+        for name in sorted(files):
+            rel = os.path.relpath(os.path.join(root, name), app.static_folder).replace(os.sep, "/")
+            with open(os.path.join(root, name), "rb") as fh:
+                data = fh.read()
+            base, ext = os.path.splitext(rel)
+            if ext.lower() == ".css":
+                data = minify_css(data.decode("utf-8")).encode("utf-8")
+
+            hashed = f"{ASSET_DIR}/{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            target = os.path.join(app.static_folder, *hashed.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as fh:
+                fh.write(data)
+
+            encodings = []
+            if ext.lower() in COMPRESSIBLE_ASSETS:
+                variants = [
+                    ("br", ".br", brotli.compress(data, quality=11)),
+                    ("gzip", ".gz", gzip.compress(data, 9, mtime=0)),
+                ]
+                for encoding, suffix, compressed in variants:
+                    if len(compressed) < len(data):
+                        with open(target + suffix, "wb") as fh:
+                            fh.write(compressed)
+                        encodings.append(encoding)
+            manifest[rel] = {"path": hashed, "encodings": encodings}
+
+    tmp_path = asset_manifest_path() + ".tmp"
+    os.makedirs(out_dir, exist_ok=True)
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=1, ensure_ascii=False)
+    os.replace(tmp_path, asset_manifest_path())
+    load_asset_manifest()
+    return manifest
+
+
+# الاسم الأصلي -> المبني، والمبني -> الترميزات المتوفرة (br / gzip)
+_asset_paths = {}
+_asset_encodings = {}
+
+
+def load_asset_manifest():
+    """قراءة manifest.json عند بدء التشغيل؛ بدونه تُخدم الملفات الأصلية كما هي."""
+    global _asset_paths, _asset_encodings
+    try:
+        with open(asset_manifest_path(), encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        manifest = {}
+    _asset_paths = {rel: entry["path"] for rel, entry in manifest.items()}
+    _asset_encodings = {entry["path"]: entry["encodings"] for entry in manifest.values()}
+
+
+load_asset_manifest()
+
+
+@app.url_defaults
+def _fingerprint_static_url(endpoint, values):
+    """url_for('static', filename='style.css') -> الاسم المبني إن وُجد."""
+    if endpoint == "static" and values.get("filename") in _asset_paths:
+        values["filename"] = _asset_paths[values["filename"]]
+
+
+def static_asset(filename):
+    """
+    خدمة الملفات الثابتة: المبنية بـ Cache-Control immutable ونسخة br/gzip
+    المضغوطة مسبقاً حسب Accept-Encoding، والباقي كما يخدمه Flask عادةً.
+    """
+    encodings = _asset_encodings.get(filename)
+    if encodings is None:
+        return app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if encoding in encodings and request.accept_encodings[encoding]:
+            response = send_from_directory(app.static_folder, filename + suffix,
+                                           mimetype=mimetype, max_age=ASSET_MAX_AGE)
+            response.headers["Content-Encoding"] = encoding
+            break
+    else:
+        response = send_from_directory(app.static_folder, filename,
+                                       mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+app.view_functions["static"] = static_asset
+
+
+@app.cli.command("build-assets")
+def build_assets_command():
+    """بناء الملفات الثابتة للنشر (مثلاً في build command على Render قبل تشغيل gunicorn)."""
+    manifest = build_static_assets()
+    compressed = sum(1 for entry in manifest.values() if entry["encodings"])
+    print(f"built {len(manifest)} assets ({compressed} precompressed)")
+
+
+def precompile_templates():
+    """
+    ترجمة كل قوالب Jinja عند بدء الـ worker (تبقى في كاش البيئة)، حتى لا
+    يدفع أول طالب بعد النشر زمن الترجمة.
+    """
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
+if app.config.get("PRECOMPILE_TEMPLATES", True):
+    precompile_templates()
 
 
 # ====================
-# نماذج قاعدة البيانات
+# كلمات المرور (تشفير وتحقق في threads محدودة)
 # ====================
 
-class Student(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    full_name = db.Column(db.String(120), nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(120), nullable=False)
-    # هنا نخزن الصف العام فقط: (العاشر / الأول الثانوي / الثاني الثانوي)
-    grade = db.Column(db.String(50), nullable=False)
-    results = db.relationship("ExamResult", backref="student", lazy=True)
+# التحقق من كلمة المرور مكلف عمداً، فيتم في مجموعة threads صغيرة لكل worker.
+# لو امتلأت (دخول كل المدرسة في نفس اللحظة) نرد بـ 503 بدل حجز كل الـ workers.
+_password_executor = ThreadPoolExecutor(
+    max_workers=app.config.get("PASSWORD_HASH_WORKERS", 2),
+    thread_name_prefix="password-hash",
+)
+# عدد العمليات المسموح بها (قيد التنفيذ + في الانتظار) لكل worker
+_password_slots = threading.BoundedSemaphore(app.config.get("PASSWORD_HASH_QUEUE", 32))
 
+PASSWORD_HASH_PREFIXES = ("pbkdf2:", "scrypt:")
 
-class Subject(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), nullable=False)
-    # هنا نخزن التركيبة الكاملة:
-    # مثال: "الثاني الثانوي – أكاديمي – الفصل الأول"
-    grade = db.Column(db.String(80), nullable=False)
-    default_duration = db.Column(db.Integer, default=40)
-    default_questions = db.Column(db.Integer, default=40)
-    questions = db.relationship("Question", backref="subject", lazy=True)
 
+class PasswordBusy(Exception):
+    """لا يوجد مكان في مجموعة threads التحقق حالياً."""
 
-class Question(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    subject_id = db.Column(db.Integer, db.ForeignKey("subject.id"), nullable=False)
-    text = db.Column(db.Text, nullable=False)
-    option1 = db.Column(db.String(255), nullable=False)
-    option2 = db.Column(db.String(255), nullable=False)
-    option3 = db.Column(db.String(255), nullable=False)
-    option4 = db.Column(db.String(255), nullable=False)
-    # 1 أو 2 أو 3 أو 4
-    correct_option = db.Column(db.String(10), nullable=False)
 
+def is_password_hash(stored):
+    """هل القيمة المخزّنة hash من werkzeug؟ (الصفوف القديمة فيها كلمة المرور نصاً)"""
+    return bool(stored) and stored.startswith(PASSWORD_HASH_PREFIXES) and stored.count("$") == 2
 
-class ExamResult(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.Integer, db.ForeignKey("student.id"), nullable=False)
-    subject_id = db.Column(db.Integer, db.ForeignKey("subject.id"), nullable=False)
 
-    # علاقة بالمادة لسهولة الوصول للاسم
-    subject = db.relationship("Subject", backref="results")
+def _check_password(stored, password, method):
+    """
+    يرجع (صحيحة؟, hash جديد أو None). الـ hash الجديد يُحسب لو كانت القيمة
+    المخزّنة نصاً عادياً أو بكلفة غير PASSWORD_HASH_METHOD الحالية.
+    """
+    if is_password_hash(stored):
+        if not check_password_hash(stored, password):
+            return False, None
+        if stored.split("$", 1)[0] == method:
+            return True, None
+    elif not hmac.compare_digest(stored.encode("utf-8"), password.encode("utf-8")):
+        return False, None
+    return True, generate_password_hash(password, method=method)
+
+
+def _run_password_task(fn, *args):
+    if not _password_slots.acquire(blocking=False):
+        raise PasswordBusy()
+    try:
+        future = _password_executor.submit(fn, *args)
+    except BaseException:
+        _password_slots.release()
+        raise
+    future.add_done_callback(lambda _: _password_slots.release())
+    try:
+        return future.result(timeout=app.config.get("PASSWORD_HASH_TIMEOUT", 10))
+    except FuturesTimeout:
+        raise PasswordBusy()
+
+
+def hash_password(password):
+    """hash لكلمة مرور جديدة بالخوارزمية والكلفة في PASSWORD_HASH_METHOD."""
+    return _run_password_task(generate_password_hash, password,
+                              app.config.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000"))
+
+
+# method -> hash لكلمة مرور عشوائية، للتحقق عند بريد غير مسجّل
+_dummy_password_hashes = {}
+
+
+def _check_unknown_account(password, method):
+    """نفس كلفة التحقق لبريد غير مسجّل، حتى لا يكشف زمن الدخول الحسابات الموجودة."""
+    dummy = _dummy_password_hashes.get(method)
+    if dummy is None:
+        dummy = _dummy_password_hashes[method] = generate_password_hash(uuid.uuid4().hex, method=method)
+    check_password_hash(dummy, password)
+    return False, None
+
+
+def verify_password(stored, password):
+    """
+    التحقق من كلمة المرور، ويرجع (صحيحة؟, hash جديد للترقية أو None).
+    stored = None (بريد غير مسجّل) يمر بنفس التحقق على hash وهمي.
+    """
+    if not password:
+        return False, None
+    method = app.config.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+    if not stored:
+        return _run_password_task(_check_unknown_account, password, method)
+    return _run_password_task(_check_password, stored, password, method)
 
-    score = db.Column(db.Float, nullable=False)
-    correct_count = db.Column(db.Integer, nullable=False)
-    wrong_count = db.Column(db.Integer, nullable=False)
-    date = db.Column(db.DateTime, default=datetime.utcnow)
-    answers = db.relationship("ExamAnswer", backref="result", lazy=True)
 
+def password_busy_response(template, **context):
+    return render_template(
+        template,
+        error="الخادم مشغول حالياً، يرجى إعادة المحاولة بعد لحظات.",
+        **context
+    ), 503, {"Retry-After": "2"}
 
-class ExamAnswer(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    result_id = db.Column(db.Integer, db.ForeignKey("exam_result.id"), nullable=False)
-    question_id = db.Column(db.Integer, db.ForeignKey("question.id"), nullable=False)
-    student_answer = db.Column(db.String(10), nullable=False)
-    is_correct = db.Column(db.Boolean, nullable=False)
 
-# إنشاء الجداول مرة واحدة عند بدء التطبيق (لـ Render أو التشغيل العادي)
-with app.app_context():
-    db.create_all()
-    
 # ====================
 #  مسارات الطلاب
 # ====================
@@ -137,21 +1885,29 @@ def register():
                 error="البريد الإلكتروني مستخدم مسبقاً!"
             )
 
-        student = Student(
-            full_name=full_name,
-            email=email,
-            grade=grade,
-            password=password
-        )
-        db.session.add(student)
-        db.session.commit()
+        # التشفير قبل قفل الكتابة حتى لا يحجزه
+        try:
+            password_hash = hash_password(password or "")
+        except PasswordBusy:
+            return password_busy_response("register.html", grades=STUDENT_GRADES)
 
+        run_write(_create_student, full_name, email, grade, password_hash)
         return redirect(url_for("login"))
 
     # GET
     return render_template("register.html", grades=STUDENT_GRADES)
 
 
+def _create_student(full_name, email, grade, password_hash):
+    student = Student(
+        full_name=full_name,
+        email=email,
+        grade=grade,
+        password=password_hash
+    )
+    db.session.add(student)
+
+
 @app.route("/forgot_password", methods=["GET", "POST"])
 def forgot_password():
     if request.method == "POST":
@@ -174,28 +1930,40 @@ def reset_password():
         return redirect(url_for("forgot_password"))
 
     if request.method == "POST":
-        new_password = request.form.get("password")
-
-        user = Student.query.filter_by(email=session["reset_email"]).first()
-        if user:
-            user.password = new_password
-            db.session.commit()
+        try:
+            password_hash = hash_password(request.form.get("password") or "")
+        except PasswordBusy:
+            return password_busy_response("reset_password.html")
 
+        run_write(_save_new_password, session["reset_email"], password_hash)
         session.pop("reset_email", None)
         return redirect(url_for("login"))
 
     return render_template("reset_password.html")
 
 
+def _save_new_password(email, password_hash):
+    user = Student.query.filter_by(email=email).first()
+    if user:
+        user.password = password_hash
+
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         email = request.form.get("email")
         password = request.form.get("password")
 
-        student = Student.query.filter_by(email=email, password=password).first()
+        student = Student.query.filter_by(email=email).first()
+
+        try:
+            valid, new_hash = verify_password(student.password if student else None, password)
+        except PasswordBusy:
+            return password_busy_response("login.html")
 
-        if student:
+        if valid:
+            if new_hash:
+                _upgrade_password(student, new_hash)
             session["student_id"] = student.id
             session["student_name"] = student.full_name
             session["grade"] = student.grade
@@ -207,6 +1975,23 @@ def login():
     return render_template("login.html")
 
 
+def _upgrade_password(student, new_hash):
+    """
+    حفظ hash جديد (صف قديم بكلمة مرور نصية أو كلفة قديمة). لو كانت القاعدة
+    مشغولة نتجاهل الترقية، وتتم في الدخول القادم.
+    """
+    student.password = new_hash
+    try:
+        if sqlite_write_mode():
+            with sqlite_write_lock():
+                db.session.commit()
+        else:
+            db.session.commit()
+    except OperationalError:
+        db.session.rollback()
+        app.logger.warning("could not upgrade password hash for student %s", student.id)
+
+
 @app.route("/logout")
 def logout():
     session.clear()
@@ -214,47 +1999,66 @@ def logout():
 
 
 @app.route("/student/dashboard")
+@use_read_replica
 def student_dashboard():
     """لوحة الطالب التي تُظهر السجل والإحصائيات."""
     if "student_id" not in session:
         return redirect(url_for("login"))
 
     student = Student.query.get_or_404(session["student_id"])
+    per_subject = get_student_stats(student)
 
-    # كل نتائج الطالب مع اسم المادة
-    results_query = (
-        db.session.query(ExamResult, Subject.name.label("subject_name"))
+    # صفحة واحدة من السجل (keyset على date, id) بدل تحميل كل النتائج
+    query = (
+        db.session.query(
+            ExamResult.id,
+            ExamResult.date,
+            ExamResult.score,
+            ExamResult.correct_count,
+            ExamResult.wrong_count,
+            Subject.name.label("subject_name"),
+        )
         .join(Subject, ExamResult.subject_id == Subject.id)
         .filter(ExamResult.student_id == student.id)
-        .order_by(ExamResult.date.desc())
-        .all()
+    )
+    page_size = app.config.get("STUDENT_HISTORY_PAGE_SIZE", 20)
+    rows, older_url, newer_url = keyset_page(
+        query, request.args, page_size, lambda **cursor: url_for("student_dashboard", **cursor)
     )
 
-    results = []
-    total_correct = 0
-    total_wrong = 0
-
-    for res, subject_name in results_query:
-        results.append({
-            "subject_name": subject_name,
-            "date": res.date.strftime("%Y-%m-%d %H:%M"),
-            "score": res.score,
-            "correct": res.correct_count,
-            "wrong": res.wrong_count,
-        })
-        total_correct += res.correct_count
-        total_wrong += res.wrong_count
-
-    total_exams = len(results)
+    results = [{
+        "subject_name": r.subject_name,
+        "date": r.date.strftime("%Y-%m-%d %H:%M"),
+        "score": r.score,
+        "correct": r.correct_count,
+        "wrong": r.wrong_count,
+    } for r in rows]
+
+    # تقدير آخر امتحان (من أول صفحة مباشرة، وإلا باستعلام واحد على الفهرس)
+    if rows and newer_url is None:
+        last_score = rows[0].score
+    else:
+        last_score = db.session.scalar(
+            select(ExamResult.score)
+            .where(ExamResult.student_id == student.id)
+            .order_by(ExamResult.date.desc(), ExamResult.id.desc())
+            .limit(1)
+        )
 
     return render_template(
         "student_dashboard.html",
         student=student,
-        total_exams=total_exams,
-        total_correct=total_correct,
-        total_wrong=total_wrong,
+        total_exams=sum(st["exams"] for st in per_subject),
+        total_correct=sum(st["correct"] for st in per_subject),
+        total_wrong=sum(st["wrong"] for st in per_subject),
+        per_subject=per_subject,
+        last_score=last_score,
         results=results,
+        older_url=older_url,
+        newer_url=newer_url,
     )
+
+
 @app.route("/contact")
 def contact():
     return render_template("contact.html")
@@ -305,9 +2109,27 @@ def student_subjects():
         # لم يختَر الصف بعد
         return redirect(url_for("choose_grade"))
 
-    subjects = Subject.query.filter_by(grade=grade_key).order_by(Subject.name).all()
+    catalog = get_subject_catalog(grade_key)
+
+    # الصفحة تعرض أيضاً اسم الطالب في الشريط العلوي، وتتغيّر مع تحديث القوالب
+    etag = hashlib.sha1(
+        f"{catalog.etag}:{grade_key}:{session.get('student_name')}:"
+        f"{session.get('is_admin')}:{_templates_version()}".encode("utf-8")
+    ).hexdigest()[:16]
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=catalog.last_modified):
+        response = app.response_class(status=304)
+    else:
+        response = app.make_response(
+            render_template("student_subjects.html", subjects=catalog.subjects)
+        )
 
-    return render_template("student_subjects.html", subjects=subjects)
+    response.set_etag(etag)
+    response.last_modified = catalog.last_modified
+    # صفحة خاصة بالطالب: المتصفح يحفظها لكن يتحقق منها في كل زيارة
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 # ====================
 # الامتحان
@@ -321,48 +2143,461 @@ def exam_start(subject_id):
     subject = Subject.query.get_or_404(subject_id)
 
     if request.method == "POST":
-        total_q = subject.default_questions
-        questions = (
-            Question.query
-            .filter_by(subject_id=subject.id)
-            .order_by(func.random())
-            .limit(total_q)
-            .all()
-        )
+        paper_pool = app.config.get("EXAM_PAPER_POOL")
+        # السحب العادي قراءة فقط، فيتم قبل قسم الكتابة
+        sampled = None if paper_pool else [q.id for q in sample_questions(subject.id, subject.default_questions)]
 
-        if not questions:
+        if not run_write(_create_exam, subject, sampled):
             return render_template(
                 "exam_start.html",
                 subject=subject,
                 error="لا توجد أسئلة لهذه المادة بعد."
             )
 
-        # إنشاء سجل نتيجة مبدئي
-        result = ExamResult(
-            student_id=session["student_id"],
-            subject_id=subject.id,
-            score=0,
-            correct_count=0,
-            wrong_count=0,
+        # وضع الصفحة الواحدة: كل الأسئلة في طلب واحد والتنقّل في المتصفح
+        if app.config.get("EXAM_SINGLE_PAGE"):
+            return redirect(url_for("exam_take_all"))
+        return redirect(url_for("exam_take"))
+
+    return render_template("exam_start.html", subject=subject)
+
+
+def _create_exam(subject, sampled=None):
+    """
+    قسم الكتابة في exam_start: أخذ ورقة من المخزون (أو الأسئلة المسحوبة
+    sampled)، وإنشاء النتيجة المبدئية وحالة الامتحان. يُرجع False لو لا أسئلة.
+    """
+    paper = claim_exam_paper(subject) if app.config.get("EXAM_PAPER_POOL") else None
+    if paper:
+        q_ids, option_orders = paper
+    else:
+        if sampled is None:
+            sampled = [q.id for q in sample_questions(subject.id, subject.default_questions)]
+        q_ids = sampled
+        option_orders = None
+        if app.config.get("EXAM_PAPER_POOL") and app.config.get("EXAM_SHUFFLE_OPTIONS", True):
+            option_orders = ",".join(random_option_orders(len(q_ids)))
+
+    if not q_ids:
+        return False
+
+    # إنشاء سجل نتيجة مبدئي
+    result = ExamResult(
+        student_id=session["student_id"],
+        subject_id=subject.id,
+        score=0,
+        correct_count=0,
+        wrong_count=0,
+        question_order=",".join(str(qid) for qid in q_ids),
+    )
+    db.session.add(result)
+    db.session.flush()
+
+    # حفظ بيانات الامتحان على السيرفر، والكوكي يحمل المعرّف فقط
+    start_exam_session(result, q_ids, subject.default_duration, option_orders)
+    return True
+
+
+# ====================
+# حالة الامتحان على السيرفر (ExamSession)
+# ====================
+
+def start_exam_session(result, q_ids, duration, option_orders=None):
+    """إنشاء حالة امتحان جديدة ووضع معرّفها فقط في كوكي الـ session."""
+    now = datetime.utcnow()
+    exam_session = ExamSession(
+        id=uuid.uuid4().hex,
+        result_id=result.id,
+        student_id=result.student_id,
+        question_ids=",".join(str(qid) for qid in q_ids),
+        total_questions=len(q_ids),
+        current_index=0,
+        duration=duration,
+        started_at=now,
+        deadline=now + timedelta(minutes=duration),
+        answers="{}",
+        option_orders=option_orders,
+    )
+    db.session.add(exam_session)
+    session["exam_sid"] = exam_session.id
+    return exam_session
+
+
+def current_exam_session():
+    """حالة الامتحان الجاري للطالب الحالي، أو None."""
+    sid = session.get("exam_sid")
+    if not sid:
+        return None
+
+    exam_session = db.session.get(ExamSession, sid)
+    if exam_session is None or exam_session.student_id != session.get("student_id"):
+        session.pop("exam_sid", None)
+        # الامتحان انتهى على السيرفر (أو الكوكي قديم): يستخدمها no_exam_redirect
+        g.exam_ended = True
+        return None
+    return exam_session
+
+
+def no_exam_redirect():
+    """
+    لا يوجد امتحان جارٍ. لو كان الكوكي يشير إلى امتحان انتهى على السيرفر (مثلاً
+    أنهاه sweep_expired_exams قبل أن يرسل عدّاد المتصفح exam_finish) نعرض نتيجة
+    آخر امتحان منتهٍ للطالب، وإلا نعود لقائمة المواد.
+    """
+    if g.get("exam_ended"):
+        finished = db.session.scalar(
+            select(ExamResult.id)
+            .where(
+                ExamResult.student_id == session.get("student_id"),
+                ~exists().where(ExamSession.result_id == ExamResult.id),
+            )
+            .order_by(ExamResult.id.desc())
+            .limit(1)
         )
-        db.session.add(result)
-        db.session.commit()
+        if finished:
+            return redirect(url_for("exam_result", result_id=finished))
+    return redirect(url_for("student_subjects"))
 
-        # حفظ بيانات الامتحان في الـ session
-        session["exam_id"] = result.id
-        session["exam_questions"] = [q.id for q in questions]
-        session["exam_index"] = 0
-        session["exam_duration"] = subject.default_duration  # بالدقائق
 
-        return redirect(url_for("exam_take"))
+def exam_answer_map(exam_session):
+    """
+    إجابات الامتحان الجاري {"question_id": "الخيار"}. في وضع "log" لا تُحدَّث
+    ExamSession.answers مع كل إجابة، فتُضاف إليها أحداث AnswerEvent (آخر إجابة
+    لكل سؤال) باستعلام واحد على فهرس result_id.
+    """
+    answer_map = exam_session.answer_map
+    if app.config.get("ANSWER_WRITE_MODE") == "log":
+        events = db.session.execute(
+            select(AnswerEvent.question_id, AnswerEvent.answer)
+            .where(AnswerEvent.result_id == exam_session.result_id)
+            .order_by(AnswerEvent.id)
+        )
+        answer_map.update((str(qid), answer) for qid, answer in events)
+    return answer_map
 
-    return render_template("exam_start.html", subject=subject)
 
+def exam_expired(exam_session):
+    """هل انتهى وقت الامتحان حسب السيرفر؟ (مع مهلة بسيطة لتأخر الشبكة)"""
+    grace = timedelta(seconds=app.config.get("EXAM_DEADLINE_GRACE", 30))
+    return datetime.utcnow() > exam_session.deadline + grace
+
+
+def exam_remaining_seconds(exam_session):
+    """الثواني المتبقية حتى الموعد النهائي، لعدّاد المتصفح."""
+    remaining = (exam_session.deadline - datetime.utcnow()).total_seconds()
+    return max(0, int(remaining))
+
+
+def sweep_expired_exams(now=None):
+    """
+    إنهاء كل الامتحانات التي تجاوزت موعدها النهائي دفعة واحدة
+    (مثلاً لو أغلق الطالب الصفحة قبل الإنهاء):
+    UPDATE واحد يحسب العلامة لكل النتائج، ثم DELETE لحالات الامتحان.
+    """
+    grace = timedelta(seconds=app.config.get("EXAM_DEADLINE_GRACE", 30))
+    cutoff = (now or datetime.utcnow()) - grace
+
+    expired = select(ExamSession.result_id).where(ExamSession.deadline < cutoff)
+
+    expired_ids = db.session.scalars(expired).all()
+    # إجابات وضع "log" تُحوَّل أولاً لكل الامتحانات المنتهية دفعة واحدة
+    materialize_answer_events(expired_ids)
+
+    # total_questions قد يكون NULL (حالات أُنشئت قبل إضافة العمود): نعدّ الفواصل في question_ids
+    question_ids = func.coalesce(ExamSession.question_ids, "")
+    counted = case(
+        (question_ids == "", 0),
+        else_=func.length(question_ids) - func.length(func.replace(question_ids, ",", "")) + 1,
+    )
+    total = (
+        select(func.coalesce(ExamSession.total_questions, counted))
+        .where(ExamSession.result_id == ExamResult.id)
+        .scalar_subquery()
+    )
+
+    res = db.session.execute(
+        update(ExamResult)
+        .where(ExamResult.id.in_(expired))
+        .values(
+            # الأسئلة التي لم يُجب عنها تُحسب خاطئة، كما في _finalize_exam
+            wrong_count=total - ExamResult.correct_count,
+            score=case((total > 0, ExamResult.correct_count * 100.0 / total), else_=0),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    add_to_student_stats(expired_ids)
+    db.session.execute(
+        delete(ExamSession)
+        .where(ExamSession.deadline < cutoff)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return res.rowcount
+
+
+_last_sweep = 0.0
+
+
+def run_expired_exam_sweep():
+    """sweep_expired_exams مرة كل EXAM_SWEEP_INTERVAL ثانية لكل worker، بدون رفع أخطاء."""
+    global _last_sweep
+    interval = app.config.get("EXAM_SWEEP_INTERVAL", 60)
+    if not interval or time.monotonic() - _last_sweep < interval:
+        return
+    _last_sweep = time.monotonic()
+    try:
+        if sqlite_write_mode():
+            with sqlite_write_lock():
+                sweep_expired_exams()
+        else:
+            sweep_expired_exams()
+    except Exception:
+        db.session.rollback()
+        app.logger.exception("expired exam sweep failed")
+
+
+@app.before_request
+def _maybe_sweep_expired_exams():
+    """تشغيل الـ sweep بشكل كسول مع الطلبات (في وضع ASGI يشغّله asgi.py في thread)."""
+    if async_request():
+        return
+    try:
+        run_expired_exam_sweep()
+    finally:
+        # كتابات الـ sweep (في transaction منفصلة) ليست كتابات المستخدم: لا
+        # تُلغي القراءة من الـ replica ولا تُلصقه بالقاعدة الرئيسية
+        g.pop("db_wrote", None)
+
+
+@app.cli.command("sweep-exams")
+def sweep_exams_command():
+    """إنهاء الامتحانات المنتهية وقتها (للتشغيل الدوري من cron)."""
+    count = sweep_expired_exams()
+    print(f"finalized {count} expired exams")
+
+
+def end_exam_session(exam_session):
+    """حذف حالة الامتحان بعد انتهائه (الـ commit على المستدعي)."""
+    db.session.delete(exam_session)
+    session.pop("exam_sid", None)
+
+
+def _save_answers(result, answers, exam_session=None):
+    """
+    حفظ مجموعة إجابات لنفس الامتحان في transaction واحدة (الـ commit على المستدعي، عبر run_write).
+    answers: قاموس {question_id: الخيار المختار}.
+    دفعتان لنفس الامتحان قد تتسابقان (sendBeacon عند إغلاق الصفحة مع fetch
+    لم يكتمل، أو تبويبان)، فلا شيء يُقرأ إلى بايثون ويُكتب كقيمة مطلقة:
+    - الإجابات الجديدة بـ INSERT ... ON CONFLICT DO NOTHING على الفهرس الفريد
+    - الإجابات الموجودة بـ UPDATE مشروط يرجع فقط ما تغيّرت صحته فعلاً
+    - عدّادات الصح/الخطأ في ExamResult تُزاد داخل قاعدة البيانات بالفرق
+    - ExamSession.answers (حالة الامتحان على السيرفر) تُدمج داخل قاعدة البيانات
+    في وضع "log" تُضاف الإجابات إلى AnswerEvent فقط (بدون قراءة).
+    """
+    if not answers:
+        return 0
+
+    if app.config.get("ANSWER_WRITE_MODE") == "log":
+        return _append_answer_events(result, answers, exam_session)
+
+    correct_by_qid = dict(
+        db.session.query(Question.id, Question.correct_option)
+        .filter(Question.id.in_(list(answers)))
+        .all()
+    )
+    graded = {
+        qid: (selected, selected == correct_by_qid[qid])
+        for qid, selected in answers.items()
+        if qid in correct_by_qid
+    }
+    if not graded:
+        return 0
+
+    inserted = set(db.session.scalars(
+        _upsert_insert(ExamAnswer)
+        .values([
+            {"result_id": result.id, "question_id": qid, "student_answer": selected, "is_correct": ok}
+            for qid, (selected, ok) in graded.items()
+        ])
+        .on_conflict_do_nothing(index_elements=["result_id", "question_id"])
+        .returning(ExamAnswer.question_id)
+    ))
+    correct_delta = sum(1 for qid in inserted if graded[qid][1])
+    wrong_delta = len(inserted) - correct_delta
+
+    existing = {qid: graded[qid] for qid in graded if qid not in inserted}
+    if existing:
+        this_result = and_(ExamAnswer.result_id == result.id, ExamAnswer.question_id.in_(list(existing)))
+        # على Postgres ينتظر UPDATE المتزامن قفل الصف ثم يعيد فحص الشرط،
+        # فلا تُحسب نفس الإجابة مرتين
+        for ok in (True, False):
+            qids = [qid for qid, (_, is_ok) in existing.items() if is_ok == ok]
+            if not qids:
+                continue
+            flipped = len(db.session.scalars(
+                update(ExamAnswer)
+                .where(this_result, ExamAnswer.question_id.in_(qids), ExamAnswer.is_correct != ok)
+                .values(is_correct=ok)
+                .returning(ExamAnswer.question_id)
+                .execution_options(synchronize_session=False)
+            ).all())
+            correct_delta += flipped if ok else -flipped
+            wrong_delta += -flipped if ok else flipped
+        db.session.execute(
+            update(ExamAnswer)
+            .where(this_result)
+            .values(student_answer=case(
+                {qid: selected for qid, (selected, _) in existing.items()},
+                value=ExamAnswer.question_id,
+            ))
+            .execution_options(synchronize_session=False)
+        )
+
+    if correct_delta or wrong_delta:
+        db.session.execute(
+            update(ExamResult)
+            .where(ExamResult.id == result.id)
+            .values(correct_count=ExamResult.correct_count + correct_delta,
+                    wrong_count=ExamResult.wrong_count + wrong_delta)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.expire(result, ["correct_count", "wrong_count"])
+
+    if exam_session is not None:
+        _merge_session_answers(exam_session, {qid: selected for qid, (selected, _) in graded.items()})
+
+    return len(graded)
+
+
+def _upsert_insert(model):
+    """INSERT يدعم on_conflict_do_nothing/do_update حسب القاعدة (SQLite أو Postgres)."""
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(model)
+
+
+def _merge_session_answers(exam_session, answers):
+    """دمج إجابات في ExamSession.answers (JSON) داخل قاعدة البيانات بدل كتابتها كاملة."""
+    patch = json.dumps({str(qid): selected for qid, selected in answers.items()})
+    current = func.coalesce(ExamSession.answers, "{}")
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import JSONB
+        merged = cast(cast(current, JSONB).op("||")(cast(patch, JSONB)), db.Text)
+    else:
+        merged = func.json_patch(current, patch)
+    db.session.execute(
+        update(ExamSession)
+        .where(ExamSession.id == exam_session.id)
+        .values(answers=merged)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.expire(exam_session, ["answers"])
+
+
+def _append_answer_events(result, answers, exam_session=None):
+    """كتابة الإجابات كأحداث جديدة بـ INSERT واحد، بدون قراءة ExamAnswer أو ExamResult."""
+    if exam_session is not None:
+        allowed = set(exam_session.q_ids)
+        answers = {qid: sel for qid, sel in answers.items() if qid in allowed}
+    if not answers:
+        return 0
+
+    # لا نعيد كتابة ExamSession.answers: exam_answer_map تبنيها من الأحداث عند القراءة
+    db.session.execute(insert(AnswerEvent), [
+        {"result_id": result.id, "question_id": qid, "answer": selected}
+        for qid, selected in answers.items()
+    ])
+    return len(answers)
+
+
+def materialize_answer_events(result_ids):
+    """
+    تحويل أحداث AnswerEvent لمجموعة امتحانات إلى صفوف ExamAnswer
+    (آخر إجابة لكل سؤال) ثم إعادة حساب correct_count و wrong_count
+    بجملة UPDATE واحدة. لا يعمل commit (على المستدعي).
+    """
+    result_ids = list(result_ids)
+    if not result_ids:
+        return 0
+
+    events = (
+        db.session.query(AnswerEvent.result_id, AnswerEvent.question_id, AnswerEvent.answer)
+        .filter(AnswerEvent.result_id.in_(result_ids))
+        .order_by(AnswerEvent.id)
+        .all()
+    )
+    if not events:
+        return 0
+
+    # آخر إجابة لكل (امتحان, سؤال)
+    latest = {}
+    for rid, qid, ans in events:
+        latest[(rid, qid)] = ans
+
+    correct_by_qid = dict(
+        db.session.query(Question.id, Question.correct_option)
+        .filter(Question.id.in_({qid for _, qid in latest}))
+        .all()
+    )
+    existing = {
+        (a.result_id, a.question_id): a
+        for a in ExamAnswer.query.filter(ExamAnswer.result_id.in_(result_ids)).all()
+    }
+
+    new_rows = []
+    for (rid, qid), ans in latest.items():
+        if qid not in correct_by_qid:
+            continue
+        is_correct = (ans == correct_by_qid[qid])
+        row = existing.get((rid, qid))
+        if row:
+            row.student_answer = ans
+            row.is_correct = is_correct
+        else:
+            new_rows.append({
+                "result_id": rid,
+                "question_id": qid,
+                "student_answer": ans,
+                "is_correct": is_correct,
+            })
+    db.session.flush()
+    if new_rows:
+        db.session.execute(insert(ExamAnswer), new_rows)
+
+    def count_answers(correct):
+        return (
+            select(func.count(ExamAnswer.id))
+            .where(ExamAnswer.result_id == ExamResult.id, ExamAnswer.is_correct.is_(correct))
+            .scalar_subquery()
+        )
+
+    db.session.execute(
+        update(ExamResult)
+        .where(ExamResult.id.in_(result_ids))
+        .values(correct_count=count_answers(True), wrong_count=count_answers(False))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        delete(AnswerEvent)
+        .where(AnswerEvent.result_id.in_(result_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+    # النتائج المحمّلة في الـ session أصبحت قديمة بعد الـ UPDATE
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, ExamResult) and obj.id in result_ids:
+            db.session.expire(obj)
+
+    return len(latest)
 
-def _finalize_exam(exam_id, q_ids):
-    """حساب النتيجة النهائية وتنظيف الـ session."""
-    result = ExamResult.query.get_or_404(exam_id)
-    total = len(q_ids) if q_ids else 0
+
+def _finalize_exam(exam_session):
+    """حساب النتيجة النهائية وحذف حالة الامتحان (الـ commit على المستدعي، عبر run_write)."""
+    materialize_answer_events([exam_session.result_id])
+    result = ExamResult.query.get_or_404(exam_session.result_id)
+    total = len(exam_session.q_ids)
 
     # لو ما تم احتساب عدد الأسئلة الخاطئة نكمله هنا
     if total and result.correct_count + result.wrong_count != total:
@@ -373,15 +2608,39 @@ def _finalize_exam(exam_id, q_ids):
     else:
         result.score = 0
 
-    db.session.commit()
+    add_to_student_stats([result.id])
+
+    # تنظيف بيانات الامتحان
+    end_exam_session(exam_session)
+    return result.id
+
+
+def _set_current_index(exam_session, index):
+    exam_session.current_index = index
+
+
+def _take_step(exam_session, question_id, selected, finish, next_index):
+    """
+    قسم الكتابة في exam_take: حفظ الإجابة ثم إنهاء الامتحان أو الانتقال
+    للسؤال next_index. يُرجع معرّف النتيجة لو انتهى الامتحان، وإلا None.
+    """
+    result = ExamResult.query.get_or_404(exam_session.result_id)
+
+    if selected:
+        _save_answers(result, {question_id: selected}, exam_session)
+
+    if finish:
+        materialize_answer_events([result.id])
+        total = len(exam_session.q_ids) or 1
+        result.score = (result.correct_count / total) * 100
+        add_to_student_stats([result.id])
 
-    # تنظيف بيانات الامتحان من الجلسة
-    session.pop("exam_id", None)
-    session.pop("exam_questions", None)
-    session.pop("exam_index", None)
-    session.pop("exam_duration", None)
+        # تنظيف بيانات الامتحان
+        end_exam_session(exam_session)
+        return result.id
 
-    return result
+    exam_session.current_index = next_index
+    return None
 
 
 @app.route("/exam/take", methods=["GET", "POST"])
@@ -389,14 +2648,19 @@ def exam_take():
     if "student_id" not in session:
         return redirect(url_for("login"))
 
-    exam_id = session.get("exam_id")
-    q_ids = session.get("exam_questions")
+    exam_session = current_exam_session()
+    if exam_session is None:
+        return no_exam_redirect()
 
-    if not exam_id or not q_ids:
-        return redirect(url_for("student_subjects"))
+    # انتهى الوقت على السيرفر: ننهي الامتحان بدون قبول إجابات جديدة
+    if exam_expired(exam_session):
+        result_id = run_write(_finalize_exam, exam_session)
+        return redirect(url_for("exam_result", result_id=result_id))
+
+    q_ids = exam_session.q_ids
 
-    # رقم السؤال الحالي المخزَّن في السيشن
-    index = session.get("exam_index", 0)
+    # رقم السؤال الحالي المخزَّن في حالة الامتحان
+    index = exam_session.current_index
 
     # لو جاء رقم سؤال من شريط التنقّل (GET ?index=...)
     if request.method == "GET":
@@ -409,8 +2673,9 @@ def exam_take():
 
             # منع الخروج عن حدود الأسئلة
             idx_from_url = max(0, min(idx_from_url, len(q_ids) - 1))
-            index = idx_from_url
-            session["exam_index"] = index
+            if idx_from_url != index:
+                index = idx_from_url
+                run_write(_set_current_index, exam_session, index)
 
     # حفظ إجابة الطالب عند الضغط على "التالي" أو "إنهاء الامتحان"
     if request.method == "POST":
@@ -419,75 +2684,16 @@ def exam_take():
         current_index = int(request.form.get("current_index", index))
         action = request.form.get("action", "next")
 
-        result = ExamResult.query.get_or_404(exam_id)
-        question = Question.query.get_or_404(question_id)
-
-        if selected:
-            # هل يوجد إجابة سابقة لنفس السؤال؟
-            answer_row = ExamAnswer.query.filter_by(
-                result_id=exam_id,
-                question_id=question.id
-            ).first()
-
-            is_correct = (selected == question.correct_option)
-
-            if answer_row:
-                # عدّل عدّاد الصح/الخطأ لو تغيّرت النتيجة
-                if answer_row.is_correct and not is_correct:
-                    result.correct_count -= 1
-                    result.wrong_count += 1
-                elif not answer_row.is_correct and is_correct:
-                    result.correct_count += 1
-                    result.wrong_count -= 1
-
-                answer_row.student_answer = selected
-                answer_row.is_correct = is_correct
-            else:
-                answer_row = ExamAnswer(
-                    result_id=exam_id,
-                    question_id=question.id,
-                    student_answer=selected,
-                    is_correct=is_correct
-                )
-                db.session.add(answer_row)
-
-                if is_correct:
-                    result.correct_count += 1
-                else:
-                    result.wrong_count += 1
-
-            db.session.commit()
-
-        # لو ضغط "إنهاء الامتحان" ننهي مباشرة
-        if action == "finish":
-            total = len(q_ids) or 1
-            result.score = (result.correct_count / total) * 100
-            db.session.commit()
-
-            # تنظيف بيانات الامتحان من السيشن
-            session.pop("exam_id", None)
-            session.pop("exam_questions", None)
-            session.pop("exam_index", None)
-            session.pop("exam_duration", None)
-
-            return redirect(url_for("exam_result", result_id=result.id))
-
         # الانتقال للسؤال التالي
         index = current_index + 1
-        session["exam_index"] = index
 
-        # لو وصلنا لنهاية الأسئلة نحسب النتيجة وننهي
-        if index >= len(q_ids):
-            total = len(q_ids) or 1
-            result.score = (result.correct_count / total) * 100
-            db.session.commit()
-
-            session.pop("exam_id", None)
-            session.pop("exam_questions", None)
-            session.pop("exam_index", None)
-            session.pop("exam_duration", None)
-
-            return redirect(url_for("exam_result", result_id=result.id))
+        # لو ضغط "إنهاء الامتحان" أو وصل لنهاية الأسئلة ننهي مباشرة
+        finished_id = run_write(
+            _take_step, exam_session, question_id, selected,
+            finish=action == "finish" or index >= len(q_ids), next_index=index,
+        )
+        if finished_id:
+            return redirect(url_for("exam_result", result_id=finished_id))
 
     # تأمين عدم الخروج عن النطاق
     if index >= len(q_ids):
@@ -496,66 +2702,206 @@ def exam_take():
     current_q_id = q_ids[index]
     question = Question.query.get_or_404(current_q_id)
 
-    duration = session.get("exam_duration", 40)
+    duration = exam_session.duration
     total_questions = len(q_ids)
 
-    # تجهيز بيانات الإجابات لاستخدامها في الواجهة
-    all_answers = ExamAnswer.query.filter_by(result_id=exam_id).all()
-    answers_by_qid = {a.question_id: a for a in all_answers}
+    # الإجابات محفوظة مع حالة الامتحان، فلا حاجة لقراءة جدول ExamAnswer
+    answers_by_qid = exam_answer_map(exam_session)
 
     # الإجابة المحفوظة للسؤال الحالي (لـ saved_answer في الـ HTML)
-    current_answer_row = answers_by_qid.get(current_q_id)
     saved_answer = None
-    if current_answer_row and current_answer_row.student_answer:
+    if answers_by_qid.get(str(current_q_id)):
         try:
-            saved_answer = int(current_answer_row.student_answer)
+            saved_answer = int(answers_by_qid[str(current_q_id)])
         except ValueError:
             saved_answer = None
 
     # الأسئلة التي تمّت الإجابة عنها (لـ answered في شريط الأرقام)
     answered = {}
     for i, qid in enumerate(q_ids):
-        if qid in answers_by_qid:
+        if str(qid) in answers_by_qid:
             answered[i] = True
 
+    # الخيارات بترتيب العرض، وقيمة كل خيار رقمه الأصلي (التصحيح لا يتغيّر)
+    order = exam_session.option_order_map.get(current_q_id, [1, 2, 3, 4])
+    options = [(n, getattr(question, f"option{n}")) for n in order]
+
     return render_template(
         "exam_take.html",
         question=question,
+        options=options,
         index=index,
         total_questions=total_questions,
         duration=duration,
+        remaining=exam_remaining_seconds(exam_session),
         saved_answer=saved_answer,
         answered=answered,
     )
 
 
-@app.route("/exam/result/<int:result_id>")
-def exam_result(result_id):
+@app.route("/exam/take/all")
+def exam_take_all():
+    """
+    وضع الصفحة الواحدة: إرسال كل أسئلة الامتحان مرة واحدة (بدون الإجابات
+    الصحيحة)، والتنقّل بين الأسئلة يتم في المتصفح، والإجابات تُرسل على
+    دفعات إلى exam_sync_answers.
+    """
     if "student_id" not in session:
         return redirect(url_for("login"))
 
-    result = ExamResult.query.get_or_404(result_id)
+    exam_session = current_exam_session()
+    if exam_session is None:
+        return no_exam_redirect()
 
-    # منع طالب آخر من رؤية نتيجة غيره
-    if result.student_id != session["student_id"]:
-        return redirect(url_for("student_subjects"))
+    if exam_expired(exam_session):
+        result_id = run_write(_finalize_exam, exam_session)
+        return redirect(url_for("exam_result", result_id=result_id))
+
+    q_ids = exam_session.q_ids
+
+    rows = (
+        db.session.query(
+            Question.id,
+            Question.text,
+            Question.option1,
+            Question.option2,
+            Question.option3,
+            Question.option4,
+        )
+        .filter(Question.id.in_(q_ids))
+        .all()
+    )
+    by_id = {r.id: r for r in rows}
+
+    # نحافظ على ترتيب الأسئلة كما سُحبت عند بدء الامتحان، والخيارات بترتيب العرض
+    orders = exam_session.option_order_map
+    questions = [
+        {
+            "id": r.id,
+            "text": r.text,
+            "options": [
+                {"value": str(n), "text": getattr(r, f"option{n}")}
+                for n in orders.get(r.id, [1, 2, 3, 4])
+            ],
+        }
+        for r in (by_id.get(qid) for qid in q_ids)
+        if r is not None
+    ]
+
+    return render_template(
+        "exam_take_all.html",
+        questions=questions,
+        # الإجابات المحفوظة مسبقاً (لو أعاد الطالب تحميل الصفحة)
+        saved=exam_answer_map(exam_session),
+        duration=exam_session.duration,
+        remaining=exam_remaining_seconds(exam_session),
+        sync_delay=app.config.get("EXAM_SYNC_DEBOUNCE_MS", 1500),
+    )
+
+
+@app.route("/exam/answers", methods=["POST"])
+def exam_sync_answers():
+    """
+    نقطة JSON لحفظ دفعة إجابات في transaction واحدة.
+    الشكل المتوقع: {"answers": {"<question_id>": "1".."4", ...}}
+    """
+    if "student_id" not in session:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+
+    exam_session = current_exam_session()
+    if exam_session is None:
+        return jsonify({"ok": False, "error": "no_active_exam"}), 409
+
+    if exam_expired(exam_session):
+        result_id = run_write(_finalize_exam, exam_session)
+        return jsonify({
+            "ok": False,
+            "error": "expired",
+            "redirect": url_for("exam_result", result_id=result_id),
+        }), 409
+
+    payload = request.get_json(silent=True) or {}
+    raw = payload.get("answers")
+    if not isinstance(raw, dict):
+        return jsonify({"ok": False, "error": "bad_request"}), 400
+
+    # نقبل فقط أسئلة هذا الامتحان وخيارات صحيحة الشكل
+    allowed = set(exam_session.q_ids)
+    answers = {}
+    for key, value in raw.items():
+        try:
+            qid = int(key)
+        except (TypeError, ValueError):
+            continue
+        value = str(value)
+        if qid in allowed and value in ("1", "2", "3", "4"):
+            answers[qid] = value
 
-    answers = ExamAnswer.query.filter_by(result_id=result.id).all()
+    result = ExamResult.query.get_or_404(exam_session.result_id)
+    saved = run_write(_save_answers, result, answers, exam_session)
+
+    return jsonify({"ok": True, "saved": saved})
+
+
+def load_result_details(result):
+    """
+    تجهيز بيانات الأسئلة مع إجابات الطالب لصفحة النتيجة وتقرير الطباعة
+    باستعلام واحد (Question مع LEFT JOIN على ExamAnswer).
+    يحافظ على ترتيب الأسئلة كما ظهرت في الامتحان، ويُظهر الأسئلة
+    التي لم يُجب عنها الطالب (student_answer = None).
+    """
+    order = [int(x) for x in result.question_order.split(",") if x] if result.question_order else []
+
+    if order:
+        rows = (
+            db.session.query(Question, ExamAnswer.student_answer, ExamAnswer.is_correct)
+            .outerjoin(
+                ExamAnswer,
+                and_(ExamAnswer.question_id == Question.id, ExamAnswer.result_id == result.id),
+            )
+            .filter(Question.id.in_(order))
+            .all()
+        )
+        by_id = {q.id: (q, ans, ok) for q, ans, ok in rows}
+        ordered = [by_id[qid] for qid in order if qid in by_id]
+    else:
+        # نتائج قديمة بدون ترتيب محفوظ: نعرض الأسئلة المُجابة بترتيب الإجابة
+        ordered = (
+            db.session.query(Question, ExamAnswer.student_answer, ExamAnswer.is_correct)
+            .join(ExamAnswer, ExamAnswer.question_id == Question.id)
+            .filter(ExamAnswer.result_id == result.id)
+            .order_by(ExamAnswer.id)
+            .all()
+        )
 
-    # تجهيز بيانات الأسئلة مع الإجابات
-    detailed = []
-    for ans in answers:
-        q = Question.query.get(ans.question_id)
-        detailed.append({
+    return [
+        {
             "text": q.text,
             "option1": q.option1,
             "option2": q.option2,
             "option3": q.option3,
             "option4": q.option4,
             "correct_option": q.correct_option,
-            "student_answer": ans.student_answer,
-            "is_correct": ans.is_correct,
-        })
+            "student_answer": student_answer,
+            "is_correct": bool(is_correct),
+        }
+        for q, student_answer, is_correct in ordered
+    ]
+
+
+@app.route("/exam/result/<int:result_id>")
+@use_read_replica
+def exam_result(result_id):
+    if "student_id" not in session:
+        return redirect(url_for("login"))
+
+    result = ExamResult.query.get_or_404(result_id)
+
+    # منع طالب آخر من رؤية نتيجة غيره
+    if result.student_id != session["student_id"]:
+        return redirect(url_for("student_subjects"))
+
+    detailed = load_result_details(result)
 
     return render_template(
         "exam_result.html",
@@ -575,21 +2921,7 @@ def exam_result_pdf(result_id):
     if result.student_id != session["student_id"]:
         return redirect(url_for("student_subjects"))
 
-    answers = ExamAnswer.query.filter_by(result_id=result.id).all()
-
-    detailed = []
-    for ans in answers:
-        q = Question.query.get(ans.question_id)
-        detailed.append({
-            "text": q.text,
-            "option1": q.option1,
-            "option2": q.option2,
-            "option3": q.option3,
-            "option4": q.option4,
-            "correct_option": q.correct_option,
-            "student_answer": ans.student_answer,
-            "is_correct": ans.is_correct,
-        })
+    detailed = load_result_details(result)
 
     return render_template(
         "result_pdf.html",
@@ -598,6 +2930,178 @@ def exam_result_pdf(result_id):
     )
 
 
+# ====================
+# توليد ملف PDF حقيقي للتقرير (مع كاش على القرص)
+# ====================
+
+_pdf_executor = ThreadPoolExecutor(
+    max_workers=app.config.get("PDF_RENDER_WORKERS", 2),
+    thread_name_prefix="pdf-render",
+)
+# عدد عمليات التوليد المسموح بها (قيد التنفيذ + في الانتظار) لكل worker
+_pdf_slots = threading.BoundedSemaphore(app.config.get("PDF_RENDER_QUEUE", 8))
+# نفس التقرير المطلوب أكثر من مرة في نفس اللحظة يُولَّد مرة واحدة
+_pdf_inflight = {}
+# كل كم ثانية يعيد المتصفح طلب التقرير أثناء التوليد
+PDF_POLL_SECONDS = 2
+_pdf_inflight_lock = threading.RLock()
+
+
+def _pdf_link_callback(uri, rel):
+    """روابط /static/... في القالب (الخط) تُقرأ من مجلد static على القرص."""
+    prefix = app.static_url_path.rstrip("/") + "/"
+    if uri.startswith(prefix):
+        return os.path.join(app.static_folder, unquote(uri[len(prefix):]))
+    return None
+
+
+def _render_pdf_file(html, path):
+    """
+    تحويل HTML إلى PDF وحفظه على القرص بشكل ذرّي. عند الفشل يُكتب ملف
+    .failed بجانبه حتى لا تعيد طلبات المتابعة التوليد في حلقة.
+    """
+    from xhtml2pdf import pisa
+
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as fh:
+            # path داخل static: سياسة xhtml2pdf تسمح بالقراءة من مجلد المستند فقط
+            # (وإلا مجلد التشغيل الحالي)، فيُحجب الخط لو شُغّل السيرفر من مجلد آخر
+            status = pisa.CreatePDF(html, dest=fh, encoding="utf-8",
+                                    path=os.path.join(app.static_folder, "result.html"),
+                                    link_callback=_pdf_link_callback)
+        if status.err:
+            raise RuntimeError("فشل توليد ملف PDF")
+        os.replace(tmp_path, path)
+    except Exception:
+        app.logger.exception("pdf render failed for %s", path)
+        _remove_file(tmp_path)
+        with open(path + ".failed", "w"):
+            pass
+        raise
+    finally:
+        _remove_file(path + ".pending")
+    _remove_file(path + ".failed")
+    return path
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _fresh_marker(marker):
+    """ملف .pending أو .failed أحدث من PDF_RENDER_TIMEOUT."""
+    try:
+        age = time.time() - os.path.getmtime(marker)
+    except OSError:
+        return False
+    return age < app.config.get("PDF_RENDER_TIMEOUT", 30)
+
+
+def _claim_pdf_render(marker):
+    """
+    حجز توليد التقرير بين كل الـ workers بملف .pending (O_EXCL). الملف الأقدم
+    من PDF_RENDER_TIMEOUT بقي من worker مات أثناء التوليد، فنأخذ مكانه.
+    """
+    try:
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        if _fresh_marker(marker):
+            return False
+        os.utime(marker)
+        return True
+
+
+def get_result_pdf(result_id, html):
+    """
+    حالة ملف PDF للتقرير كـ (path, state). المفتاح = result_id + hash لمحتوى
+    التقرير، فإعادة تنزيل نفس التقرير لا تكلّف أي معالجة.
+    الطلب لا ينتظر التوليد أبداً: يبدأه في مجموعة threads محدودة ويرجع
+    "pending"، والمتصفح يعيد الطلب حتى يصبح "ready". "busy" لو امتلأ الطابور،
+    و"failed" لو فشل آخر توليد خلال PDF_RENDER_TIMEOUT.
+    """
+    cache_dir = app.config.get("PDF_CACHE_DIR") or os.path.join(app.root_path, "pdf_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    digest = hashlib.sha256(html.encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"result_{result_id}_{digest}.pdf")
+    if os.path.exists(path):
+        return path, "ready"
+    if _fresh_marker(path + ".failed"):
+        return None, "failed"
+
+    with _pdf_inflight_lock:
+        if path in _pdf_inflight:
+            return None, "pending"
+        if not _pdf_slots.acquire(blocking=False):
+            return None, "busy"
+        if not _claim_pdf_render(path + ".pending"):
+            # worker آخر يولّد نفس التقرير الآن
+            _pdf_slots.release()
+            return None, "pending"
+        if os.path.exists(path):
+            # انتهى التوليد بين الفحص الأول والحجز
+            _remove_file(path + ".pending")
+            _pdf_slots.release()
+            return path, "ready"
+
+        future = _pdf_executor.submit(_render_pdf_file, html, path)
+        _pdf_inflight[path] = future
+
+        def _done(_, key=path):
+            _pdf_slots.release()
+            with _pdf_inflight_lock:
+                _pdf_inflight.pop(key, None)
+
+        future.add_done_callback(_done)
+
+    return None, "pending"
+
+
+@app.route("/exam/result/<int:result_id>/pdf/download")
+def exam_result_pdf_download(result_id):
+    """تنزيل تقرير النتيجة كملف PDF حقيقي (خط Cairo واتجاه من اليمين لليسار)."""
+    if "student_id" not in session:
+        return redirect(url_for("login"))
+
+    result = ExamResult.query.get_or_404(result_id)
+
+    if result.student_id != session["student_id"]:
+        return redirect(url_for("student_subjects"))
+
+    html = render_template(
+        "result_pdf.html",
+        result=result,
+        answers=load_result_details(result),
+        pdf_font_url=url_for("static", filename="fonts/Cairo Regular.ttf"),
+    )
+
+    path, state = get_result_pdf(result.id, html)
+    if state == "pending":
+        # التوليد في الخلفية: المتصفح يعيد نفس الطلب (Refresh) حتى يصبح الملف جاهزاً
+        retry = str(PDF_POLL_SECONDS)
+        return "جاري تجهيز التقرير، سيبدأ التنزيل تلقائياً خلال لحظات.", 202, {
+            "Retry-After": retry,
+            "Refresh": retry,
+            "Location": url_for("exam_result_pdf_download", result_id=result.id),
+        }
+    if state == "busy":
+        # ضغط كبير على التوليد: نطلب من المتصفح إعادة المحاولة بعد قليل
+        return "جاري تجهيز تقارير أخرى، حاول مرة أخرى بعد لحظات.", 503, {"Retry-After": "5"}
+    if state == "failed":
+        return "تعذّر تجهيز التقرير، حاول مرة أخرى لاحقاً.", 500
+
+    return send_file(
+        path,
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name=f"result_{result.id}.pdf",
+    )
+
 
 @app.route("/exam/finish")
 def exam_finish():
@@ -605,14 +3109,12 @@ def exam_finish():
     if "student_id" not in session:
         return redirect(url_for("login"))
 
-    exam_id = session.get("exam_id")
-    q_ids = session.get("exam_questions")
-
-    if not exam_id or not q_ids:
-        return redirect(url_for("student_subjects"))
+    exam_session = current_exam_session()
+    if exam_session is None:
+        return no_exam_redirect()
 
-    final_result = _finalize_exam(exam_id, q_ids)
-    return redirect(url_for("exam_result", result_id=final_result.id))
+    result_id = run_write(_finalize_exam, exam_session)
+    return redirect(url_for("exam_result", result_id=result_id))
 
 
 # ====================
@@ -659,31 +3161,12 @@ def admin_logout():
 
 
 @app.route("/admin/dashboard")
+@use_read_replica
 def admin_dashboard():
     if not admin_required():
         return redirect(url_for("admin_login"))
 
-    stats = {
-        "students": Student.query.count(),
-        "subjects": Subject.query.count(),
-        "questions": Question.query.count(),
-        "results": ExamResult.query.count(),
-    }
-
-    recent = (
-        db.session.query(
-            ExamResult.id,
-            Student.full_name.label("student_name"),
-            Subject.name.label("subject_name"),
-            ExamResult.score,
-            ExamResult.date,
-        )
-        .join(Student, ExamResult.student_id == Student.id)
-        .join(Subject, ExamResult.subject_id == Subject.id)
-        .order_by(ExamResult.date.desc())
-        .limit(5)
-        .all()
-    )
+    stats, recent = get_dashboard_data()
 
     return render_template("admin_dashboard.html", stats=stats, recent=recent)
 
@@ -734,7 +3217,9 @@ def admin_add_subject():
                 default_questions=questions
             )
             db.session.add(subject)
+            bump_dashboard_stats(subjects=1)
             db.session.commit()
+            invalidate_subject_catalog()
             return redirect(url_for("admin_subjects"))
 
     return render_template(
@@ -773,11 +3258,15 @@ def admin_edit_subject(subject_id):
                 error = "مدة الامتحان وعدد الأسئلة يجب أن تكون أرقامًا."
 
         if not error:
+            questions_changed = subject.default_questions != questions
             subject.name = name
             subject.grade = grade
             subject.default_duration = duration
             subject.default_questions = questions
+            if questions_changed:
+                invalidate_exam_papers(subject.id)
             db.session.commit()
+            invalidate_subject_catalog()
             return redirect(url_for("admin_subjects"))
 
     return render_template(
@@ -795,22 +3284,67 @@ def admin_delete_subject(subject_id):
 
     subject = Subject.query.get_or_404(subject_id)
 
-    # حذف النتائج المرتبطة بالمادة + الإجابات
-    results = ExamResult.query.filter_by(subject_id=subject.id).all()
-    for r in results:
-        ExamAnswer.query.filter_by(result_id=r.id).delete()
-        db.session.delete(r)
+    if app.config.get("BACKGROUND_JOBS"):
+        enqueue_job("delete_subject", subject_id=subject.id)
+        return redirect(url_for("admin_jobs"))
 
-    # حذف الأسئلة + إجاباتها
-    questions = Question.query.filter_by(subject_id=subject.id).all()
-    for q in questions:
-        ExamAnswer.query.filter_by(question_id=q.id).delete()
-        db.session.delete(q)
+    delete_subject_cascade(subject.id)
+    return redirect(url_for("admin_subjects"))
 
-    db.session.delete(subject)
+
+def delete_subject_cascade(subject_id, progress=None):
+    """
+    حذف المادة مع نتائجها وأسئلتها وكل الإجابات المرتبطة بها
+    بعدد ثابت من جمل DELETE ... WHERE ... IN (subquery) بدل حلقة لكل صف.
+    """
+    subject = db.session.get(Subject, subject_id)
+    if subject is None:
+        return {"message": "المادة غير موجودة (ربما حُذفت مسبقاً)."}
+    name = subject.name
+
+    result_ids = select(ExamResult.id).where(ExamResult.subject_id == subject_id)
+    question_ids = select(Question.id).where(Question.subject_id == subject_id)
+
+    steps = [
+        # إجابات نتائج المادة، ثم أي إجابات أخرى على أسئلتها
+        delete(ExamAnswer).where(ExamAnswer.result_id.in_(result_ids)),
+        delete(ExamAnswer).where(ExamAnswer.question_id.in_(question_ids)),
+        delete(AnswerEvent).where(AnswerEvent.result_id.in_(result_ids)),
+        delete(ExamSession).where(ExamSession.result_id.in_(result_ids)),
+        (delete(ExamResult).where(ExamResult.subject_id == subject_id), "results"),
+        (delete(Question).where(Question.subject_id == subject_id), "questions"),
+        delete(ItemStat).where(ItemStat.subject_id == subject_id),
+        delete(SubjectScoreStat).where(SubjectScoreStat.subject_id == subject_id),
+        delete(SubjectScoreBucket).where(SubjectScoreBucket.subject_id == subject_id),
+        delete(StudentSubjectStat).where(StudentSubjectStat.subject_id == subject_id),
+        delete(ExamPaper).where(ExamPaper.subject_id == subject_id),
+        (delete(Subject).where(Subject.id == subject_id), "subjects"),
+    ]
+    counts = _run_delete_steps(steps, progress)
     db.session.commit()
+    invalidate_subject_questions(subject_id)
+    invalidate_subject_catalog()
 
-    return redirect(url_for("admin_subjects"))
+    return {"message": f"تم حذف المادة '{name}' مع {counts[4]} نتيجة و{counts[5]} سؤالاً."}
+
+
+def _run_delete_steps(steps, progress=None):
+    """
+    تنفيذ جمل الحذف بالترتيب وإرجاع عدد الصفوف المحذوفة لكل جملة.
+    الخطوة (جملة, عدّاد لوحة) تُنقص العدّاد في نفس الخطوة. الترتيب من الأبناء
+    إلى الأب (الصف نفسه آخراً)، فلو حُفظت الخطوات الأولى فقط (تقدّم job على
+    SQLite) لا تبقى صفوف يتيمة، وإعادة الحذف تكمله.
+    """
+    counts = []
+    for done, step in enumerate(steps, start=1):
+        stmt, stat = step if isinstance(step, tuple) else (step, None)
+        res = db.session.execute(stmt.execution_options(synchronize_session=False))
+        counts.append(res.rowcount)
+        if stat:
+            bump_dashboard_stats(**{stat: -res.rowcount})
+        if progress:
+            progress(done, len(steps))
+    return counts
 
 
 # ---------- الأسئلة ----------
@@ -841,13 +3375,19 @@ def admin_questions(subject_id):
                 correct_option=correct_option
             )
             db.session.add(question)
+            bump_dashboard_stats(questions=1)
+            invalidate_exam_papers(subject.id)
             db.session.commit()
+            invalidate_subject_questions(subject.id)
 
     questions = Question.query.filter_by(subject_id=subject.id).all()
+    analytics = get_subject_analytics(subject.id)
     return render_template(
         "admin_questions.html",
         subject=subject,
-        questions=questions
+        questions=questions,
+        item_stats=analytics["items"],
+        distribution=analytics["distribution"],
     )
 
 
@@ -857,7 +3397,8 @@ def admin_question_detail(question_id):
         return redirect(url_for("admin_login"))
 
     question = Question.query.get_or_404(question_id)
-    return render_template("admin_question_detail.html", question=question)
+    stats = get_subject_analytics(question.subject_id)["items"].get(question.id)
+    return render_template("admin_question_detail.html", question=question, stats=stats)
 
 
 @app.route("/admin/questions/<int:question_id>/edit", methods=["GET", "POST"])
@@ -875,6 +3416,7 @@ def admin_edit_question(question_id):
         question.option4 = request.form.get("option4")
         question.correct_option = request.form.get("correct_option")
         db.session.commit()
+        invalidate_subject_questions(question.subject_id)
         return redirect(url_for("admin_question_detail", question_id=question.id))
 
     return render_template("admin_edit_question.html", question=question)
@@ -889,14 +3431,160 @@ def admin_delete_question(question_id):
     subject_id = question.subject_id
 
     ExamAnswer.query.filter_by(question_id=question.id).delete()
+    ItemStat.query.filter_by(question_id=question.id).delete()
     db.session.delete(question)
+    bump_dashboard_stats(questions=-1)
+    invalidate_exam_papers(subject_id)
     db.session.commit()
+    invalidate_subject_questions(subject_id)
 
     return redirect(url_for("admin_questions", subject_id=subject_id))
 
 
 # ---------- رفع ملف أسئلة (إكسل) ----------
 
+# أسماء الأعمدة المقبولة في ملف الإكسل لكل حقل
+IMPORT_COLUMNS = {
+    "text": ("question",),
+    "option1": ("option_a", "option1"),
+    "option2": ("option_b", "option2"),
+    "option3": ("option_c", "option3"),
+    "option4": ("option_d", "option4"),
+    "correct_option": ("correct", "correct_option"),
+}
+
+# تحويل صيغ الإجابة الصحيحة المختلفة إلى 1/2/3/4
+CORRECT_ALIASES = {
+    "1": "1", "2": "2", "3": "3", "4": "4",
+    "a": "1", "b": "2", "c": "3", "d": "4",
+    "أ": "1", "ب": "2", "ج": "3", "د": "4",
+}
+
+# أقصى عدد من أسباب الرفض نحتفظ به لعرضه للأدمن
+IMPORT_MAX_REPORTED = 200
+
+
+class ImportFormatError(ValueError):
+    """خطأ في تنسيق ملف الإكسل نفسه (مثل عمود ناقص)."""
+
+
+def _cell_text(value):
+    """تحويل قيمة الخلية إلى نص (1.0 تصبح "1")."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _validate_question_row(row, columns):
+    """إرجاع (قاموس السؤال, None) أو (None, سبب الرفض)."""
+    values = {
+        field: _cell_text(row[idx]) if idx < len(row) else ""
+        for field, idx in columns.items()
+    }
+
+    if not values["text"]:
+        return None, "نص السؤال فارغ"
+    for field in ("option1", "option2", "option3", "option4"):
+        if not values[field]:
+            return None, f"الخيار {field[-1]} فارغ"
+        if len(values[field]) > 255:
+            return None, f"الخيار {field[-1]} أطول من 255 حرفاً"
+
+    correct = CORRECT_ALIASES.get(values["correct_option"].lower())
+    if not correct:
+        return None, f"الإجابة الصحيحة غير صالحة: '{values['correct_option']}'"
+    values["correct_option"] = correct
+
+    return values, None
+
+
+def import_questions_from_excel(source, subject_id, batch_size=1000, progress=None):
+    """
+    استيراد بنك أسئلة من ملف إكسل بدون تحميله كاملاً في الذاكرة:
+    - القراءة بوضع read_only (صفاً بصف).
+    - الصفوف الصحيحة تُحفظ في ملف مؤقت أثناء القراءة، ثم تُكتب كلها في
+      transaction واحدة بـ insert() واحد لكل دفعة، فلا تبدأ الكتابة إلا بعد
+      قراءة الملف كاملاً (ولا يبقى نصف بنك لو فشلت القراءة).
+    - يرجع تقريراً بعدد الصفوف المقبولة والمرفوضة وسبب كل رفض.
+    progress (اختياري): دالة تُستدعى أثناء القراءة، قبل أي كتابة، بعد كل دفعة
+    بـ (الصفوف المقروءة, العدد الكلي التقريبي).
+    """
+    import openpyxl
+
+    wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    spool = tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024, mode="w+", encoding="utf-8")
+    try:
+        sheet = wb.active
+        total_rows = (sheet.max_row - 1) if sheet.max_row else None
+        rows = sheet.iter_rows(values_only=True)
+
+        # نقرأ صف العناوين (الهيدر)
+        header_row = next(rows, None) or ()
+        headers = [(str(h).strip().lower() if h else "") for h in header_row]
+
+        columns = {}
+        for field, names in IMPORT_COLUMNS.items():
+            idx = next((headers.index(n) for n in names if n in headers), None)
+            if idx is None:
+                raise ImportFormatError(f"لم يتم العثور على العمود '{names[0]}' في ملف الإكسل")
+            columns[field] = idx
+
+        accepted = 0
+        rejected = []
+        rejected_count = 0
+        seen = 0
+
+        # نبدأ من السطر الثاني (بعد الهيدر)
+        for row_no, row in enumerate(rows, start=2):
+            # تخطّي الصفوف الفارغة تماماً
+            if not row or all(v is None or str(v).strip() == "" for v in row):
+                continue
+            seen += 1
+
+            values, reason = _validate_question_row(row, columns)
+            if reason:
+                rejected_count += 1
+                if len(rejected) < IMPORT_MAX_REPORTED:
+                    rejected.append({"row": row_no, "reason": reason})
+                continue
+
+            values["subject_id"] = subject_id
+            spool.write(json.dumps(values, ensure_ascii=False) + "\n")
+            accepted += 1
+            if progress and seen % batch_size == 0:
+                progress(seen, total_rows)
+    except BaseException:
+        spool.close()
+        raise
+    finally:
+        wb.close()
+
+    with spool:
+        if progress:
+            progress(seen, total_rows)
+        spool.seek(0)
+        batch = []
+        for line in spool:
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                db.session.execute(insert(Question), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(Question), batch)
+        bump_dashboard_stats(questions=accepted)
+        if accepted:
+            invalidate_exam_papers(subject_id)
+        db.session.commit()
+
+    return {
+        "accepted": accepted,
+        "rejected_count": rejected_count,
+        "rejected": rejected,
+    }
+
+
 @app.route("/admin/upload", methods=["GET", "POST"])
 def admin_upload():
     if not admin_required():
@@ -905,6 +3593,7 @@ def admin_upload():
     subjects = Subject.query.order_by(Subject.grade, Subject.name).all()
     message = None
     error = None
+    rejected = []
 
     if request.method == "POST":
         subject_id = request.form.get("subject_id")
@@ -912,67 +3601,33 @@ def admin_upload():
 
         if not subject_id or not file:
             error = "يرجى اختيار المادة ورفع الملف."
+        elif app.config.get("BACKGROUND_JOBS"):
+            # نحفظ الملف ونكمل الاستيراد في الخلفية بدل حجز الطلب
+            upload_dir = os.path.join(app.root_path, "uploads")
+            os.makedirs(upload_dir, exist_ok=True)
+            filepath = os.path.join(
+                upload_dir, f"job_{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+            )
+            file.save(filepath)
+            enqueue_job("import_questions", subject_id=int(subject_id), path=filepath)
+            return redirect(url_for("admin_jobs"))
         else:
             try:
-                filename = secure_filename(file.filename)
-                upload_dir = os.path.join(app.root_path, "uploads")
-                os.makedirs(upload_dir, exist_ok=True)
-                filepath = os.path.join(upload_dir, filename)
-                file.save(filepath)
-
-                # قراءة ملف إكسل
-                import openpyxl
-                wb = openpyxl.load_workbook(filepath)
-                sheet = wb.active
-
-                # نقرأ صف العناوين (الهيدر)
-                header_row = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True))
-                headers = [(str(h).strip().lower() if h else "") for h in header_row]
-
-                def get_index(col_name: str) -> int:
-                    """إرجاع رقم العمود حسب اسم الهيدر، أو رفع خطأ إن لم يوجد."""
-                    try:
-                        return headers.index(col_name.lower())
-                    except ValueError:
-                        raise ValueError(f"لم يتم العثور على العمود '{col_name}' في ملف الإكسل")
-
-                # تحديد أعمدة السؤال والخيارات والإجابة الصحيحة
-                q_idx       = get_index("question")
-                opt_a_idx   = get_index("option_a")
-                opt_b_idx   = get_index("option_b")
-                opt_c_idx   = get_index("option_c")
-                opt_d_idx   = get_index("option_d")
-                correct_idx = get_index("correct")
-
-                added = 0
-                # نبدأ من السطر الثاني (بعد الهيدر)
-                for row in sheet.iter_rows(min_row=2, values_only=True):
-                    # تخطّي الصفوف الفارغة أو التي لا تحتوي سؤالاً
-                    if not row or q_idx >= len(row) or not row[q_idx]:
-                        continue
-
-                    text    = str(row[q_idx])
-                    o1      = str(row[opt_a_idx]) if opt_a_idx < len(row) else ""
-                    o2      = str(row[opt_b_idx]) if opt_b_idx < len(row) else ""
-                    o3      = str(row[opt_c_idx]) if opt_c_idx < len(row) else ""
-                    o4      = str(row[opt_d_idx]) if opt_d_idx < len(row) else ""
-                    correct = str(row[correct_idx]).strip() if correct_idx < len(row) else ""
-
-                    q = Question(
-                        subject_id=int(subject_id),
-                        text=text,
-                        option1=o1,
-                        option2=o2,
-                        option3=o3,
-                        option4=o4,
-                        correct_option=correct,
-                    )
-                    db.session.add(q)
-                    added += 1
-
-                db.session.commit()
-                message = f"تم استيراد {added} سؤالاً بنجاح."
+                report = import_questions_from_excel(
+                    file.stream,
+                    int(subject_id),
+                    batch_size=app.config.get("IMPORT_BATCH_SIZE", 1000),
+                )
+                invalidate_subject_questions(int(subject_id))
+                message = (
+                    f"تم استيراد {report['accepted']} سؤالاً بنجاح، "
+                    f"وتم رفض {report['rejected_count']} صفاً."
+                )
+                rejected = report["rejected"]
 
+            except ImportFormatError as exc:
+                db.session.rollback()
+                error = str(exc)
             except Exception:
                 db.session.rollback()
                 error = "حدث خطأ أثناء قراءة الملف. تأكد من أن التنسيق صحيح وأن عناوين الأعمدة مكتوبة بشكل صحيح."
@@ -981,7 +3636,8 @@ def admin_upload():
         "admin_upload.html",
         subjects=subjects,
         message=message,
-        error=error
+        error=error,
+        rejected=rejected,
     )
 
 
@@ -1003,24 +3659,153 @@ def admin_delete_student(student_id):
 
     student = Student.query.get_or_404(student_id)
 
-    results = ExamResult.query.filter_by(student_id=student.id).all()
-    for r in results:
-        ExamAnswer.query.filter_by(result_id=r.id).delete()
-        db.session.delete(r)
+    if app.config.get("BACKGROUND_JOBS"):
+        enqueue_job("delete_student", student_id=student.id)
+        return redirect(url_for("admin_jobs"))
 
-    db.session.delete(student)
-    db.session.commit()
+    delete_student_cascade(student.id)
     return redirect(url_for("admin_students"))
 
 
+def delete_student_cascade(student_id, progress=None):
+    """حذف الطالب مع كل نتائجه وإجاباته بعدد ثابت من جمل DELETE."""
+    student = db.session.get(Student, student_id)
+    if student is None:
+        return {"message": "الطالب غير موجود (ربما حُذف مسبقاً)."}
+    name = student.full_name
+
+    result_ids = select(ExamResult.id).where(ExamResult.student_id == student_id)
+
+    steps = [
+        delete(ExamAnswer).where(ExamAnswer.result_id.in_(result_ids)),
+        delete(AnswerEvent).where(AnswerEvent.result_id.in_(result_ids)),
+        delete(ExamSession).where(ExamSession.student_id == student_id),
+        (delete(ExamResult).where(ExamResult.student_id == student_id), "results"),
+        delete(StudentSubjectStat).where(StudentSubjectStat.student_id == student_id),
+        (delete(Student).where(Student.id == student_id), "students"),
+    ]
+    counts = _run_delete_steps(steps, progress)
+    db.session.commit()
+
+    return {"message": f"تم حذف الطالب '{name}' مع {counts[3]} نتيجة."}
+
+
 # ---------- النتائج ----------
 
+def build_result_filters(args):
+    """
+    تحويل فلاتر صفحة النتائج (من query string) إلى شروط SQL.
+    الفلاتر: subject_id، grade (مفتاح الصف)، name (بداية اسم الطالب)،
+    date_from و date_to بصيغة YYYY-MM-DD (date_to شامل لليوم نفسه).
+    يرجع (قائمة الشروط, قاموس القيم المستخدمة لإعادة تعبئة النموذج).
+    """
+    conditions = []
+    values = {}
+
+    subject_id = args.get("subject_id", type=int)
+    if subject_id:
+        conditions.append(ExamResult.subject_id == subject_id)
+        values["subject_id"] = subject_id
+
+    grade = (args.get("grade") or "").strip()
+    if grade:
+        conditions.append(Subject.grade == grade)
+        values["grade"] = grade
+
+    name = (args.get("name") or "").strip()
+    if name:
+        escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append(Student.full_name.like(f"{escaped}%", escape="\\"))
+        values["name"] = name
+
+    for key in ("date_from", "date_to"):
+        raw = (args.get(key) or "").strip()
+        if not raw:
+            continue
+        try:
+            day = datetime.strptime(raw, "%Y-%m-%d")
+        except ValueError:
+            continue
+        if key == "date_from":
+            conditions.append(ExamResult.date >= day)
+        else:
+            conditions.append(ExamResult.date < day + timedelta(days=1))
+        values[key] = raw
+
+    return conditions, values
+
+
+def _parse_results_cursor(raw):
+    """المؤشّر بصيغة "<تاريخ ISO>_<id>" كما يُولَّد في صفحة النتائج."""
+    try:
+        date_part, id_part = raw.rsplit("_", 1)
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (AttributeError, ValueError):
+        return None
+
+
+def keyset_page(query, args, page_size, page_url):
+    """
+    صفحة واحدة من نتائج مرتبة تنازلياً على (ExamResult.date, ExamResult.id)
+    بطريقة keyset: ?before=<cursor> للأقدم و ?after=<cursor> للأحدث.
+    page_url(before=...) أو page_url(after=...) يبني رابط الصفحة المجاورة.
+    يُرجع (الصفوف, رابط الأقدم أو None, رابط الأحدث أو None).
+    """
+    before = _parse_results_cursor(args.get("before"))
+    after = _parse_results_cursor(args.get("after"))
+
+    if after:
+        # الصفحة الأحدث: نقرأ تصاعدياً ثم نعكس الترتيب للعرض
+        d, i = after
+        rows = (
+            query.filter(or_(ExamResult.date > d, and_(ExamResult.date == d, ExamResult.id > i)))
+            .order_by(ExamResult.date.asc(), ExamResult.id.asc())
+            .limit(page_size + 1)
+            .all()
+        )
+        has_newer = len(rows) > page_size
+        results = list(reversed(rows[:page_size]))
+        has_older = True
+    else:
+        if before:
+            d, i = before
+            query = query.filter(
+                or_(ExamResult.date < d, and_(ExamResult.date == d, ExamResult.id < i))
+            )
+        rows = (
+            query.order_by(ExamResult.date.desc(), ExamResult.id.desc())
+            .limit(page_size + 1)
+            .all()
+        )
+        has_older = len(rows) > page_size
+        results = rows[:page_size]
+        has_newer = before is not None
+
+    def cursor(row):
+        return f"{row.date.isoformat()}_{row.id}"
+
+    older_url = newer_url = None
+    if results and has_older:
+        older_url = page_url(before=cursor(results[-1]))
+    if results and has_newer:
+        newer_url = page_url(after=cursor(results[0]))
+    return results, older_url, newer_url
+
+
 @app.route("/admin/results")
+@use_read_replica
 def admin_results():
+    """
+    سجل النتائج مع فلترة على السيرفر وتقسيم صفحات بطريقة keyset على (date, id):
+    ?before=<cursor> للصفحة الأقدم و ?after=<cursor> للصفحة الأحدث.
+    """
     if not admin_required():
         return redirect(url_for("admin_login"))
 
-    results = (
+    page_size = app.config.get("ADMIN_RESULTS_PAGE_SIZE", 50)
+    conditions, filters = build_result_filters(request.args)
+
+    query = (
         db.session.query(
             ExamResult.id,
             Student.full_name.label("student_name"),
@@ -1030,11 +3815,23 @@ def admin_results():
         )
         .join(Student, ExamResult.student_id == Student.id)
         .join(Subject, ExamResult.subject_id == Subject.id)
-        .order_by(ExamResult.date.desc())
-        .all()
+        .filter(*conditions)
+    )
+
+    results, older_url, newer_url = keyset_page(
+        query, request.args, page_size,
+        lambda **cursor: url_for("admin_results", **cursor, **filters),
     )
 
-    return render_template("admin_results.html", results=results)
+    return render_template(
+        "admin_results.html",
+        results=results,
+        filters=filters,
+        subjects=Subject.query.order_by(Subject.grade, Subject.name).all(),
+        grades=get_subject_grades(),
+        older_url=older_url,
+        newer_url=newer_url,
+    )
 
 
 @app.route("/admin/results/<int:result_id>/delete")
@@ -1044,12 +3841,382 @@ def admin_delete_result(result_id):
 
     result = ExamResult.query.get_or_404(result_id)
     ExamAnswer.query.filter_by(result_id=result.id).delete()
+    AnswerEvent.query.filter_by(result_id=result.id).delete()
+    ExamSession.query.filter_by(result_id=result.id).delete()
     db.session.delete(result)
+    bump_dashboard_stats(results=-1)
+    # أفضل علامة لا يمكن طرحها، فتُعاد مجاميع الطالب عند زيارته القادمة
+    db.session.execute(update(Student).where(Student.id == result.student_id).values(stats_built=False))
     db.session.commit()
 
     return redirect(url_for("admin_results"))
 
 
+# ====================
+#   تصدير النتائج والإجابات (CSV / Excel) كرد متدفق
+# ====================
+
+EXPORT_COLUMNS = {
+    "results": ["رقم النتيجة", "التاريخ", "اسم الطالب", "البريد", "المادة", "الصف",
+                "العلامة", "الصحيحة", "الخاطئة"],
+    "answers": ["رقم النتيجة", "التاريخ", "اسم الطالب", "البريد", "المادة", "الصف",
+                "رقم السؤال", "السؤال", "إجابة الطالب", "الإجابة الصحيحة", "صحيحة؟"],
+}
+# أقصى عدد صفوف في ورقة Excel واحدة (بعدها نكمل في ورقة جديدة)
+XLSX_MAX_ROWS = 1048576
+# أول حرف يجعل Excel يفسّر النص كمعادلة
+FORMULA_PREFIXES = ("=", "+", "-", "@")
+# رقم بإشارة (-5، +0.5، -1e3): يُفتح رقماً لا معادلة، فيبقى كما هو
+_SIGNED_NUMBER_RE = re.compile(r"[+-](?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+
+
+def export_rows(kind, conditions):
+    """
+    صفوف التصدير من cursor على السيرفر (yield_per)، فلا تُحمَّل كلها في الذاكرة.
+    الترتيب يتبع الفهارس الموجودة: النتائج على (date, id)، والإجابات على
+    (result_id, question_id)، فلا يحتاج الاستعلام لترتيب مليون صف.
+    """
+    batch = app.config.get("EXPORT_BATCH_SIZE", 1000)
+    if kind == "results":
+        stmt = (
+            select(ExamResult.id, ExamResult.date, Student.full_name, Student.email,
+                   Subject.name, Subject.grade, ExamResult.score,
+                   ExamResult.correct_count, ExamResult.wrong_count)
+            .join(Student, ExamResult.student_id == Student.id)
+            .join(Subject, ExamResult.subject_id == Subject.id)
+            .where(*conditions)
+            .order_by(ExamResult.date, ExamResult.id)
+        )
+    else:
+        stmt = (
+            select(ExamAnswer.result_id, ExamResult.date, Student.full_name, Student.email,
+                   Subject.name, Subject.grade, ExamAnswer.question_id, Question.text,
+                   ExamAnswer.student_answer, Question.correct_option, ExamAnswer.is_correct)
+            .join(ExamResult, ExamAnswer.result_id == ExamResult.id)
+            .join(Student, ExamResult.student_id == Student.id)
+            .join(Subject, ExamResult.subject_id == Subject.id)
+            .join(Question, ExamAnswer.question_id == Question.id)
+            .where(*conditions)
+            .order_by(ExamAnswer.result_id, ExamAnswer.question_id)
+        )
+    result = db.session.execute(stmt.execution_options(yield_per=batch))
+    for partition in result.partitions():
+        for row in partition:
+            yield [_export_cell(value) for value in row]
+
+
+def _export_cell(value):
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+
+def _is_formula_text(value):
+    """نص يفتحه Excel كمعادلة: يبدأ بـ = أو @، أو بـ + - ولا يكون رقماً (مثل إجابة -5)."""
+    return (isinstance(value, str) and value[:1] in FORMULA_PREFIXES
+            and not _SIGNED_NUMBER_RE.fullmatch(value))
+
+
+def _csv_cell(value):
+    """في CSV لا نوع للخلية، فالنص الذي يُفتح كمعادلة نسبقه بـ ' ."""
+    return "'" + value if _is_formula_text(value) else value
+
+
+def stream_csv(kind, rows):
+    # BOM حتى يفتح Excel الملف بترميز UTF-8 (الأسماء العربية)
+    yield "\ufeff".encode("utf-8")
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS[kind])
+    for n, row in enumerate(rows, 1):
+        if isinstance(row[1], datetime):
+            row[1] = row[1].strftime("%Y-%m-%d %H:%M:%S")
+        writer.writerow([_csv_cell(value) for value in row])
+        if n % 1000 == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def stream_xlsx(kind, rows):
+    """
+    ملف Excel بوضع write-only في openpyxl: الصفوف تُكتب إلى ملف مؤقت أثناء
+    القراءة، ثم يُرسل الملف على دفعات. صيغة xlsx (zip) لا تكتمل قبل آخر صف،
+    لذلك الإرسال يبدأ بعد الكتابة (CSV يُرسل أثناء القراءة).
+    النص الذي يبدأ بـ = + - @ يُكتب كخلية نصية صريحة بدل تعديل محتواه.
+    """
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+
+    def text_cell(value):
+        cell = WriteOnlyCell(sheet, value)
+        cell.data_type = "s"
+        return cell
+
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = None
+    sheet_rows = XLSX_MAX_ROWS
+    for row in rows:
+        if sheet_rows >= XLSX_MAX_ROWS:
+            sheet = wb.create_sheet(kind if sheet is None else f"{kind} {len(wb.sheetnames) + 1}")
+            sheet.append(EXPORT_COLUMNS[kind])
+            sheet_rows = 1
+        sheet.append([text_cell(value) if isinstance(value, str) and value[:1] in FORMULA_PREFIXES
+                      else value for value in row])
+        sheet_rows += 1
+    if sheet is None:
+        wb.create_sheet(kind).append(EXPORT_COLUMNS[kind])
+
+    with tempfile.TemporaryFile() as fh:
+        wb.save(fh)
+        fh.seek(0)
+        while True:
+            chunk = fh.read(64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+
+
+@app.route("/admin/results/export/<kind>.<fmt>")
+@use_read_replica
+def admin_export_results(kind, fmt):
+    """
+    تصدير النتائج أو الإجابات بنفس فلاتر صفحة النتائج (المادة، الصف، الاسم، التاريخ).
+    الرد متدفق: التنزيل يبدأ فوراً والذاكرة ثابتة مهما كان عدد الصفوف.
+    """
+    if not admin_required():
+        return redirect(url_for("admin_login"))
+    if kind not in EXPORT_COLUMNS or fmt not in ("csv", "xlsx"):
+        abort(404)
+
+    conditions, _ = build_result_filters(request.args)
+    rows = export_rows(kind, conditions)
+    if fmt == "csv":
+        body, mimetype = stream_csv(kind, rows), "text/csv; charset=utf-8"
+    else:
+        body = stream_xlsx(kind, rows)
+        mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    filename = f"{kind}_{datetime.utcnow():%Y%m%d_%H%M}.{fmt}"
+    response = app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+# ====================
+#   العمليات الطويلة في الخلفية (Jobs)
+# ====================
+
+# الـ jobs تُحفظ في جدول Job وتُنفَّذ في threads داخل نفس العملية
+# (بدون Redis أو أي وسيط خارجي)، والتقدّم يُحفظ في الجدول ليقرأه أي worker
+_job_executor = ThreadPoolExecutor(
+    max_workers=app.config.get("JOB_WORKERS", 1),
+    thread_name_prefix="admin-job",
+)
+
+# job_id -> (done, total): تقدّم الـ jobs الجارية في هذه العملية
+_job_progress = {}
+
+JOB_KIND_LABELS = {
+    "import_questions": "استيراد أسئلة",
+    "delete_subject": "حذف مادة",
+    "delete_student": "حذف طالب",
+}
+
+
+def _job_import_questions(subject_id, path, progress):
+    try:
+        report = import_questions_from_excel(
+            path,
+            subject_id,
+            batch_size=app.config.get("IMPORT_BATCH_SIZE", 1000),
+            progress=progress,
+        )
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    invalidate_subject_questions(subject_id)
+    report["message"] = (
+        f"تم استيراد {report['accepted']} سؤالاً بنجاح، "
+        f"وتم رفض {report['rejected_count']} صفاً."
+    )
+    return report
+
+
+JOB_HANDLERS = {
+    "import_questions": _job_import_questions,
+    "delete_subject": delete_subject_cascade,
+    "delete_student": delete_student_cascade,
+}
+
+
+def enqueue_job(kind, **params):
+    """تسجيل job جديدة في الجدول وإرسالها لمجموعة الـ threads."""
+    job = Job(kind=kind, params=json.dumps(params), owner=_job_owner())
+    db.session.add(job)
+    db.session.commit()
+    _job_executor.submit(_run_job, job.id)
+    return job
+
+
+def _job_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _save_job_progress(job_id, done, total=None):
+    """
+    كتابة التقدّم في صف الـ job مرة كل JOB_PROGRESS_INTERVAL ثانية على الأكثر
+    (وعند اكتماله)، فيراه الاستعلام من أي worker.
+    - Postgres: على اتصال مستقل بـ commit خاص به، فلا يُحفظ معه عمل الـ job.
+    - SQLite لا يقبل كاتباً ثانياً أثناء transaction الـ job، فيُكتب التقدّم على
+      نفس الـ session ويُحفظ معه ما تم من العمل: الاستيراد يستدعيه قبل أي كتابة
+      (أثناء قراءة الملف)، وخطوات الحذف مرتبة بحيث تبقى القاعدة سليمة بعد كل خطوة.
+    """
+    previous = _job_progress.get(job_id)
+    if total is None and previous:
+        total = previous[1]
+    now = time.monotonic()
+    interval = app.config.get("JOB_PROGRESS_INTERVAL", 2)
+    if previous and now - previous[2] < interval and done != total:
+        _job_progress[job_id] = (done, total, previous[2])
+        return
+    _job_progress[job_id] = (done, total, now)
+
+    values = {"progress": done, "total": total, "updated_at": datetime.utcnow()}
+    if db.engine.dialect.name == "sqlite":
+        job = db.session.get(Job, job_id)
+        for key, value in values.items():
+            setattr(job, key, value)
+        db.session.commit()
+        return
+    with db.engine.begin() as conn:
+        conn.execute(update(Job).where(Job.id == job_id).values(**values))
+
+
+def _run_job(job_id):
+    """
+    تنفيذ الـ job داخل app context مستقل. عمل الـ job يُحفظ بـ commit واحد
+    في نهايته (فالفشل لا يترك نصف استيراد أو حذف)، والتقدّم يُحفظ منفصلاً.
+    """
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        job.status = "running"
+        job.owner = _job_owner()
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+
+        def progress(done, total=None):
+            _save_job_progress(job_id, done, total)
+
+        try:
+            outcome = JOB_HANDLERS[job.kind](progress=progress, **json.loads(job.params))
+            job = db.session.get(Job, job_id)
+            job.status = "done"
+            job.message = outcome.get("message")
+            job.result = json.dumps(outcome, ensure_ascii=False)
+            done, total = _job_progress.get(job_id, (job.progress, job.total, None))[:2]
+            job.progress = total if total is not None else done
+            job.total = total
+        except Exception as exc:
+            db.session.rollback()
+            app.logger.exception("job %s failed", job_id)
+            job = db.session.get(Job, job_id)
+            job.status = "failed"
+            job.message = str(exc) or exc.__class__.__name__
+        finally:
+            _job_progress.pop(job_id, None)
+
+        job.updated_at = job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def recover_stale_jobs():
+    """
+    الـ jobs التي بقيت queued أو running من عملية توقفت (إعادة تشغيل worker)
+    لن تكتمل أبداً، فتُعلَّم failed عند بدء التشغيل. لا نلمس jobs عملية
+    ما زالت تعمل على نفس الجهاز، ولا jobs جهاز آخر.
+    """
+    host = socket.gethostname()
+    stale = []
+    rows = db.session.execute(
+        select(Job.id, Job.owner).where(Job.status.in_(("queued", "running")))
+    ).all()
+    for job_id, owner in rows:
+        owner_host, _, pid = (owner or "").rpartition(":")
+        if owner_host and owner_host != host:
+            continue
+        if pid.isdigit() and _process_alive(int(pid)):
+            continue
+        stale.append(job_id)
+
+    if stale:
+        now = datetime.utcnow()
+        db.session.execute(
+            update(Job)
+            .where(Job.id.in_(stale), Job.status.in_(("queued", "running")))
+            .values(status="failed", message="توقّف الخادم قبل اكتمال العملية، يرجى إعادتها.",
+                    updated_at=now, finished_at=now)
+        )
+        db.session.commit()
+    return len(stale)
+
+
+with app.app_context():
+    recover_stale_jobs()
+
+
+def _job_to_dict(job):
+    # تقدّم الـ job الجارية في هذه العملية أحدث مما في الجدول
+    done, total = _job_progress.get(job.id, (job.progress, job.total, None))[:2]
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "label": JOB_KIND_LABELS.get(job.kind, job.kind),
+        "status": job.status,
+        "progress": done,
+        "total": total,
+        "message": job.message,
+        "result": json.loads(job.result) if job.result else None,
+        "created_at": job.created_at.strftime("%Y-%m-%d %H:%M:%S") if job.created_at else None,
+        "finished_at": job.finished_at.strftime("%Y-%m-%d %H:%M:%S") if job.finished_at else None,
+    }
+
+
+@app.route("/admin/jobs")
+def admin_jobs():
+    if not admin_required():
+        return redirect(url_for("admin_login"))
+
+    jobs = Job.query.order_by(Job.id.desc()).limit(50).all()
+    return render_template(
+        "admin_jobs.html",
+        jobs=[_job_to_dict(j) for j in jobs],
+        labels=JOB_KIND_LABELS,
+    )
+
+
+@app.route("/admin/jobs/<int:job_id>")
+def admin_job_status(job_id):
+    """نقطة polling: حالة الـ job وتقدّمها بصيغة JSON."""
+    if not admin_required():
+        return jsonify({"error": "unauthorized"}), 401
+
+    job = Job.query.get_or_404(job_id)
+    return jsonify(_job_to_dict(job))
+
+
 # ====================
 # تشغيل السيرفر (محلياً فقط)
 # ====================
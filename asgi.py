@@ -0,0 +1,310 @@
+"""
+وضع التشغيل غير المتزامن (ASGI) لمسارات الامتحان.
+
+مسارات الامتحان (exam_start و exam_take و exam_finish و exam_result) تعمل على
+الـ event loop مباشرة، وقاعدة البيانات فيها غير متزامنة (aiosqlite أو asyncpg):
+نفس دوال app.py تُنفَّذ داخل AsyncSession.run_sync، فكل استعلام ينتظر بدون حجز
+أي thread. الاستعلامات المتزامنة محدودة بـ ASYNC_POOL_SIZE + ASYNC_MAX_OVERFLOW
+اتصالاً لكل عملية، والباقي ينتظر في الـ pool.
+
+ما يحجز الـ loop يُنقل منه: عرض القوالب في threads (ASGI_RENDER_THREADS)،
+وإنهاء الامتحانات المنتهية (sweep) في thread دوري بدل before_request. باقي
+المسارات (الأدمن، الدخول، PDF...) تعمل كما هي في threads (ASGI_WSGI_THREADS).
+
+ملاحظة من القياس: في benchmarks/bench_asgi.py على SQLite محلية كان هذا الوضع
+أبطأ من gunicorn بـ workers عادية (2.95 مقابل 3.41 امتحاناً في الثانية)، لأن
+أغلب زمن الطلب كود Flask متزامن (CPU) وليس انتظاراً للقاعدة. قد يفيد فقط عندما
+تكون القاعدة بعيدة (Postgres عبر الشبكة) وزمن الطلب انتظاراً في أغلبه؛ قِس قبل
+اعتماده بدل الاعتماد على workers عادية.
+
+المتطلبات: pip install -r requirements-async.txt
+
+التشغيل:
+    uvicorn asgi:application --workers 4 --port 8000
+"""
+import asyncio
+import contextvars
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from tempfile import SpooledTemporaryFile
+
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.exc import MissingGreenlet
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from app import (
+    app, db, async_request, configure_sqlite_connection, precompile_templates,
+    run_expired_exam_sweep, _mark_orm_write, _mark_bulk_write,
+)
+
+# المسارات التي تعمل على الـ event loop، والباقي في threads
+ASYNC_ENDPOINTS = {"exam_start", "exam_take", "exam_finish", "exam_result"}
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_database_url():
+    """ASYNC_DATABASE_URL، أو رابط القاعدة الحالية بدرايفر غير متزامن."""
+    if app.config.get("ASYNC_DATABASE_URL"):
+        return app.config["ASYNC_DATABASE_URL"]
+    with app.app_context():
+        url = db.engine.url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"no async driver for {backend}, set ASYNC_DATABASE_URL")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def _async_engine_options():
+    options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    options["pool_size"] = app.config.get("ASYNC_POOL_SIZE", 20)
+    options["max_overflow"] = app.config.get("ASYNC_MAX_OVERFLOW", 20)
+    return options
+
+
+class AsyncBridgeSession(Session):
+    """
+    الـ Session المتزامنة داخل AsyncSession: تُوضع مكان db.session أثناء الطلب،
+    فكل كود app.py يعمل كما هو وكل استعلام ينتظر على الـ event loop.
+    """
+
+
+event.listen(AsyncBridgeSession, "after_flush", _mark_orm_write)
+event.listen(AsyncBridgeSession, "do_orm_execute", _mark_bulk_write)
+
+async_engine = create_async_engine(async_database_url(), **_async_engine_options())
+AsyncSessionLocal = async_sessionmaker(async_engine, sync_session_class=AsyncBridgeSession)
+
+if async_engine.dialect.name == "sqlite":
+    event.listen(async_engine.sync_engine, "connect",
+                 lambda dbapi_connection, record: configure_sqlite_connection(dbapi_connection))
+
+_wsgi_executor = ThreadPoolExecutor(
+    max_workers=app.config.get("ASGI_WSGI_THREADS", 8),
+    thread_name_prefix="asgi-wsgi",
+)
+_render_executor = ThreadPoolExecutor(
+    max_workers=app.config.get("ASGI_RENDER_THREADS", 4),
+    thread_name_prefix="asgi-render",
+)
+
+
+# ====================
+# عمل متزامن خارج الـ event loop
+# ====================
+
+class ThreadRenderedTemplate(app.jinja_env.template_class):
+    """
+    قالب يُعرض في _render_executor عندما يكون الطلب على الـ event loop، مع نفس
+    الـ contextvars (request و session و g). لو احتاج القالب تحميلاً كسولاً من
+    القاعدة (لا يمكن خارج الـ loop) يُعاد عرضه على الـ loop كما كان.
+    """
+
+    def render(self, *args, **kwargs):
+        if not async_request():
+            return super().render(*args, **kwargs)
+        render = partial(contextvars.copy_context().run, super().render, *args, **kwargs)
+        try:
+            return await_only(asyncio.get_running_loop().run_in_executor(_render_executor, render))
+        except MissingGreenlet:
+            return super().render(*args, **kwargs)
+
+
+app.jinja_env.template_class = ThreadRenderedTemplate
+# القوالب المترجمة مسبقاً عند استيراد app من الصنف القديم
+app.jinja_env.cache.clear()
+if app.config.get("PRECOMPILE_TEMPLATES", True):
+    precompile_templates()
+
+
+def _sweep_in_thread():
+    with app.app_context():
+        run_expired_exam_sweep()
+
+
+async def _sweep_periodically():
+    """بديل الـ sweep الكسول في before_request، في thread حتى لا يحجز الـ loop."""
+    interval = app.config.get("EXAM_SWEEP_INTERVAL", 60)
+    if not interval:
+        return
+    loop = asyncio.get_running_loop()
+    while True:
+        await loop.run_in_executor(_wsgi_executor, _sweep_in_thread)
+        await asyncio.sleep(interval)
+
+
+# ====================
+# تحويل طلب ASGI إلى environ
+# ====================
+
+async def _read_body(receive):
+    """قراءة جسم الطلب كاملاً (في الذاكرة حتى 64KB ثم ملف مؤقت)، أو None لو انقطع العميل."""
+    body = SpooledTemporaryFile(max_size=65536)
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            body.close()
+            return None
+        body.write(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    body.seek(0)
+    return body
+
+
+def _build_environ(scope, body):
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    server = scope.get("server") or ("localhost", 80)
+    environ["SERVER_NAME"] = server[0]
+    environ["SERVER_PORT"] = str(server[1] or 80)
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+        environ["REMOTE_PORT"] = str(scope["client"][1])
+
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1")
+        if name == "content-length":
+            key = "CONTENT_LENGTH"
+        elif name == "content-type":
+            key = "CONTENT_TYPE"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key in environ:
+            value = environ[key] + "," + value
+        environ[key] = value
+    return environ
+
+
+def _endpoint(environ):
+    try:
+        endpoint, _ = app.url_map.bind_to_environ(environ).match()
+    except Exception:
+        # 404 / 405 / redirect: يتولاها Flask في المسار العادي
+        return None
+    return endpoint
+
+
+def _start_message(status, headers):
+    return {
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+    }
+
+
+# ====================
+# مسارات الامتحان على الـ event loop
+# ====================
+
+def _run_view(sync_session, environ):
+    """
+    نفس ما يفعله Flask.wsgi_app، لكن db.session هي Session الـ AsyncSession
+    ويرجع (status, headers, body) بدل استدعاء start_response.
+    """
+    ctx = app.request_context(environ)
+    error = None
+    try:
+        try:
+            ctx.push()
+            db.session.registry.set(sync_session)
+            g.async_db = True
+            response = app.full_dispatch_request()
+        except Exception as e:
+            error = e
+            response = app.handle_exception(e)
+        return response.status_code, response.headers.to_wsgi_list(), response.get_data()
+    finally:
+        if error is not None and app.should_ignore_error(error):
+            error = None
+        ctx.pop(error)
+
+
+async def _serve_async(environ, send):
+    async with AsyncSessionLocal() as db_session:
+        status, headers, body = await db_session.run_sync(_run_view, environ)
+    await send(_start_message(status, headers))
+    await send({"type": "http.response.body", "body": body})
+
+
+# ====================
+# باقي المسارات في threads (مع دعم الردود المتدفقة)
+# ====================
+
+def _run_wsgi(environ, send, loop):
+    def emit(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+        return lambda data: None
+
+    iterable = app(environ, start_response)
+    try:
+        sent_start = False
+        for chunk in iterable:
+            if not sent_start:
+                emit(_start_message(started["status"], started["headers"]))
+                sent_start = True
+            if chunk:
+                emit({"type": "http.response.body", "body": chunk, "more_body": True})
+        if not sent_start:
+            emit(_start_message(started["status"], started["headers"]))
+        emit({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(iterable, "close"):
+            iterable.close()
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        sweeper = None
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                sweeper = asyncio.ensure_future(_sweep_periodically())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if sweeper is not None:
+                    sweeper.cancel()
+                await async_engine.dispose()
+                _wsgi_executor.shutdown(wait=False)
+                _render_executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        raise ValueError(f"unsupported ASGI scope {scope['type']}")
+
+    body = await _read_body(receive)
+    if body is None:
+        return
+    try:
+        environ = _build_environ(scope, body)
+        if _endpoint(environ) in ASYNC_ENDPOINTS:
+            await _serve_async(environ, send)
+        else:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(_wsgi_executor, _run_wsgi, environ, send, loop)
+    finally:
+        body.close()
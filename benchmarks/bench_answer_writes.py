@@ -0,0 +1,126 @@
+"""
+حِمل كتابة الإجابات: كم إجابة في الثانية يتحمّلها كل وضع من ANSWER_WRITE_MODE
+("direct": قراءة وتعديل ExamAnswer و ExamResult، "log": إضافة AnswerEvent فقط)
+عندما يجيب صف كامل في نفس الوقت. كل عملية (process) تمثّل worker من gunicorn
+وتحاكي عدة طلاب، ثم يُقاس زمن تحويل الأحداث عند إنهاء كل الامتحانات.
+
+التشغيل (من جذر المشروع):
+    python benchmarks/bench_answer_writes.py --workers 4 --students 40 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+QUESTIONS = 40
+
+
+def seed(students):
+    from sqlalchemy import insert
+    from app import app, db, Student, Subject, Question, ExamResult, start_exam_session
+    from flask import session
+
+    with app.test_request_context():
+        subject = Subject(name="bench", grade="bench")
+        db.session.add(subject)
+        db.session.commit()
+        db.session.execute(insert(Question), [
+            {"subject_id": subject.id, "text": f"q{i}", "option1": "a", "option2": "b",
+             "option3": "c", "option4": "d", "correct_option": "1"}
+            for i in range(QUESTIONS)
+        ])
+        q_ids = [q.id for q in Question.query.all()]
+
+        sessions = []
+        for i in range(students):
+            student = Student(full_name=f"s{i}", email=f"s{i}@bench", password="x", grade="bench")
+            db.session.add(student)
+            db.session.flush()
+            result = ExamResult(student_id=student.id, subject_id=subject.id, score=0,
+                                correct_count=0, wrong_count=0)
+            db.session.add(result)
+            db.session.flush()
+            session["student_id"] = student.id
+            sessions.append(start_exam_session(result, q_ids, 60).id)
+        db.session.commit()
+        db.engine.dispose()
+    return sessions
+
+
+def worker(args):
+    """يحاكي مجموعة طلاب يجيبون بأسرع ما يمكن لمدة محددة."""
+    mode, session_ids, seconds = args
+    from app import app, db, ExamResult, ExamSession, _save_answers, run_write
+
+    app.config["ANSWER_WRITE_MODE"] = mode
+    done = errors = 0
+    rnd = random.Random(os.getpid())
+
+    with app.app_context():
+        db.engine.dispose()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            sid = rnd.choice(session_ids)
+            try:
+                exam_session = db.session.get(ExamSession, sid)
+                result = db.session.get(ExamResult, exam_session.result_id)
+                qid = rnd.choice(exam_session.q_ids)
+                run_write(_save_answers, result, {qid: str(rnd.randint(1, 4))}, exam_session)
+                done += 1
+            except Exception:
+                db.session.rollback()
+                errors += 1
+            db.session.remove()
+    return done, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--students", type=int, default=40)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--modes", nargs="+", default=["direct", "log"])
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+        # نبدأ عملية جديدة لكل وضع حتى تُقرأ قاعدة البيانات الجديدة عند استيراد app
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(1) as pool:
+            session_ids = pool.apply(seed, (args.students,))
+
+        chunks = [session_ids[i::args.workers] for i in range(args.workers)]
+        start = time.perf_counter()
+        with ctx.Pool(args.workers) as pool:
+            stats = pool.map(worker, [(mode, chunk, args.seconds) for chunk in chunks])
+        elapsed = time.perf_counter() - start
+
+        done = sum(d for d, _ in stats)
+        errors = sum(e for _, e in stats)
+
+        with ctx.Pool(1) as pool:
+            finalize = pool.apply(finalize_all)
+
+        print(f"{mode:<7} {done / elapsed:9.1f} answers/s  errors={errors:<5}"
+              f" finalize(all exams)={finalize * 1000:.1f} ms")
+
+
+def finalize_all():
+    """زمن إنهاء كل الامتحانات دفعة واحدة (يشمل تحويل أحداث وضع log)."""
+    from app import app, sweep_expired_exams
+    from datetime import datetime, timedelta
+
+    with app.app_context():
+        start = time.perf_counter()
+        sweep_expired_exams(now=datetime.utcnow() + timedelta(days=1))
+        return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+مقارنة التشغيل المتزامن الحالي (gunicorn بـ workers عادية) بوضع ASGI (uvicorn
+مع asgi.py) على نفس قاعدة البيانات المحلية ونفس مسار الطالب في
+bench_exam_flow.py (login → ... → N × exam_take → exam_result).
+
+كل سيرفر يُشغَّل بنفس عدد العمليات، ويُجهَّز له طلاب جدد في نفس القاعدة.
+
+التشغيل (من جذر المشروع، بعد pip install -r requirements-async.txt):
+    python benchmarks/bench_asgi.py --processes 2 --students 500 --concurrency 200
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bench_exam_flow  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, processes, port, env):
+    if kind == "sync":
+        cmd = [sys.executable, "-m", "gunicorn", "-w", str(processes),
+               "-b", f"127.0.0.1:{port}", "app:app"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:application", "--workers", str(processes),
+               "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/login", timeout=2).read()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{kind} server exited with {proc.returncode}")
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=2, help="workers لكل سيرفر")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--subjects", type=int, default=5)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--exam-questions", type=int, default=20)
+    parser.add_argument("--results", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--password", default="bench-pass")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", default=None, help="رابط قاعدة بيانات (افتراضياً ملف SQLite مؤقت)")
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"])
+    args = parser.parse_args()
+    args.verbose = False
+
+    db_url = args.db or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = db_url
+    env = dict(os.environ)
+
+    reports = {}
+    for mode in args.modes:
+        port = free_port()
+        args.url = f"http://127.0.0.1:{port}"
+        emails, subject_ids, grade_choice = bench_exam_flow.seed(args, f"{mode}{int(time.time())}")
+
+        proc = start_server(mode, args.processes, port, env)
+        try:
+            recorder, elapsed = bench_exam_flow.run(args, emails, subject_ids, grade_choice)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+        reports[mode] = bench_exam_flow.summarize(recorder, elapsed)
+        print(f"\n== {mode} ({args.processes} processes, {args.concurrency} concurrent students)")
+        bench_exam_flow.print_report(reports[mode])
+
+    if len(reports) == 2:
+        sync, async_ = reports["sync"], reports["async"]
+        print(f"\n{'route':<18}{'sync p95':>10}{'async p95':>11}{'sync req/s':>12}{'async req/s':>13}")
+        for name in bench_exam_flow.ROUTES:
+            s, a = sync["routes"][name], async_["routes"][name]
+            print(f"{name:<18}{s['p95_ms']:>10.1f}{a['p95_ms']:>11.1f}{s['rps']:>12.1f}{a['rps']:>13.1f}")
+        print(f"{'exams/s':<18}{'':>21}{sync['total']['flows_per_s']:>12.2f}"
+              f"{async_['total']['flows_per_s']:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
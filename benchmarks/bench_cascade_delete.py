@@ -0,0 +1,129 @@
+"""
+قياس زمن الحذف المتسلسل (مادة / طالب) على قاعدة فيها ~100 ألف إجابة:
+الحلقة القديمة (جملة لكل نتيجة/سؤال) مقابل delete_subject_cascade و
+delete_student_cascade الحاليتين (DELETE ... WHERE ... IN (subquery)).
+
+كل قياس يعمل على نسخة جديدة من نفس القاعدة المجهّزة.
+
+التشغيل (من جذر المشروع):
+    python benchmarks/bench_cascade_delete.py --answers 100000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+QUESTIONS_PER_EXAM = 40
+
+
+def seed(app, db, models, students, answers):
+    from sqlalchemy import insert
+
+    Student, Subject, Question, ExamResult, ExamAnswer = models
+    results_count = answers // QUESTIONS_PER_EXAM
+
+    with app.app_context():
+        subject = Subject(name="bench", grade="bench")
+        db.session.add(subject)
+        db.session.commit()
+
+        db.session.execute(insert(Student), [
+            {"full_name": f"s{i}", "email": f"s{i}@bench", "password": "x", "grade": "bench"}
+            for i in range(students)
+        ])
+        db.session.execute(insert(Question), [
+            {"subject_id": subject.id, "text": f"q{i}", "option1": "a", "option2": "b",
+             "option3": "c", "option4": "d", "correct_option": "1"}
+            for i in range(QUESTIONS_PER_EXAM * 5)
+        ])
+        student_ids = [r[0] for r in db.session.query(Student.id).all()]
+        question_ids = [r[0] for r in db.session.query(Question.id).all()]
+
+        db.session.execute(insert(ExamResult), [
+            {"student_id": student_ids[i % len(student_ids)], "subject_id": subject.id,
+             "score": 0, "correct_count": 0, "wrong_count": 0}
+            for i in range(results_count)
+        ])
+        result_ids = [r[0] for r in db.session.query(ExamResult.id).all()]
+
+        rows = []
+        for n, rid in enumerate(result_ids):
+            for k in range(QUESTIONS_PER_EXAM):
+                rows.append({"result_id": rid,
+                             "question_id": question_ids[(n + k) % len(question_ids)],
+                             "student_answer": "1", "is_correct": True})
+        db.session.execute(insert(ExamAnswer), rows)
+        db.session.commit()
+        return subject.id, student_ids[0]
+
+
+def legacy_delete_subject(db, models, subject_id):
+    """نسخة الحلقة القديمة من admin_delete_subject للمقارنة."""
+    Student, Subject, Question, ExamResult, ExamAnswer = models
+    subject = db.session.get(Subject, subject_id)
+    for r in ExamResult.query.filter_by(subject_id=subject.id).all():
+        ExamAnswer.query.filter_by(result_id=r.id).delete()
+        db.session.delete(r)
+    for q in Question.query.filter_by(subject_id=subject.id).all():
+        ExamAnswer.query.filter_by(question_id=q.id).delete()
+        db.session.delete(q)
+    db.session.delete(subject)
+    db.session.commit()
+
+
+def legacy_delete_student(db, models, student_id):
+    """نسخة الحلقة القديمة من admin_delete_student للمقارنة."""
+    Student, Subject, Question, ExamResult, ExamAnswer = models
+    student = db.session.get(Student, student_id)
+    for r in ExamResult.query.filter_by(student_id=student.id).all():
+        ExamAnswer.query.filter_by(result_id=r.id).delete()
+        db.session.delete(r)
+    db.session.delete(student)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--answers", type=int, default=100000)
+    parser.add_argument("--students", type=int, default=100)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    seed_path = os.path.join(workdir, "seed.db")
+    run_path = os.path.join(workdir, "run.db")
+    os.environ["DATABASE_URL"] = "sqlite:///" + run_path
+
+    import app as app_module
+    from app import app, db, Student, Subject, Question, ExamResult, ExamAnswer
+    models = (Student, Subject, Question, ExamResult, ExamAnswer)
+
+    subject_id, student_id = seed(app, db, models, args.students, args.answers)
+    with app.app_context():
+        db.engine.dispose()
+    shutil.copy(run_path, seed_path)
+
+    cases = [
+        ("delete subject (loop)", lambda: legacy_delete_subject(db, models, subject_id)),
+        ("delete subject (set-based)", lambda: app_module.delete_subject_cascade(subject_id)),
+        ("delete student (loop)", lambda: legacy_delete_student(db, models, student_id)),
+        ("delete student (set-based)", lambda: app_module.delete_student_cascade(student_id)),
+    ]
+
+    print(f"seeded {args.answers} answers, {args.answers // QUESTIONS_PER_EXAM} results")
+    for name, fn in cases:
+        with app.app_context():
+            db.engine.dispose()
+            shutil.copy(seed_path, run_path)
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+        print(f"{name:<28} {elapsed * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""
+اختبار حِمل لمسار الطالب كاملاً: login → choose_grade → student_subjects →
+exam_start → N × exam_take → exam_result، مع عدد كبير من الطلاب في نفس الوقت.
+
+يجهّز قاعدة بيانات بعدد الطلاب والمواد والأسئلة والنتائج السابقة المطلوب، ثم
+يشغّل كل طالب في خيط (thread) بعميل Flask (test client) أو بطلبات HTTP
+حقيقية لسيرفر محلي (gunicorn). لكل مسار: عدد الطلبات، الأخطاء، p50/p95/p99
+ومعدّل الطلبات في الثانية.
+
+--save يحفظ النتائج كملف JSON (baseline)، و --compare يقارن بملف سابق وينتهي
+برمز خروج 1 لو زاد p95 لأي مسار أكثر من --tolerance (مثلاً قبل امتحانات الفصل).
+
+التشغيل (من جذر المشروع):
+    python benchmarks/bench_exam_flow.py --students 200 --concurrency 20 --save baseline.json
+    python benchmarks/bench_exam_flow.py --students 200 --concurrency 20 --compare baseline.json
+
+ضد سيرفر محلي (نفس DATABASE_URL الذي يعمل عليه السيرفر):
+    DATABASE_URL=sqlite:////tmp/load.db gunicorn -w 4 app:app
+    python benchmarks/bench_exam_flow.py --url http://127.0.0.1:8000 --db sqlite:////tmp/load.db
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import queue
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROUTES = ["login", "choose_grade", "student_subjects", "exam_start", "exam_take", "exam_result"]
+
+QUESTION_RE = re.compile(r'name="question_id" value="(\d+)"')
+INDEX_RE = re.compile(r'name="current_index" value="(\d+)"')
+RESULT_RE = re.compile(r"/exam/result/(\d+)$")
+
+
+# ====================
+# تجهيز البيانات
+# ====================
+
+def seed(args, tag):
+    """يضيف طلاب ومواد وأسئلة ونتائج سابقة، ويرجع (الإيميلات، معرّفات المواد، اختيار الصف)."""
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+    from app import (app, db, Student, Subject, Question, ExamResult, STUDENT_GRADES,
+                     TRACK_CHOICES, SEMESTER_CHOICES, build_grade_key, invalidate_subject_catalog)
+
+    level, track, semester = STUDENT_GRADES[0], TRACK_CHOICES[0], SEMESTER_CHOICES[0]
+    grade_key = build_grade_key(level, track, semester)
+    rnd = random.Random(args.seed)
+
+    with app.app_context():
+        db.session.execute(insert(Subject), [
+            {"name": f"bench-{tag}-{i}", "grade": grade_key,
+             "default_duration": 60, "default_questions": args.exam_questions}
+            for i in range(args.subjects)
+        ])
+        subject_ids = [r[0] for r in db.session.query(Subject.id)
+                       .filter(Subject.name.like(f"bench-{tag}-%")).all()]
+
+        db.session.execute(insert(Question), [
+            {"subject_id": sid, "text": f"q{i}", "option1": "a", "option2": "b",
+             "option3": "c", "option4": "d", "correct_option": str(rnd.randint(1, 4))}
+            for sid in subject_ids for i in range(args.questions)
+        ])
+
+        # نفس الـ hash لكل الطلاب: الدخول يكلّف تحقّقاً كاملاً بدون تشفير آلاف الحسابات
+        password_hash = generate_password_hash(args.password, method=app.config["PASSWORD_HASH_METHOD"])
+        emails = [f"s{i}@{tag}.bench" for i in range(args.students + args.warmup)]
+        db.session.execute(insert(Student), [
+            {"full_name": f"bench {i}", "email": email, "password": password_hash, "grade": level}
+            for i, email in enumerate(emails)
+        ])
+        student_ids = [r[0] for r in db.session.query(Student.id)
+                       .filter(Student.email.like(f"%@{tag}.bench")).all()]
+
+        # نتائج سابقة (تاريخ الطالب ولوحات التحكم) بدون إجابات تفصيلية
+        now = datetime.utcnow()
+        rows = []
+        for sid in student_ids:
+            for _ in range(args.results):
+                correct = rnd.randint(0, args.exam_questions)
+                rows.append({
+                    "student_id": sid, "subject_id": rnd.choice(subject_ids),
+                    "score": correct / args.exam_questions * 100,
+                    "correct_count": correct, "wrong_count": args.exam_questions - correct,
+                    "date": now - timedelta(minutes=rnd.randint(1, 60 * 24 * 90)),
+                })
+        if rows:
+            db.session.execute(insert(ExamResult), rows)
+        db.session.commit()
+        invalidate_subject_catalog()
+        db.engine.dispose()
+
+    return emails, subject_ids, (level, track, semester)
+
+
+# ====================
+# العملاء: Flask test client أو HTTP
+# ====================
+
+class TestClient:
+    """عميل داخل نفس العملية (بدون شبكة)."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None):
+        resp = self.client.open(path, method=method, data=form)
+        return resp.status_code, resp.headers.get("Location"), resp.get_data(as_text=True)
+
+
+class HttpClient:
+    """عميل HTTP باتصال keep-alive واحد وكوكيز بسيطة، بدون تتبّع التحويلات."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        self.cookies = {}
+
+    def request(self, method, path, form=None):
+        headers = {}
+        body = None
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            # السيرفر أغلق الاتصال: نعيد المحاولة مرة على اتصال جديد
+            self.conn.close()
+            self.conn.request(method, path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+        data = resp.read().decode("utf-8", "replace")
+        for header in resp.headers.get_all("Set-Cookie") or []:
+            name, _, value = header.split(";", 1)[0].partition("=")
+            self.cookies[name.strip()] = value.strip()
+        return resp.status, resp.getheader("Location"), data
+
+    def close(self):
+        self.conn.close()
+
+
+# ====================
+# مسار الطالب
+# ====================
+
+class FlowError(Exception):
+    pass
+
+
+class Recorder:
+    """يجمع أزمنة كل مسار من كل الخيوط."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {name: [] for name in ROUTES}
+        self.errors = {name: 0 for name in ROUTES}
+        self.flows = 0
+        self.failed_flows = 0
+
+    def add(self, name, seconds, ok):
+        with self.lock:
+            self.timings[name].append(seconds)
+            if not ok:
+                self.errors[name] += 1
+
+
+def _path(location):
+    parts = urlsplit(location or "")
+    return parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+def call(client, recorder, name, method, path, form=None, expect=(200,)):
+    start = time.perf_counter()
+    status, location, body = client.request(method, path, form)
+    elapsed = time.perf_counter() - start
+    ok = status in expect
+    if recorder is not None:
+        recorder.add(name, elapsed, ok)
+    if not ok:
+        raise FlowError(f"{name}: {method} {path} -> {status}")
+    return status, location, body
+
+
+def run_flow(client, recorder, email, args, subject_ids, grade_choice, rnd):
+    """طالب واحد من الدخول حتى صفحة النتيجة."""
+    level, track, semester = grade_choice
+
+    call(client, recorder, "login", "POST", "/login",
+         {"email": email, "password": args.password}, expect=(302,))
+    call(client, recorder, "choose_grade", "POST", "/choose_grade",
+         {"level": level, "track": track, "semester": semester}, expect=(302,))
+    call(client, recorder, "student_subjects", "GET", "/student/subjects")
+
+    subject_id = rnd.choice(subject_ids)
+    _, location, _ = call(client, recorder, "exam_start", "POST",
+                          f"/exam/start/{subject_id}", {}, expect=(302,))
+    if not _path(location).startswith("/exam/take") or "/all" in location:
+        raise FlowError(f"exam_start redirected to {location} (EXAM_SINGLE_PAGE on?)")
+
+    _, _, body = call(client, recorder, "exam_take", "GET", "/exam/take")
+    for _ in range(args.exam_questions + 1):
+        question = QUESTION_RE.search(body)
+        index = INDEX_RE.search(body)
+        if not question or not index:
+            raise FlowError("exam_take page without a question form")
+        status, location, body = call(client, recorder, "exam_take", "POST", "/exam/take", {
+            "answer": str(rnd.randint(1, 4)),
+            "question_id": question.group(1),
+            "current_index": index.group(1),
+            "action": "next",
+        }, expect=(200, 302))
+        if status == 302:
+            break
+    else:
+        raise FlowError("exam did not finish after answering every question")
+
+    result_path = _path(location)
+    if not RESULT_RE.search(result_path):
+        raise FlowError(f"exam_take finished with redirect to {location}")
+    call(client, recorder, "exam_result", "GET", result_path)
+
+
+def run(args, emails, subject_ids, grade_choice):
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+    else:
+        from app import app, db
+        app.config["EXAM_SINGLE_PAGE"] = False
+        make_client = lambda: TestClient(app)
+
+    # تسخين (ترجمة القوالب، الكاشات، الاتصالات) بدون تسجيل
+    rnd = random.Random(args.seed)
+    for email in emails[:args.warmup]:
+        client = make_client()
+        run_flow(client, None, email, args, subject_ids, grade_choice, rnd)
+        getattr(client, "close", lambda: None)()
+
+    recorder = Recorder()
+    todo = queue.Queue()
+    for email in emails[args.warmup:]:
+        todo.put(email)
+
+    def student_thread(n):
+        rnd = random.Random(args.seed * 1000 + n)
+        while True:
+            try:
+                email = todo.get_nowait()
+            except queue.Empty:
+                return
+            client = make_client()
+            try:
+                run_flow(client, recorder, email, args, subject_ids, grade_choice, rnd)
+                with recorder.lock:
+                    recorder.flows += 1
+            except Exception as exc:
+                with recorder.lock:
+                    recorder.failed_flows += 1
+                if args.verbose:
+                    print(f"flow failed for {email}: {exc}", file=sys.stderr)
+            finally:
+                getattr(client, "close", lambda: None)()
+
+    threads = [threading.Thread(target=student_thread, args=(n,)) for n in range(args.concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    if not args.url:
+        with app.app_context():
+            db.engine.dispose()
+    return recorder, elapsed
+
+
+# ====================
+# التقرير والـ baseline
+# ====================
+
+def percentile(sorted_values, p):
+    """نسبة مئوية بالاستيفاء الخطي بين أقرب قيمتين."""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+def summarize(recorder, elapsed):
+    routes = {}
+    for name in ROUTES:
+        values = sorted(recorder.timings[name])
+        routes[name] = {
+            "count": len(values),
+            "errors": recorder.errors[name],
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+            "rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        }
+    total = sum(r["count"] for r in routes.values())
+    return {
+        "routes": routes,
+        "total": {
+            "requests": total,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "flows": recorder.flows,
+            "failed_flows": recorder.failed_flows,
+            "flows_per_s": round(recorder.flows / elapsed, 2) if elapsed else 0.0,
+            "elapsed_s": round(elapsed, 3),
+        },
+    }
+
+
+def print_report(report):
+    print(f"{'route':<18}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for name, r in report["routes"].items():
+        print(f"{name:<18}{r['count']:>8}{r['errors']:>8}{r['p50_ms']:>10.1f}"
+              f"{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['rps']:>10.1f}")
+    t = report["total"]
+    print(f"\n{t['requests']} requests in {t['elapsed_s']:.1f} s ({t['rps']:.1f} req/s), "
+          f"{t['flows']} exams completed ({t['flows_per_s']:.2f}/s), "
+          f"{t['failed_flows']} failed, {t['errors']} errors")
+
+
+def compare(report, baseline, tolerance):
+    """يطبع الفرق عن الـ baseline ويرجع قائمة المسارات التي تراجعت."""
+    regressions = []
+    print(f"\n{'route':<18}{'p95 base':>10}{'p95 now':>10}{'change':>9}")
+    for name, r in report["routes"].items():
+        base = baseline.get("routes", {}).get(name)
+        if not base or not base["p95_ms"]:
+            continue
+        change = r["p95_ms"] / base["p95_ms"] - 1
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<18}{base['p95_ms']:>10.1f}{r['p95_ms']:>10.1f}{change:>+9.0%}{flag}")
+    if report["total"]["errors"] > baseline.get("total", {}).get("errors", 0):
+        regressions.append("errors")
+        print("more errors than the baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=100, help="عدد الطلاب (امتحان لكل طالب)")
+    parser.add_argument("--concurrency", type=int, default=10, help="عدد الطلاب في نفس الوقت")
+    parser.add_argument("--subjects", type=int, default=5)
+    parser.add_argument("--questions", type=int, default=200, help="أسئلة كل مادة في البنك")
+    parser.add_argument("--exam-questions", type=int, default=20, help="أسئلة كل امتحان (N)")
+    parser.add_argument("--results", type=int, default=5, help="نتائج سابقة لكل طالب")
+    parser.add_argument("--warmup", type=int, default=3, help="امتحانات تسخين لا تُحسب")
+    parser.add_argument("--password", default="bench-pass")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", default=None, help="رابط قاعدة بيانات (افتراضياً ملف SQLite مؤقت)")
+    parser.add_argument("--url", default=None, help="سيرفر محلي بدل Flask test client")
+    parser.add_argument("--save", default=None, help="حفظ النتائج كملف JSON")
+    parser.add_argument("--compare", default=None, help="مقارنة بملف JSON سابق")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="أقصى زيادة مسموحة في p95")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.url and not args.db:
+        parser.error("--url needs --db pointing at the server's database")
+
+    # يجب ضبط رابط القاعدة قبل استيراد app لأن create_all يعمل عند الاستيراد
+    os.environ["DATABASE_URL"] = args.db or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    tag = f"r{int(time.time())}"
+    start = time.perf_counter()
+    emails, subject_ids, grade_choice = seed(args, tag)
+    print(f"seeded {len(emails)} students, {args.subjects} subjects x {args.questions} questions, "
+          f"{args.results} past results each in {time.perf_counter() - start:.1f} s")
+
+    recorder, elapsed = run(args, emails, subject_ids, grade_choice)
+    report = summarize(recorder, elapsed)
+    print_report(report)
+
+    report["meta"] = {
+        "date": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "target": args.url or "test_client",
+        "env": {k: os.environ[k] for k in ("SQLITE_PRODUCTION", "ANSWER_WRITE_MODE", "EXAM_PAPER_POOL",
+                                           "METRICS_ENABLED", "PASSWORD_HASH_METHOD")
+                if k in os.environ},
+        "args": {k: v for k, v in vars(args).items()
+                 if k not in ("save", "compare", "verbose", "password", "db")},
+    }
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"saved {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("args") != report["meta"]["args"]:
+            print("warning: baseline was recorded with different arguments")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+تصدير الإجابات (CSV و Excel) من admin_export_results على قاعدة فيها عدد كبير
+من الإجابات: زمن أول بايت، الزمن الكلي، حجم الملف، وأقصى ذاكرة بايثون أثناء
+التصدير (tracemalloc مع --memory، ويبطئ التصدير كثيراً) — يجب أن تبقى ثابتة
+تقريباً مهما زاد عدد الصفوف.
+
+التشغيل (من جذر المشروع):
+    python benchmarks/bench_export.py --answers 1000000
+    python benchmarks/bench_export.py --answers 200000 --memory
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+QUESTIONS_PER_EXAM = 40
+
+
+def seed(app, db, answers):
+    from sqlalchemy import insert
+    from app import Student, Subject, Question, ExamResult, ExamAnswer
+
+    results_count = max(answers // QUESTIONS_PER_EXAM, 1)
+    with app.app_context():
+        subject = Subject(name="bench", grade="bench")
+        db.session.add(subject)
+        db.session.commit()
+        db.session.execute(insert(Student), [
+            {"full_name": f"student {i}", "email": f"s{i}@bench", "password": "x", "grade": "bench"}
+            for i in range(200)
+        ])
+        db.session.execute(insert(Question), [
+            {"subject_id": subject.id, "text": f"question {i}", "option1": "a", "option2": "b",
+             "option3": "c", "option4": "d", "correct_option": "1"}
+            for i in range(QUESTIONS_PER_EXAM * 5)
+        ])
+        student_ids = [r[0] for r in db.session.query(Student.id).all()]
+        question_ids = [r[0] for r in db.session.query(Question.id).all()]
+        db.session.execute(insert(ExamResult), [
+            {"student_id": student_ids[i % len(student_ids)], "subject_id": subject.id,
+             "score": 50, "correct_count": 20, "wrong_count": 20}
+            for i in range(results_count)
+        ])
+        result_ids = [r[0] for r in db.session.query(ExamResult.id).all()]
+
+        rows = []
+        for n, rid in enumerate(result_ids):
+            for k in range(QUESTIONS_PER_EXAM):
+                rows.append({"result_id": rid, "question_id": question_ids[(n + k) % len(question_ids)],
+                             "student_answer": "1", "is_correct": k % 2 == 0})
+            if len(rows) >= 50000:
+                db.session.execute(insert(ExamAnswer), rows)
+                rows = []
+        if rows:
+            db.session.execute(insert(ExamAnswer), rows)
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--answers", type=int, default=200000)
+    parser.add_argument("--formats", nargs="+", default=["csv", "xlsx"])
+    parser.add_argument("--memory", action="store_true", help="قياس الذاكرة بـ tracemalloc")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    from app import app, db
+
+    start = time.perf_counter()
+    seed(app, db, args.answers)
+    print(f"seeded {args.answers} answers in {time.perf_counter() - start:.1f} s")
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["is_admin"] = True
+
+    print(f"{'format':<8}{'first byte ms':>15}{'total s':>10}{'size MB':>10}{'peak MB':>10}")
+    for fmt in args.formats:
+        if args.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        resp = client.get(f"/admin/results/export/answers.{fmt}", buffered=False)
+        chunks = iter(resp.response)
+        size = len(next(chunks))
+        first_byte = time.perf_counter() - start
+        for chunk in chunks:
+            size += len(chunk)
+        resp.close()
+        total = time.perf_counter() - start
+        peak = "-"
+        if args.memory:
+            peak = f"{tracemalloc.get_traced_memory()[1] / 1e6:.1f}"
+            tracemalloc.stop()
+        print(f"{fmt:<8}{first_byte * 1000:>15.1f}{total:>10.1f}{size / 1e6:>10.1f}{peak:>10}")
+
+
+if __name__ == "__main__":
+    main()
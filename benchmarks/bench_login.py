@@ -0,0 +1,114 @@
+"""
+حِمل تسجيل الدخول: كم عملية دخول في الثانية يتحمّلها worker واحد بكل كلفة
+تشفير (PASSWORD_HASH_METHOD)، وزمن p50/p95/p99، وعدد الردود 503 عندما يمتلئ
+طابور التحقق (PASSWORD_HASH_QUEUE) — مثل دخول المدرسة كلها الساعة 8:00.
+
+--legacy يخزّن كلمات المرور نصاً (صفوف قديمة) لقياس الدخول الأول مع الترقية.
+
+التشغيل (من جذر المشروع):
+    python benchmarks/bench_login.py --students 200 --concurrency 32 \
+        --methods pbkdf2:sha256:600000 pbkdf2:sha256:200000 scrypt:32768:8:1
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = "bench-pass"
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="طلبات دخول في نفس اللحظة")
+    parser.add_argument("--methods", nargs="+", default=["pbkdf2:sha256:600000"])
+    parser.add_argument("--hash-workers", type=int, default=None, help="PASSWORD_HASH_WORKERS")
+    parser.add_argument("--queue", type=int, default=None, help="PASSWORD_HASH_QUEUE")
+    parser.add_argument("--legacy", action="store_true", help="كلمات مرور نصية تُرقّى عند الدخول")
+    args = parser.parse_args()
+
+    # يجب ضبط الإعدادات قبل استيراد app (مجموعة threads التحقق تُنشأ عند الاستيراد)
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    if args.hash_workers:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.hash_workers)
+    if args.queue:
+        os.environ["PASSWORD_HASH_QUEUE"] = str(args.queue)
+
+    from sqlalchemy import insert, update
+    from werkzeug.security import generate_password_hash
+    from app import app, db, Student
+
+    with app.app_context():
+        db.session.execute(insert(Student), [
+            {"full_name": f"s{i}", "email": f"s{i}@bench", "password": PASSWORD, "grade": "bench"}
+            for i in range(args.students)
+        ])
+        db.session.commit()
+
+    print(f"workers={app.config['PASSWORD_HASH_WORKERS']} queue={app.config['PASSWORD_HASH_QUEUE']} "
+          f"concurrency={args.concurrency} {'(legacy plaintext rows)' if args.legacy else ''}")
+    print(f"{'method':<24}{'hash ms':>9}{'logins/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'503':>6}")
+
+    for method in args.methods:
+        app.config["PASSWORD_HASH_METHOD"] = method
+        start = time.perf_counter()
+        password_hash = generate_password_hash(PASSWORD, method=method)
+        hash_ms = (time.perf_counter() - start) * 1000
+
+        with app.app_context():
+            stored = PASSWORD if args.legacy else password_hash
+            db.session.execute(update(Student).values(password=stored))
+            db.session.commit()
+
+        timings = []
+        statuses = {}
+        lock = threading.Lock()
+        emails = iter(f"s{i}@bench" for i in range(args.students))
+
+        def login_thread():
+            client = app.test_client()
+            while True:
+                with lock:
+                    email = next(emails, None)
+                if email is None:
+                    return
+                t = time.perf_counter()
+                resp = client.post("/login", data={"email": email, "password": PASSWORD})
+                elapsed = time.perf_counter() - t
+                with lock:
+                    timings.append(elapsed)
+                    statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+        threads = [threading.Thread(target=login_thread) for _ in range(args.concurrency)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        timings.sort()
+        ok = statuses.get(302, 0)
+        print(f"{method:<24}{hash_ms:>9.1f}{ok / elapsed:>10.1f}{percentile(timings, 50) * 1000:>9.1f}"
+              f"{percentile(timings, 95) * 1000:>9.1f}{percentile(timings, 99) * 1000:>9.1f}"
+              f"{statuses.get(503, 0):>6}")
+        if set(statuses) - {302, 503}:
+            print(f"  unexpected statuses: {statuses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+مقارنة سحب الأسئلة العشوائي في exam_start:
+ORDER BY random() LIMIT n  مقابل  كاش المعرّفات + استعلام IN واحد.
+
+التشغيل (من جذر المشروع):
+    python benchmarks/bench_sampler.py --questions 50000 --pick 40 --runs 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=50000)
+    parser.add_argument("--pick", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--db", default=None, help="رابط قاعدة بيانات (افتراضياً ملف SQLite مؤقت)")
+    args = parser.parse_args()
+
+    # يجب ضبط رابط القاعدة قبل استيراد app لأن create_all يعمل عند الاستيراد
+    db_url = args.db or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = db_url
+
+    from sqlalchemy import func, insert
+    from app import app, db, Subject, Question, sample_questions
+
+    with app.app_context():
+        subject = Subject(name="bench", grade="bench", default_duration=40,
+                          default_questions=args.pick)
+        db.session.add(subject)
+        db.session.commit()
+
+        rows = [
+            {
+                "subject_id": subject.id,
+                "text": f"سؤال رقم {i}",
+                "option1": "أ", "option2": "ب", "option3": "ج", "option4": "د",
+                "correct_option": "1",
+            }
+            for i in range(args.questions)
+        ]
+        db.session.execute(insert(Question), rows)
+        db.session.commit()
+
+        def old_query():
+            return (
+                Question.query
+                .filter_by(subject_id=subject.id)
+                .order_by(func.random())
+                .limit(args.pick)
+                .all()
+            )
+
+        def new_query():
+            return sample_questions(subject.id, args.pick)
+
+        # تسخين الكاش حتى نقيس الحالة المستقرة (مئات الطلاب على نفس المادة)
+        new_query()
+
+        for name, fn in (("ORDER BY random()", old_query), ("id cache + IN", new_query)):
+            timings = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                fn()
+                timings.append(time.perf_counter() - start)
+                db.session.expire_all()
+            timings.sort()
+            mean = sum(timings) / len(timings)
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"{name:<20} mean={mean * 1000:8.2f} ms  p95={p95 * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
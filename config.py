@@ -1,5 +1,26 @@
 import os
 
+
+def _engine_options():
+    """
+    إعدادات الـ connection pool من متغيرات البيئة.
+    pool_size / max_overflow / pool_timeout تُضاف فقط لو حُدّدت،
+    لأن بعض أنواع الـ pool (مثل SQLite في الذاكرة) لا تقبلها.
+    """
+    options = {
+        # فحص الاتصال قبل استخدامه (يتجنب أخطاء الاتصالات التي أغلقها السيرفر)
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "1") == "1",
+        # إعادة فتح الاتصال بعد هذه المدة (بالثواني)
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+    }
+    for key, env in (("pool_size", "DB_POOL_SIZE"),
+                     ("max_overflow", "DB_MAX_OVERFLOW"),
+                     ("pool_timeout", "DB_POOL_TIMEOUT")):
+        if os.environ.get(env):
+            options[key] = int(os.environ[env])
+    return options
+
+
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key")
 
@@ -10,5 +31,116 @@ class Config:
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options()
+
+    # نسخة للقراءة فقط (اختيارية): صفحات العرض الثقيلة تقرأ منها، وكل الكتابة على القاعدة الرئيسية
+    DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+    SQLALCHEMY_BINDS = {"replica": DATABASE_REPLICA_URL} if DATABASE_REPLICA_URL else {}
+    # بعد أي كتابة يقرأ نفس المستخدم من القاعدة الرئيسية لهذه المدة (بالثواني)
+    # حتى لا يرى بيانات قديمة بسبب تأخر النسخ
+    REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 10))
+
+    # وضع SQLite للإنتاج (عدة workers على نفس الملف): WAL وضبط الـ pragmas
+    # وتمرير مسارات الكتابة عبر قفل واحد مع إعادة المحاولة عند "database is locked"
+    SQLITE_PRODUCTION = os.environ.get("SQLITE_PRODUCTION", "0") == "1"
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    # مدة انتظار القفل داخل SQLite (بالملّي ثانية)
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))
+    # قيمة سالبة = الحجم بالكيلوبايت (الافتراضي ~64MB لكل اتصال)
+    SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", -64000))
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    # عدد مرات إعادة تنفيذ قسم الكتابة (run_write) عند قفل القاعدة، والتأخير الابتدائي (بالثواني)
+    DB_WRITE_RETRIES = int(os.environ.get("DB_WRITE_RETRIES", 5))
+    DB_WRITE_RETRY_DELAY = float(os.environ.get("DB_WRITE_RETRY_DELAY", 0.05))
+
+    # مدة صلاحية كاش معرّفات الأسئلة لكل مادة (بالثواني)
+    QUESTION_IDS_CACHE_TTL = int(os.environ.get("QUESTION_IDS_CACHE_TTL", 60))
+
+    # مدة صلاحية كاش قائمة المواد لكل صف (بالثواني)
+    SUBJECT_CATALOG_TTL = int(os.environ.get("SUBJECT_CATALOG_TTL", 300))
+
+    # أوراق امتحان جاهزة مسبقاً لكل مادة (لبدء امتحان صف كامل في نفس اللحظة):
+    # حجم المخزون، الحد الذي يبدأ عنده التوليد في الخلفية، وخلط ترتيب الخيارات
+    EXAM_PAPER_POOL = os.environ.get("EXAM_PAPER_POOL", "0") == "1"
+    EXAM_PAPER_POOL_SIZE = int(os.environ.get("EXAM_PAPER_POOL_SIZE", 200))
+    EXAM_PAPER_POOL_LOW = int(os.environ.get("EXAM_PAPER_POOL_LOW", 50))
+    EXAM_SHUFFLE_OPTIONS = os.environ.get("EXAM_SHUFFLE_OPTIONS", "1") == "1"
+
+    # وضع الصفحة الواحدة للامتحان: إرسال كل الأسئلة مرة واحدة ومزامنة الإجابات بـ JSON
+    EXAM_SINGLE_PAGE = os.environ.get("EXAM_SINGLE_PAGE", "0") == "1"
+    # مدة الانتظار قبل إرسال دفعة الإجابات (بالملّي ثانية)
+    EXAM_SYNC_DEBOUNCE_MS = int(os.environ.get("EXAM_SYNC_DEBOUNCE_MS", 1500))
+
+    # طريقة حفظ الإجابات: "direct" (تحديث ExamAnswer مباشرة) أو
+    # "log" (إضافة أحداث فقط، والتحويل دفعة واحدة عند إنهاء الامتحان)
+    ANSWER_WRITE_MODE = os.environ.get("ANSWER_WRITE_MODE", "direct")
+
+    # مهلة إضافية بعد الموعد النهائي للامتحان (بالثواني) لتأخر الشبكة
+    EXAM_DEADLINE_GRACE = int(os.environ.get("EXAM_DEADLINE_GRACE", 30))
+    # كل كم ثانية يتم إنهاء الامتحانات المنتهية وقتها (0 لتعطيله واستخدام cron)
+    EXAM_SWEEP_INTERVAL = int(os.environ.get("EXAM_SWEEP_INTERVAL", 60))
+
+    # توليد تقارير PDF: مجلد الكاش، عدد الـ threads، وحد الطلبات المتزامنة لكل worker.
+    # PDF_RENDER_TIMEOUT: بعده يُعتبر التوليد متوقفاً (worker مات) فيُعاد، وتُعاد المحاولة بعد فشل
+    PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR")
+    PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", 2))
+    PDF_RENDER_QUEUE = int(os.environ.get("PDF_RENDER_QUEUE", 8))
+    PDF_RENDER_TIMEOUT = int(os.environ.get("PDF_RENDER_TIMEOUT", 30))
+
+    # حجم الدفعة عند استيراد الأسئلة من ملف إكسل
+    IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", 1000))
+
+    # تشغيل الاستيراد والحذف المتسلسل كـ jobs في الخلفية بدل داخل الطلب
+    BACKGROUND_JOBS = os.environ.get("BACKGROUND_JOBS", "0") == "1"
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))
+    # أقل فترة (بالثواني) بين كتابتين لتقدّم الـ job في جدول Job
+    JOB_PROGRESS_INTERVAL = float(os.environ.get("JOB_PROGRESS_INTERVAL", 2))
+
+    # عدد النتائج في كل صفحة من سجل النتائج عند الأدمن
+    ADMIN_RESULTS_PAGE_SIZE = int(os.environ.get("ADMIN_RESULTS_PAGE_SIZE", 50))
+    # عدد الامتحانات في كل صفحة من سجل الطالب
+    STUDENT_HISTORY_PAGE_SIZE = int(os.environ.get("STUDENT_HISTORY_PAGE_SIZE", 20))
+
+    # عدد الصفوف التي تُجلب من القاعدة في كل دفعة عند تصدير النتائج والإجابات
+    EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+
+    # إحصائيات لوحة الأدمن: مدة الكاش في كل worker، وكل كم ثانية تُعاد حسابها كاملة
+    DASHBOARD_STATS_TTL = int(os.environ.get("DASHBOARD_STATS_TTL", 30))
+    DASHBOARD_STATS_REFRESH = int(os.environ.get("DASHBOARD_STATS_REFRESH", 3600))
+
+    # تحليل الأسئلة: عدد النتائج في كل دفعة، مدة الكاش، وكل كم ثانية تُضاف الامتحانات الجديدة
+    ANALYTICS_BATCH_SIZE = int(os.environ.get("ANALYTICS_BATCH_SIZE", 500))
+    ANALYTICS_CACHE_TTL = int(os.environ.get("ANALYTICS_CACHE_TTL", 300))
+    ANALYTICS_UPDATE_INTERVAL = int(os.environ.get("ANALYTICS_UPDATE_INTERVAL", 300))
+
+    # قياس أداء الطلبات وعرضه على /metrics (بصيغة Prometheus)،
+    # وتسجيل أي طلب ينفّذ أكثر من هذا العدد من استعلامات SQL (0 لتعطيله)
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+    METRICS_QUERY_LOG_THRESHOLD = int(os.environ.get("METRICS_QUERY_LOG_THRESHOLD", 20))
+    # توكن الوصول إلى /metrics (Authorization: Bearer ...) لـ Prometheus؛ بدونه للأدمن فقط
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+    # تشفير كلمات المرور (werkzeug): الخوارزمية مع كلفتها كاملة، مثل "pbkdf2:sha256:600000"
+    # أو "scrypt:32768:8:1" (migrate_schema توسّع عمود password في قواعد Postgres القديمة).
+    # تغييرها يرقّي كل حساب عند دخوله التالي.
+    # التحقق يتم في threads محدودة لكل worker، ولو امتلأ الطابور نرد بـ 503.
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get("PASSWORD_HASH_QUEUE", 32))
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))
+
+    # وضع ASGI (asgi.py مع uvicorn): رابط القاعدة بدرايفر غير متزامن، ويُشتق من DATABASE_URL
+    # لو لم يُحدَّد (sqlite+aiosqlite أو postgresql+asyncpg)، وحجم الـ pool لكل عملية.
+    # باقي المسارات تعمل في threads بعددها ASGI_WSGI_THREADS، وعرض قوالب مسارات
+    # الامتحان في threads بعددها ASGI_RENDER_THREADS (خارج الـ event loop).
+    ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL")
+    ASYNC_POOL_SIZE = int(os.environ.get("ASYNC_POOL_SIZE", 20))
+    ASYNC_MAX_OVERFLOW = int(os.environ.get("ASYNC_MAX_OVERFLOW", 20))
+    ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 8))
+    ASGI_RENDER_THREADS = int(os.environ.get("ASGI_RENDER_THREADS", 4))
+
+    # ترجمة كل القوالب عند بدء كل worker بدل أول طلب لكل صفحة
+    PRECOMPILE_TEMPLATES = os.environ.get("PRECOMPILE_TEMPLATES", "1") == "1"
+
     ADMIN_EMAIL = os.environ.get("ADMIN_EMAIL", "admin@example.com")
     ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "admin123")
@@ -0,0 +1,127 @@
+"""
+توجيه القراءة إلى الـ replica (RoutingSession / use_read_replica) على ملفّي
+SQLite محليين: القاعدة الرئيسية ونسخة منها تمثّل الـ replica. اسم الطالب
+يختلف بين الملفين، فالصفحة تكشف من أي قاعدة قرأت.
+
+التشغيل (من جذر المشروع):
+    python -m pytest -q tests/test_read_replica.py
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# يجب ضبط القاعدتين قبل استيراد app (الـ engines تُنشأ عند الاستيراد)
+DB_DIR = tempfile.mkdtemp()
+PRIMARY = os.path.join(DB_DIR, "primary.db")
+REPLICA = os.path.join(DB_DIR, "replica.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + PRIMARY
+os.environ["DATABASE_REPLICA_URL"] = "sqlite:///" + REPLICA
+os.environ["SQLITE_PRODUCTION"] = "0"
+
+from flask import g  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app import app, db, Student, STUDENT_GRADES  # noqa: E402
+
+PRIMARY_NAME = "Primary Name"
+REPLICA_NAME = "Replica Name"
+
+
+def count_students(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM student").fetchone()[0]
+
+
+@pytest.fixture
+def student_id():
+    """طالب واحد في القاعدة الرئيسية، ونسخة منها كـ replica باسم مختلف."""
+    with app.app_context():
+        db.session.query(Student).delete()
+        # stats_built: وإلا تبني أول زيارة للوحة مجاميع الطالب (كتابة تنقله للرئيسية)
+        student = Student(full_name=PRIMARY_NAME, email="a@test", password="x",
+                          grade="test", stats_built=True)
+        db.session.add(student)
+        db.session.commit()
+        sid = student.id
+        for engine in db.engines.values():
+            engine.dispose()
+
+    shutil.copy(PRIMARY, REPLICA)
+    with sqlite3.connect(REPLICA) as conn:
+        conn.execute("UPDATE student SET full_name = ?", (REPLICA_NAME,))
+    return sid
+
+
+@pytest.fixture
+def client(student_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["student_id"] = student_id
+    return client
+
+
+def test_decorated_view_reads_replica(client):
+    html = client.get("/student/dashboard").get_data(as_text=True)
+    assert REPLICA_NAME in html
+    assert PRIMARY_NAME not in html
+
+
+def test_undecorated_read_uses_primary(student_id):
+    with app.test_request_context():
+        assert db.session.get(Student, student_id).full_name == PRIMARY_NAME
+
+
+def test_write_goes_to_primary_and_sticks(client):
+    resp = client.post("/register", data={
+        "full_name": "New Student", "email": "b@test", "grade": STUDENT_GRADES[0], "password": "secret",
+    })
+    assert resp.status_code == 302
+    assert count_students(PRIMARY) == 2
+    assert count_students(REPLICA) == 1
+
+    # read-your-writes: بعد الكتابة يقرأ المستخدم من الرئيسية خلال REPLICA_STICKY_SECONDS
+    with client.session_transaction() as sess:
+        assert sess["primary_until"] > time.time()
+    html = client.get("/student/dashboard").get_data(as_text=True)
+    assert PRIMARY_NAME in html
+
+    # بعد انتهاء النافذة يعود للـ replica
+    with client.session_transaction() as sess:
+        sess["primary_until"] = time.time() - 1
+    html = client.get("/student/dashboard").get_data(as_text=True)
+    assert REPLICA_NAME in html
+
+
+def test_read_only_request_does_not_stick(client):
+    client.get("/student/dashboard")
+    with client.session_transaction() as sess:
+        assert "primary_until" not in sess
+
+
+def test_db_wrote_switches_request_to_primary(student_id):
+    query = select(Student.full_name).where(Student.id == student_id)
+    with app.test_request_context():
+        g.use_replica = True
+        assert db.session.scalar(query) == REPLICA_NAME
+
+        g.db_wrote = True
+        assert db.session.scalar(query) == PRIMARY_NAME
+
+
+def test_flush_marks_request_as_written(student_id):
+    query = select(Student.full_name).where(Student.id == student_id)
+    with app.test_request_context():
+        g.use_replica = True
+        db.session.add(Student(full_name="Pending", email="c@test", password="x", grade="test"))
+        db.session.flush()
+        assert g.get("db_wrote")
+        assert db.session.scalar(query) == PRIMARY_NAME
+        db.session.rollback()
@@ -0,0 +1,95 @@
+"""
+عدد استعلامات SQL في exam_result و exam_result_pdf يجب أن يبقى ثابتاً مهما
+زاد عدد أسئلة الامتحان (أي N+1 يجعله يكبر مع عدد الأسئلة).
+
+التشغيل (من جذر المشروع):
+    python -m pytest -q tests/test_result_queries.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# قبل استيراد app؛ لو استوردته وحدة اختبار أخرى قبلنا تبقى قاعدتها كما هي
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "queries.db"))
+
+from sqlalchemy import event  # noqa: E402
+
+from app import app, db, Student, Subject, Question, ExamResult, ExamAnswer  # noqa: E402
+
+SIZES = (5, 40, 100)
+
+
+@pytest.fixture(scope="module")
+def results():
+    """امتحان لكل حجم (آخر سؤال بدون إجابة)، ويرجع (student_id, {size: result_id})."""
+    with app.app_context():
+        student = Student(full_name="queries", email="queries@test", password="x", grade="test")
+        subject = Subject(name="queries", grade="test")
+        db.session.add_all([student, subject])
+        db.session.commit()
+
+        result_ids = {}
+        for size in SIZES:
+            questions = [
+                Question(subject_id=subject.id, text=f"q{i}", option1="a", option2="b",
+                         option3="c", option4="d", correct_option="1")
+                for i in range(size)
+            ]
+            db.session.add_all(questions)
+            db.session.flush()
+
+            result = ExamResult(student_id=student.id, subject_id=subject.id, score=0,
+                                correct_count=0, wrong_count=0,
+                                question_order=",".join(str(q.id) for q in questions))
+            db.session.add(result)
+            db.session.flush()
+            db.session.add_all([
+                ExamAnswer(result_id=result.id, question_id=q.id, student_answer="1", is_correct=True)
+                for q in questions[:-1]
+            ])
+            db.session.commit()
+            result_ids[size] = result.id
+        return student.id, result_ids
+
+
+@pytest.fixture
+def query_counter(monkeypatch):
+    # الـ sweep الكسول في before_request يضيف استعلامات لبعض الطلبات فقط
+    monkeypatch.setitem(app.config, "EXAM_SWEEP_INTERVAL", 0)
+    counter = {"n": 0}
+
+    def count(*_):
+        counter["n"] += 1
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count)
+    yield counter
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", count)
+
+
+@pytest.mark.parametrize("suffix", ["", "/pdf"], ids=["exam_result", "exam_result_pdf"])
+def test_query_count_does_not_grow_with_questions(results, query_counter, suffix):
+    student_id, result_ids = results
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["student_id"] = student_id
+        # القراءة من القاعدة الرئيسية حتى لو كانت replica مضبوطة (البيانات كُتبت للتو)
+        sess["primary_until"] = time.time() + 3600
+
+    counts = {}
+    for size, result_id in result_ids.items():
+        query_counter["n"] = 0
+        resp = client.get(f"/exam/result/{result_id}{suffix}")
+        assert resp.status_code == 200
+        counts[size] = query_counter["n"]
+
+    assert len(set(counts.values())) == 1, f"query count grows with question count: {counts}"